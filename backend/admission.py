@@ -0,0 +1,227 @@
+"""Admission control for the API.
+
+Every request is admitted or rejected before any work is done for it:
+
+- a token bucket per user (falling back to the client address until the
+  session is known) and a global bucket shared by everyone bound the request
+  rate. Requests cost tokens by endpoint class, so a PDF or an LLM summary
+  drains a bucket faster than a list read. Running out of per-user tokens
+  is the client's fault: 429. Running out of global tokens is the
+  server's: 503;
+- a semaphore per endpoint class bounds how many requests of that class run
+  at once, so a burst of PDF renders or LLM calls cannot take every worker
+  slot and ordinary reads keep a bounded tail latency. A request that does
+  not get a slot within the queue timeout gets a 503.
+
+Both rejections carry Retry-After: the time until the bucket holds enough
+tokens, or the recent average service time of the saturated class.
+"""
+import asyncio
+import math
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+DEFAULT = "default"
+PDF = "pdf"
+LLM = "llm"
+
+# Tokens taken from the buckets per request of each class
+CLASS_COSTS = {DEFAULT: 1, PDF: 5, LLM: 10}
+DEFAULT_CONCURRENCY = {DEFAULT: 64, PDF: 4, LLM: 8}
+
+DEFAULT_USER_RATE = 10.0
+DEFAULT_USER_BURST = 60.0
+DEFAULT_GLOBAL_RATE = 300.0
+DEFAULT_GLOBAL_BURST = 600.0
+DEFAULT_QUEUE_TIMEOUT_SECONDS = 0.05
+# Least recently seen user buckets beyond this are dropped
+MAX_TRACKED_USERS = 10000
+# Smoothing factor of the per-class service time average
+SERVICE_TIME_ALPHA = 0.2
+
+# Never admission-controlled: probes, login/logout
+EXEMPT_PATHS = re.compile(r"^/api/(health/|auth/)")
+PDF_PATHS = re.compile(r"^/api/anamneses/([^/]+/pdf|export/parquet)$")
+LLM_PATHS = re.compile(r"^/api/anamneses/[^/]+/generate-summary$")
+
+
+def endpoint_class(method: str, path: str, query: Dict[str, str]) -> Optional[str]:
+    """Endpoint class of a request, None if it is not admission-controlled"""
+    if not path.startswith("/api/") or EXEMPT_PATHS.match(path) or method == "OPTIONS":
+        return None
+    if PDF_PATHS.match(path):
+        return PDF
+    # The extractive preview is answered locally in milliseconds
+    if LLM_PATHS.match(path) and query.get("preview", "").lower() not in ("true", "1"):
+        return LLM
+    return DEFAULT
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst`"""
+
+    def __init__(self, rate: float, burst: float, now: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic() if now is None else now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, cost: float, now: float) -> float:
+        """Seconds until `cost` tokens are available (0 if they are now)"""
+        self._refill(now)
+        if self.tokens >= cost:
+            return 0.0
+        if self.rate <= 0 or cost > self.burst:
+            return math.inf
+        return (cost - self.tokens) / self.rate
+
+    def take(self, cost: float):
+        self.tokens -= cost
+
+
+class Rejected(Exception):
+    """Request refused by admission control"""
+
+    def __init__(self, status_code: int, retry_after: float, reason: str):
+        super().__init__(reason)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.reason = reason
+
+    @property
+    def retry_after_header(self) -> str:
+        # Whole seconds, at least 1
+        return str(max(1, math.ceil(min(self.retry_after, 3600))))
+
+
+@dataclass
+class ClassStats:
+    admitted: int = 0
+    rejected_user_rate: int = 0
+    rejected_global_rate: int = 0
+    rejected_concurrency: int = 0
+    service_time: float = 0.0
+
+
+@dataclass
+class AdmissionSettings:
+    user_rate: float = DEFAULT_USER_RATE
+    user_burst: float = DEFAULT_USER_BURST
+    global_rate: float = DEFAULT_GLOBAL_RATE
+    global_burst: float = DEFAULT_GLOBAL_BURST
+    concurrency: Dict[str, int] = field(default_factory=lambda: dict(DEFAULT_CONCURRENCY))
+    queue_timeout: float = DEFAULT_QUEUE_TIMEOUT_SECONDS
+
+
+class AdmissionController:
+    def __init__(self, settings: AdmissionSettings):
+        self.settings = settings
+        self.global_bucket = TokenBucket(settings.global_rate, settings.global_burst)
+        self.user_buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.semaphores = {name: asyncio.Semaphore(limit) for name, limit in settings.concurrency.items()}
+        self.running = {name: 0 for name in settings.concurrency}
+        self.stats = {name: ClassStats() for name in settings.concurrency}
+        # Session token -> user id, learned on authentication
+        self._identities: "OrderedDict[str, str]" = OrderedDict()
+
+    def remember(self, session_token: str, user_id: str):
+        """Charge later requests of this session to the user's bucket"""
+        self._identities[session_token] = user_id
+        self._identities.move_to_end(session_token)
+        if len(self._identities) > MAX_TRACKED_USERS:
+            self._identities.popitem(last=False)
+
+    def forget(self, session_token: str):
+        self._identities.pop(session_token, None)
+
+    def knows(self, session_token: str) -> bool:
+        return session_token in self._identities
+
+    def identity(self, session_token: Optional[str], client_host: Optional[str]) -> str:
+        """Bucket key of a request: its user once the session is known, its client address otherwise.
+
+        An unknown session token is not a key of its own: any client can
+        make up a fresh token per request.
+        """
+        user_id = self._identities.get(session_token) if session_token else None
+        return user_id or f"client:{client_host}"
+
+    def _user_bucket(self, key: str, now: float) -> TokenBucket:
+        bucket = self.user_buckets.get(key)
+        if bucket is None:
+            bucket = self.user_buckets[key] = TokenBucket(self.settings.user_rate, self.settings.user_burst, now)
+            if len(self.user_buckets) > MAX_TRACKED_USERS:
+                self.user_buckets.popitem(last=False)
+        else:
+            self.user_buckets.move_to_end(key)
+        return bucket
+
+    def check_rate(self, key: str, endpoint: str):
+        """Take the request's tokens from both buckets, or raise Rejected without taking any"""
+        now = time.monotonic()
+        cost = CLASS_COSTS[endpoint]
+        stats = self.stats[endpoint]
+        user_bucket = self._user_bucket(key, now)
+        wait = user_bucket.wait_time(cost, now)
+        if wait:
+            stats.rejected_user_rate += 1
+            raise Rejected(429, wait, "Too many requests")
+        wait = self.global_bucket.wait_time(cost, now)
+        if wait:
+            stats.rejected_global_rate += 1
+            raise Rejected(503, wait, "Server busy")
+        user_bucket.take(cost)
+        self.global_bucket.take(cost)
+
+    async def acquire(self, endpoint: str):
+        """Take a concurrency slot of the class, waiting at most the queue timeout"""
+        semaphore = self.semaphores[endpoint]
+        stats = self.stats[endpoint]
+        acquired = admitted = False
+        try:
+            # A free slot is taken without suspending, whatever the timeout
+            async with asyncio.timeout(max(0.0, self.settings.queue_timeout)):
+                await semaphore.acquire()
+                acquired = True
+            admitted = True
+        except TimeoutError:
+            stats.rejected_concurrency += 1
+            raise Rejected(503, stats.service_time, "Server busy")
+        finally:
+            # Granted just as the timeout or a cancellation hit: hand the slot back
+            if acquired and not admitted:
+                semaphore.release()
+        stats.admitted += 1
+        self.running[endpoint] += 1
+
+    def release(self, endpoint: str, service_time: float):
+        stats = self.stats[endpoint]
+        stats.service_time += SERVICE_TIME_ALPHA * (service_time - stats.service_time)
+        self.running[endpoint] -= 1
+        self.semaphores[endpoint].release()
+
+    def snapshot(self) -> dict:
+        self.global_bucket.wait_time(0, time.monotonic())
+        return {
+            "classes": {
+                name: {
+                    "limit": self.settings.concurrency[name],
+                    "running": self.running[name],
+                    "admitted": stats.admitted,
+                    "rejected_user_rate": stats.rejected_user_rate,
+                    "rejected_global_rate": stats.rejected_global_rate,
+                    "rejected_concurrency": stats.rejected_concurrency,
+                    "service_time_ms": round(stats.service_time * 1000, 1),
+                }
+                for name, stats in self.stats.items()
+            },
+            "global_tokens": round(self.global_bucket.tokens, 1),
+            "tracked_users": len(self.user_buckets),
+        }
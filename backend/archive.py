@@ -0,0 +1,374 @@
+"""Cold-storage tier for old anamneses.
+
+Records not modified for a configurable age are moved out of the hot
+`anamneses` collection. The full document is BSON-encoded, compressed with
+zstd and stored in `anamneses_cold`. The hot document is replaced by a small
+stub with an `archived` flag that keeps what listing and searching need:
+identification, chief complaint, metadata, audit data and timestamps, plus
+the medication, allergy and chronic condition lists the autocomplete index
+is loaded from. The other required sections are kept as empty placeholders
+so the stub still builds an `Anamnese`.
+
+Reads of a single record (get, PDF and JSON exports) rehydrate stubs
+transparently. Rehydration times are recorded in `timings`. Batch consumers
+(risk scoring, Parquet export, patient timelines, stats rebuilds) wrap their
+cursor in `HydratingCursor`, which fetches the cold documents of a whole
+batch with one query. A write to an archived record first restores it to the
+hot collection.
+
+Archiving is idempotent and safe against concurrent edits. The cold copy is
+written first, and the hot document is only replaced if it was not modified
+in between.
+
+    python archive.py run [--after-days 365] [--level 9] [--user-id ...] [--dry-run]
+    python archive.py restore <anamnese_id>
+    python archive.py report
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import bson
+import zstandard
+
+logger = logging.getLogger(__name__)
+
+COLD_COLLECTION = "anamneses_cold"
+DEFAULT_ARCHIVE_AFTER_DAYS = 365
+DEFAULT_ZSTD_LEVEL = 9
+DEFAULT_BATCH_SIZE = 200
+
+# Kept in the hot stub: the list view and the search fields
+STUB_FIELDS = [
+    "id", "user_id", "patient_id", "meta", "identificacao", "queixa_principal",
+    "auditoria", "created_at", "updated_at",
+]
+# Term lists of antecedentes.pessoais kept in the stub, so the autocomplete index loads without rehydrating
+STUB_TERM_LISTS = ("medicacoes_uso", "alergias", "cronicos")
+# Required sections of Anamnese, kept empty in the stub
+STUB_PLACEHOLDERS = {
+    "hda": {"narrativa": ""},
+    "antecedentes": {"pessoais": {}},
+    "habitos": {},
+    "psicossocial": {},
+}
+
+
+@lru_cache(maxsize=None)
+def _compressor(level: int) -> zstandard.ZstdCompressor:
+    return zstandard.ZstdCompressor(level=level)
+
+
+@lru_cache(maxsize=None)
+def _decompressor() -> zstandard.ZstdDecompressor:
+    return zstandard.ZstdDecompressor()
+
+
+def compress(anamnese: Dict[str, Any], level: int = DEFAULT_ZSTD_LEVEL) -> bytes:
+    return _compressor(level).compress(bson.encode(anamnese))
+
+
+def decompress(blob: bytes) -> Dict[str, Any]:
+    return bson.decode(_decompressor().decompress(blob))
+
+
+def make_stub(anamnese: Dict[str, Any]) -> Dict[str, Any]:
+    stub = {field: anamnese[field] for field in STUB_FIELDS if field in anamnese}
+    stub.update(STUB_PLACEHOLDERS)
+    pessoais = (anamnese.get("antecedentes") or {}).get("pessoais") or {}
+    stub["antecedentes"] = {"pessoais": {name: pessoais.get(name) or [] for name in STUB_TERM_LISTS}}
+    stub["archived"] = True
+    return stub
+
+
+def stub_has_terms(stub: Dict[str, Any]) -> bool:
+    """False for stubs archived before the term lists were kept in them"""
+    pessoais = (stub.get("antecedentes") or {}).get("pessoais") or {}
+    return all(name in pessoais for name in STUB_TERM_LISTS)
+
+
+# =======================
+# REHYDRATION
+# =======================
+
+class RehydrationTimings:
+    """Counters of cold reads, reported by /api/health/metrics"""
+
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.missing = 0
+
+    def record(self, seconds: float, documents: int = 1):
+        self.count += documents
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "rehydrated": self.count,
+            "mean_ms": round(self.total_seconds / self.count * 1000, 2) if self.count else 0.0,
+            "max_ms": round(self.max_seconds * 1000, 2),
+            "missing": self.missing,
+        }
+
+
+timings = RehydrationTimings()
+
+
+async def _load_many(cold, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    started = time.monotonic()
+    loaded = {
+        entry["id"]: decompress(entry["blob"])
+        async for entry in cold.find({"id": {"$in": ids}}, {"_id": 0, "id": 1, "blob": 1})
+    }
+    timings.record(time.monotonic() - started, len(loaded))
+    if len(loaded) < len(ids):
+        timings.missing += len(ids) - len(loaded)
+        logger.error(f"Archived anamneses without a cold copy: {sorted(set(ids) - set(loaded))}")
+    return loaded
+
+
+async def hydrate(cold, anamnese: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """Full document of an anamnese, read from cold storage if it is an archived stub"""
+    if not anamnese or not anamnese.get("archived"):
+        return anamnese
+    loaded = await _load_many(cold, [anamnese["id"]])
+    return loaded.get(anamnese["id"], anamnese)
+
+
+async def hydrate_many(cold, anamneses: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Replace the archived stubs of a batch with their full documents, in one query"""
+    archived = [a["id"] for a in anamneses if a.get("archived")]
+    if not archived:
+        return anamneses
+    loaded = await _load_many(cold, archived)
+    return [loaded.get(a["id"], a) if a.get("archived") else a for a in anamneses]
+
+
+class HydratingCursor:
+    """Wraps a Motor cursor and yields full documents, rehydrating stubs batch by batch.
+
+    The cursor projection must include `id` and `archived`; rehydrated
+    documents are complete, whatever the projection.
+    """
+
+    def __init__(self, cursor, cold, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.cursor = cursor
+        self.cold = cold
+        self._batch_size = batch_size
+
+    def batch_size(self, batch_size: int) -> "HydratingCursor":
+        self.cursor = self.cursor.batch_size(batch_size)
+        self._batch_size = batch_size
+        return self
+
+    async def __aiter__(self):
+        batch: List[Dict[str, Any]] = []
+        async for anamnese in self.cursor:
+            batch.append(anamnese)
+            if len(batch) >= self._batch_size:
+                for full in await hydrate_many(self.cold, batch):
+                    yield full
+                batch = []
+        for full in await hydrate_many(self.cold, batch):
+            yield full
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        anamneses = [a async for a in self]
+        return anamneses if length is None else anamneses[:length]
+
+
+async def restore(db, anamnese_id: str) -> Optional[Dict[str, Any]]:
+    """Move an archived anamnese back to the hot collection (before it is written to)"""
+    entry = await db[COLD_COLLECTION].find_one({"id": anamnese_id}, {"_id": 0, "blob": 1})
+    if not entry:
+        return None
+    anamnese = decompress(entry["blob"])
+    result = await db.anamneses.replace_one({"id": anamnese_id, "archived": True}, anamnese)
+    if result.matched_count:
+        await db[COLD_COLLECTION].delete_one({"id": anamnese_id})
+    return anamnese
+
+
+async def delete(db, anamnese_id: str):
+    await db[COLD_COLLECTION].delete_one({"id": anamnese_id})
+
+
+async def ensure_indexes(cold):
+    await cold.create_index("id", unique=True)
+
+
+# =======================
+# ARCHIVING
+# =======================
+
+@dataclass
+class ArchiveReport:
+    archived: int = 0
+    skipped: int = 0
+    raw_bytes: int = 0
+    compressed_bytes: int = 0
+    stub_bytes: int = 0
+
+    @property
+    def hot_bytes_freed(self) -> int:
+        return self.raw_bytes - self.stub_bytes
+
+    def __str__(self) -> str:
+        ratio = self.raw_bytes / self.compressed_bytes if self.compressed_bytes else 0
+        return (
+            f"{self.archived} archived, {self.skipped} skipped (modified meanwhile); "
+            f"{self.raw_bytes} B -> {self.compressed_bytes} B zstd ({ratio:.1f}x), "
+            f"{self.hot_bytes_freed} B freed in the hot collection"
+        )
+
+
+async def archive_one(db, anamnese: Dict[str, Any], level: int = DEFAULT_ZSTD_LEVEL, report: Optional[ArchiveReport] = None) -> bool:
+    report = report if report is not None else ArchiveReport()
+    raw_bytes = len(bson.encode(anamnese))
+    blob = compress(anamnese, level)
+    stub = make_stub(anamnese)
+    cold = db[COLD_COLLECTION]
+    await cold.replace_one(
+        {"id": anamnese["id"]},
+        {
+            "id": anamnese["id"],
+            "user_id": anamnese["user_id"],
+            "blob": bson.Binary(blob),
+            "raw_bytes": raw_bytes,
+            "archived_at": datetime.now(timezone.utc).isoformat(),
+        },
+        upsert=True
+    )
+    # Only if untouched since it was read; otherwise the cold copy is stale. Every
+    # write bumps updated_at, and updates also bump the record version
+    result = await db.anamneses.replace_one(
+        {
+            "id": anamnese["id"],
+            "updated_at": anamnese.get("updated_at"),
+            "auditoria.versao_registro": (anamnese.get("auditoria") or {}).get("versao_registro"),
+            "archived": {"$ne": True},
+        },
+        stub
+    )
+    if not result.matched_count:
+        await cold.delete_one({"id": anamnese["id"]})
+        report.skipped += 1
+        return False
+    report.archived += 1
+    report.raw_bytes += raw_bytes
+    report.compressed_bytes += len(blob)
+    report.stub_bytes += len(bson.encode(stub))
+    return True
+
+
+def cutoff_for(after_days: float) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=after_days)).isoformat()
+
+
+async def archive_older_than(db, after_days: float = DEFAULT_ARCHIVE_AFTER_DAYS, level: int = DEFAULT_ZSTD_LEVEL,
+                             user_id: Optional[str] = None, dry_run: bool = False,
+                             batch_size: int = DEFAULT_BATCH_SIZE) -> ArchiveReport:
+    """Archive every hot anamnese not modified in the last `after_days` days"""
+    # updated_at is stored as an ISO string
+    query: Dict[str, Any] = {"updated_at": {"$lt": cutoff_for(after_days)}, "archived": {"$ne": True}}
+    if user_id:
+        query["user_id"] = user_id
+    await ensure_indexes(db[COLD_COLLECTION])
+    report = ArchiveReport()
+    async for anamnese in db.anamneses.find(query, {"_id": 0}).batch_size(batch_size):
+        if dry_run:
+            report.archived += 1
+            report.raw_bytes += len(bson.encode(anamnese))
+            report.compressed_bytes += len(compress(anamnese, level))
+            report.stub_bytes += len(bson.encode(make_stub(anamnese)))
+        else:
+            await archive_one(db, anamnese, level, report)
+    return report
+
+
+class ArchiveScheduler:
+    """Optional periodic archiving inside the API process"""
+
+    def __init__(self, db, interval: float, after_days: float, level: int = DEFAULT_ZSTD_LEVEL):
+        self.db = db
+        self.interval = interval
+        self.after_days = after_days
+        self.level = level
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                report = await archive_older_than(self.db, self.after_days, self.level)
+                if report.archived or report.skipped:
+                    logger.info(f"Archiving: {report}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Archiving failed: {e}")
+
+    def start(self):
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+
+async def storage_report(db) -> Dict[str, Any]:
+    hot = await db.anamneses.count_documents({"archived": {"$ne": True}})
+    stubs = await db.anamneses.count_documents({"archived": True})
+    pipeline = [{"$group": {"_id": None, "raw": {"$sum": "$raw_bytes"}, "stored": {"$sum": {"$binarySize": "$blob"}}}}]
+    sizes = await db[COLD_COLLECTION].aggregate(pipeline).to_list(1)
+    sizes = sizes[0] if sizes else {"raw": 0, "stored": 0}
+    return {"hot": hot, "archived": stubs, "cold_raw_bytes": sizes["raw"], "cold_stored_bytes": sizes["stored"]}
+
+
+def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Move old anamneses to compressed cold storage")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    run_parser = subparsers.add_parser("run", help="Archive anamneses not modified for a while")
+    run_parser.add_argument("--after-days", type=float, default=DEFAULT_ARCHIVE_AFTER_DAYS)
+    run_parser.add_argument("--level", type=int, default=DEFAULT_ZSTD_LEVEL, help="zstd compression level")
+    run_parser.add_argument("--user-id", help="Only archive the anamneses of this user")
+    run_parser.add_argument("--dry-run", action="store_true", help="Report sizes without moving anything")
+    restore_parser = subparsers.add_parser("restore", help="Move one anamnese back to the hot collection")
+    restore_parser.add_argument("anamnese_id")
+    subparsers.add_parser("report", help="Hot/archived counts and cold storage size")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        if args.command == "run":
+            report = asyncio.run(archive_older_than(db, args.after_days, args.level, args.user_id, args.dry_run))
+            print(f"{'Would archive' if args.dry_run else 'Archived'}: {report}")
+        elif args.command == "restore":
+            restored = asyncio.run(restore(db, args.anamnese_id))
+            print("Restored" if restored else "Not archived")
+        else:
+            print(asyncio.run(storage_report(db)))
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
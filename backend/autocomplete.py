@@ -0,0 +1,374 @@
+"""Autocomplete of medications, allergy agents and chronic conditions.
+
+The wizard fields antecedentes.pessoais.medicacoes_uso[].nome,
+alergias[].agente and cronicos are free text typed again for every
+patient. Suggestions come from an in-memory prefix index per field: a
+sorted array of normalized keys (textnorm.normalize, so "dipi" finds
+"Dipirona" and "hipertensao" finds "Hipertensão") searched with bisect.
+Every word start of a term is a key, so "mel" also finds "Diabetes
+mellitus". Each user has their own index with their own usage counts, and a
+global table counts usage across all users.
+
+Ranking: terms the user has written before come first, then terms matching
+from their first word, then usage counts (the user's own, then global).
+Global terms are only suggested once GLOBAL_MIN_USERS different users have
+written them, so text typed by a single clinician is never shown to others.
+A one-letter prefix can match thousands of global keys, so the global
+ranking of each typed prefix is cached and dropped when a matching term is
+written. The user's own index is small and scanned on every lookup.
+
+The index is loaded from the anamneses collection at startup (all terms
+are counted first, then each key array is sorted once) and updated with
+every create/update/delete handled by this process. With several
+worker processes, each one only sees its own writes until the next periodic
+reload (AUTOCOMPLETE_REFRESH_SECONDS). Writes that land while a reload is
+running may be missed until the following one.
+"""
+import asyncio
+import heapq
+import logging
+import time
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from itertools import islice
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel
+
+import archive
+from textnorm import normalize
+
+logger = logging.getLogger(__name__)
+
+MEDICACOES = "medicacoes_uso"
+ALERGIAS = "alergias"
+CRONICOS = "cronicos"
+FIELDS = (MEDICACOES, ALERGIAS, CRONICOS)
+
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 50
+DEFAULT_GLOBAL_MIN_USERS = 2
+# Global terms kept per cached prefix: enough to fill MAX_LIMIT after skipping the user's own
+RANKED_PER_PREFIX = 2 * MAX_LIMIT
+MAX_CACHED_PREFIXES = 10000
+MAX_TERM_LENGTH = 120
+
+
+class Suggestion(BaseModel):
+    texto: str
+    usos_proprios: int
+    usos_total: int
+
+
+def field_terms(anamnese: Optional[Dict[str, Any]]) -> Dict[str, List[str]]:
+    """Raw texts of the autocompleted fields of an anamnese"""
+    if not anamnese:
+        return {}
+    pessoais = (anamnese.get("antecedentes") or {}).get("pessoais") or {}
+    return {
+        MEDICACOES: [item.get("nome") or "" for item in pessoais.get("medicacoes_uso") or [] if isinstance(item, dict)],
+        ALERGIAS: [item.get("agente") or "" for item in pessoais.get("alergias") or [] if isinstance(item, dict)],
+        CRONICOS: [str(item) for item in pessoais.get("cronicos") or []],
+    }
+
+
+def term_key(text: str) -> str:
+    return normalize(text).strip(" .,;:-")[:MAX_TERM_LENGTH]
+
+
+def _spelling(text: str) -> str:
+    return " ".join(text.split())
+
+
+def _record_terms(anamnese: Optional[Dict[str, Any]]) -> Iterator[Tuple[str, str, str]]:
+    """(field, term, text as typed) of an anamnese; a term repeated in one record counts once"""
+    for name, texts in field_terms(anamnese).items():
+        for term, text in {term_key(text): text for text in texts}.items():
+            if term:
+                yield name, term, text
+
+
+def _word_starts(term: str) -> Iterator[str]:
+    yield term
+    for position, char in enumerate(term):
+        if char == " ":
+            yield term[position + 1:]
+
+
+class PrefixIndex:
+    """Usage counts of normalized terms, searchable by the prefix of any of their words"""
+
+    def __init__(self):
+        # (key, term) pairs sorted by key; a term has one key per word
+        self.keys: List[Tuple[str, str]] = []
+        self.counts: Dict[str, int] = {}
+
+    @classmethod
+    def from_counts(cls, counts: Dict[str, int]) -> "PrefixIndex":
+        """Index of many terms at once: the keys are sorted once instead of inserted one by one"""
+        index = cls()
+        index.counts = dict(counts)
+        index.keys = sorted((key, term) for term in counts for key in _word_starts(term))
+        return index
+
+    def add(self, term: str, count: int = 1) -> bool:
+        """Count uses of a term; True if the term was not indexed yet"""
+        new = term not in self.counts
+        if new:
+            self.counts[term] = 0
+            for key in _word_starts(term):
+                insort(self.keys, (key, term))
+        self.counts[term] += count
+        return new
+
+    def remove(self, term: str, count: int = 1) -> bool:
+        """Uncount uses of a term; True if it is no longer used and left the index"""
+        if term not in self.counts:
+            return False
+        self.counts[term] -= count
+        if self.counts[term] > 0:
+            return False
+        del self.counts[term]
+        for key in _word_starts(term):
+            position = bisect_left(self.keys, (key, term))
+            if position < len(self.keys) and self.keys[position] == (key, term):
+                del self.keys[position]
+        return True
+
+    def matches(self, prefix: str, limit: Optional[int] = None) -> Iterator[Tuple[str, bool]]:
+        """(term, matched from its first word) for every key starting with prefix"""
+        position = bisect_left(self.keys, (prefix, ""))
+        end = len(self.keys) if limit is None else min(len(self.keys), position + limit)
+        while position < end:
+            key, term = self.keys[position]
+            if not key.startswith(prefix):
+                return
+            yield term, key == term
+            position += 1
+
+
+class FieldIndex:
+    """Global and per-user indexes of one autocompleted field"""
+
+    def __init__(self, global_min_users: int = DEFAULT_GLOBAL_MIN_USERS):
+        self.global_min_users = global_min_users
+        self.global_index = PrefixIndex()
+        self.users: Dict[str, PrefixIndex] = {}
+        # Distinct users per term and spellings as typed, for display
+        self.user_counts: Counter = Counter()
+        self.spellings: Dict[str, Counter] = {}
+        # Typed prefix -> best shared terms, (term, matched from its first word)
+        self._ranked: Dict[str, List[Tuple[str, bool]]] = {}
+
+    @classmethod
+    def from_uses(cls, uses: Dict[str, Counter], spellings: Dict[str, Counter],
+                  global_min_users: int = DEFAULT_GLOBAL_MIN_USERS) -> "FieldIndex":
+        """Index of per-user term counts gathered beforehand (see IndexBuilder)"""
+        index = cls(global_min_users)
+        total: Counter = Counter()
+        for user_id, counts in uses.items():
+            index.users[user_id] = PrefixIndex.from_counts(counts)
+            index.user_counts.update(counts.keys())
+            total.update(counts)
+        index.global_index = PrefixIndex.from_counts(total)
+        index.spellings = spellings
+        return index
+
+    def _invalidate(self, term: str):
+        if self._ranked:
+            for key in _word_starts(term):
+                for end in range(1, len(key) + 1):
+                    self._ranked.pop(key[:end], None)
+
+    def ranked(self, prefix: str) -> List[Tuple[str, bool]]:
+        """Terms written by at least global_min_users users, best first"""
+        ranked = self._ranked.get(prefix)
+        if ranked is None:
+            candidates: Dict[str, bool] = {}
+            for term, from_start in self.global_index.matches(prefix):
+                if self.user_counts[term] >= self.global_min_users:
+                    candidates[term] = candidates.get(term, False) or from_start
+            counts = self.global_index.counts
+            ranked = heapq.nlargest(RANKED_PER_PREFIX, candidates.items(), key=lambda item: (item[1], counts[item[0]]))
+            if len(self._ranked) >= MAX_CACHED_PREFIXES:
+                self._ranked.clear()
+            self._ranked[prefix] = ranked
+        return ranked
+
+    def add(self, user_id: str, text: str, count: int = 1):
+        term = term_key(text)
+        if not term:
+            return
+        self._invalidate(term)
+        self.global_index.add(term, count)
+        self.spellings.setdefault(term, Counter())[_spelling(text)] += count
+        if self.users.setdefault(user_id, PrefixIndex()).add(term, count):
+            self.user_counts[term] += 1
+
+    def remove(self, user_id: str, text: str, count: int = 1):
+        term = term_key(text)
+        user_index = self.users.get(user_id)
+        if not term or user_index is None or term not in self.global_index.counts:
+            return
+        self._invalidate(term)
+        if user_index.remove(term, count):
+            self.user_counts[term] -= 1
+            if self.user_counts[term] <= 0:
+                del self.user_counts[term]
+            if not user_index.counts:
+                del self.users[user_id]
+        if self.global_index.remove(term, count):
+            self.spellings.pop(term, None)
+        else:
+            spelling, typed = self.spellings.get(term), _spelling(text)
+            if spelling is not None and typed in spelling:
+                spelling[typed] -= count
+                if spelling[typed] <= 0:
+                    del spelling[typed]
+
+    def display(self, term: str) -> str:
+        spelling = self.spellings.get(term)
+        return spelling.most_common(1)[0][0] if spelling else term
+
+
+class IndexBuilder:
+    """Term counts of many anamneses, indexed at once when all were seen"""
+
+    def __init__(self):
+        self.uses: Dict[str, Dict[str, Counter]] = {name: defaultdict(Counter) for name in FIELDS}
+        self.spellings: Dict[str, Dict[str, Counter]] = {name: {} for name in FIELDS}
+
+    def add(self, anamnese: Dict[str, Any]):
+        for name, term, text in _record_terms(anamnese):
+            self.uses[name][anamnese["user_id"]][term] += 1
+            self.spellings[name].setdefault(term, Counter())[_spelling(text)] += 1
+
+    def build(self, global_min_users: int = DEFAULT_GLOBAL_MIN_USERS) -> Dict[str, FieldIndex]:
+        return {
+            name: FieldIndex.from_uses(self.uses[name], self.spellings[name], global_min_users)
+            for name in FIELDS
+        }
+
+
+class Autocomplete:
+    def __init__(self, global_min_users: int = DEFAULT_GLOBAL_MIN_USERS):
+        self.global_min_users = global_min_users
+        self.fields = {name: FieldIndex(global_min_users) for name in FIELDS}
+        self.loaded = False
+        self.load_ms = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def _apply(self, user_id: str, anamnese: Optional[Dict[str, Any]], sign: int):
+        for name, _, text in _record_terms(anamnese):
+            if sign > 0:
+                self.fields[name].add(user_id, text)
+            else:
+                self.fields[name].remove(user_id, text)
+
+    def record_change(self, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]):
+        """Apply a create (old=None), update or delete (new=None) to the indexes"""
+        if old:
+            self._apply(old["user_id"], old, -1)
+        if new:
+            self._apply(new["user_id"], new, 1)
+
+    def suggest(self, user_id: str, field: str, prefix: str, limit: int = DEFAULT_LIMIT) -> List[Suggestion]:
+        """Top `limit` terms of a field starting (at any word) with the prefix"""
+        key = normalize(prefix)
+        index = self.fields[field]
+        if not key or limit <= 0:
+            return []
+        own = index.users.get(user_id)
+        own_counts = own.counts if own else {}
+        global_counts = index.global_index.counts
+
+        candidates: Dict[str, bool] = {}
+        if own:
+            for term, from_start in own.matches(key):
+                candidates[term] = candidates.get(term, False) or from_start
+        ranked = heapq.nlargest(limit, candidates, key=lambda term: (
+            candidates[term],
+            own_counts[term],
+            global_counts[term],
+        ))
+        if len(ranked) < limit:
+            shared = (term for term, _ in index.ranked(key) if term not in own_counts)
+            ranked.extend(islice(shared, limit - len(ranked)))
+        return [
+            Suggestion(texto=index.display(term), usos_proprios=own_counts.get(term, 0), usos_total=global_counts.get(term, 0))
+            for term in ranked
+        ]
+
+    async def load(self, db, batch_size: int = 500) -> int:
+        """Rebuild the indexes from the anamneses collection and swap them in.
+
+        Archived stubs carry the term lists, so nothing is decompressed;
+        only stubs archived before that are rehydrated.
+        """
+        started = time.perf_counter()
+        builder = IndexBuilder()
+        projection = {
+            "_id": 0,
+            "id": 1,
+            "archived": 1,
+            "user_id": 1,
+            "antecedentes.pessoais.medicacoes_uso.nome": 1,
+            "antecedentes.pessoais.alergias.agente": 1,
+            "antecedentes.pessoais.cronicos": 1,
+        }
+        count = 0
+        legacy: List[Dict[str, Any]] = []
+        cold = db[archive.COLD_COLLECTION]
+        async for anamnese in db.anamneses.find({}, projection).batch_size(batch_size):
+            if anamnese.get("archived") and not archive.stub_has_terms(anamnese):
+                legacy.append(anamnese)
+                if len(legacy) >= batch_size:
+                    for full in await archive.hydrate_many(cold, legacy):
+                        builder.add(full)
+                    legacy = []
+            else:
+                builder.add(anamnese)
+            count += 1
+            if count % batch_size == 0:
+                # Let requests run between batches
+                await asyncio.sleep(0)
+        if legacy:
+            for full in await archive.hydrate_many(cold, legacy):
+                builder.add(full)
+        self.fields = builder.build(self.global_min_users)
+        self.loaded = True
+        self.load_ms = (time.perf_counter() - started) * 1000
+        return count
+
+    async def _reload_periodically(self, db, interval: float):
+        while True:
+            try:
+                count = await self.load(db)
+                logger.info(f"Autocomplete index loaded from {count} anamneses in {self.load_ms:.0f} ms")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Error loading autocomplete index: {e}")
+            if interval <= 0:
+                return
+            await asyncio.sleep(interval)
+
+    def start(self, db, refresh_seconds: float = 0):
+        """Load in the background (and reload every refresh_seconds, 0 = only once)"""
+        self._task = asyncio.create_task(self._reload_periodically(db, refresh_seconds))
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def snapshot(self) -> dict:
+        return {
+            "loaded": self.loaded,
+            "load_ms": round(self.load_ms, 1),
+            "fields": {
+                name: {"terms": len(index.global_index.counts), "users": len(index.users)}
+                for name, index in self.fields.items()
+            },
+        }
@@ -0,0 +1,104 @@
+"""Read latency during a burst of PDF exports, with and without admission control.
+
+    python benchmarks/bench_admission.py [--reads 400] [--pdfs 200] [--pdf-concurrency 4]
+
+One user fires a burst of PDF exports while other users keep reading. Reads
+are short awaits (a Mongo round trip); a PDF holds a thread for a CPU-bound
+render, so a burst of them queues up behind the default thread pool and the
+GIL. Reports read p50/p95/p99 and how many PDF requests were turned away.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import admission  # noqa: E402
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def render(cpu_seconds: float):
+    deadline = time.perf_counter() + cpu_seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def handle(controller, key: str, endpoint: str, work):
+    if controller is None:
+        return await work()
+    try:
+        controller.check_rate(key, endpoint)
+        await controller.acquire(endpoint)
+    except admission.Rejected:
+        return None
+    started = time.monotonic()
+    try:
+        return await work()
+    finally:
+        controller.release(endpoint, time.monotonic() - started)
+
+
+async def run(controller, args):
+    read_latencies: List[float] = []
+    rejected_pdfs = 0
+
+    async def read(i: int):
+        await asyncio.sleep(i * args.read_interval)
+        started = time.monotonic()
+
+        async def work():
+            # Mongo round trip plus response serialization
+            await asyncio.sleep(0.002)
+            render(0.0002)
+            return True
+
+        if await handle(controller, f"reader_{i % 20}", admission.DEFAULT, work):
+            read_latencies.append((time.monotonic() - started) * 1000)
+
+    async def pdf(i: int):
+        nonlocal rejected_pdfs
+
+        async def work():
+            await asyncio.sleep(0.002)
+            await asyncio.to_thread(render, args.render_ms / 1000)
+            return True
+
+        if not await handle(controller, "hammering_user", admission.PDF, work):
+            rejected_pdfs += 1
+
+    await asyncio.gather(*(read(i) for i in range(args.reads)), *(pdf(i) for i in range(args.pdfs)))
+    return read_latencies, rejected_pdfs
+
+
+async def main_async(args):
+    print(f"{'admission':10} {'read p50':>9} {'read p95':>9} {'read p99':>9} {'pdf rejected':>13}")
+    for label, enabled in [("off", False), ("on", True)]:
+        controller = admission.AdmissionController(admission.AdmissionSettings(
+            concurrency={admission.DEFAULT: 64, admission.PDF: args.pdf_concurrency, admission.LLM: 8}
+        )) if enabled else None
+        latencies, rejected = await run(controller, args)
+        print(
+            f"{label:10} {percentile(latencies, 0.5):7.1f}ms {percentile(latencies, 0.95):7.1f}ms "
+            f"{percentile(latencies, 0.99):7.1f}ms {rejected:6d}/{args.pdfs}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reads", type=int, default=400)
+    parser.add_argument("--read-interval", type=float, default=0.002, help="seconds between reads")
+    parser.add_argument("--pdfs", type=int, default=200)
+    parser.add_argument("--render-ms", type=float, default=15.0)
+    parser.add_argument("--pdf-concurrency", type=int, default=admission.DEFAULT_CONCURRENCY[admission.PDF])
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
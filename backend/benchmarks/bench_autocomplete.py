@@ -0,0 +1,115 @@
+"""Autocomplete lookup latency.
+
+    python benchmarks/bench_autocomplete.py [--users 200] [--records 50] [--vocabulary 5000]
+
+Indexes synthetic records whose medications are drawn with a skewed
+(Zipf-like) distribution from a generated vocabulary, then times lookups
+of 1 to 6 character prefixes of indexed terms and reports the median, p99
+and maximum latency per lookup, plus the time to build the index (as a
+reload does, and record by record) and to add and remove a record.
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import autocomplete  # noqa: E402
+from samples import CRONICOS  # noqa: E402
+
+SYLLABLES = ["lo", "sar", "ta", "na", "di", "pi", "ro", "me", "tor", "fo", "mi", "ci", "ve", "pra", "zol", "am", "xi", "li", "ben", "flu"]
+FORMS = ["", " potássica", " sódica", " cloridrato", " 50mg", " 500mg", " comprimido"]
+
+
+def vocabulary(rng: random.Random, size: int) -> list:
+    terms = set()
+    while len(terms) < size:
+        stem = "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        terms.add(stem.capitalize() + rng.choice(FORMS))
+    return sorted(terms)
+
+
+def record(rng: random.Random, user_id: str, terms: list) -> dict:
+    # Low ranks are much more frequent, as with real prescriptions
+    medications = {terms[int(len(terms) * rng.random() ** 4)] for _ in range(rng.randint(0, 5))}
+    return {
+        "user_id": user_id,
+        "antecedentes": {"pessoais": {
+            "medicacoes_uso": [{"nome": name} for name in medications],
+            "alergias": [{"agente": "Dipirona"}] if rng.random() < 0.3 else [],
+            "cronicos": rng.sample(CRONICOS, rng.randint(0, 3)),
+        }},
+    }
+
+
+def percentile(samples: list, share: float) -> float:
+    return sorted(samples)[min(len(samples) - 1, int(len(samples) * share))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--records", type=int, default=50, help="records per user")
+    parser.add_argument("--vocabulary", type=int, default=5000)
+    parser.add_argument("--lookups", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    terms = vocabulary(rng, args.vocabulary)
+    rng.shuffle(terms)
+    users = [f"user-{n}" for n in range(args.users)]
+    records = [record(rng, user_id, terms) for user_id in users for _ in range(args.records)]
+
+    incremental = autocomplete.Autocomplete()
+    started = time.perf_counter()
+    for doc in records:
+        incremental.record_change(None, doc)
+    insert_build = time.perf_counter() - started
+
+    # As a reload builds it: counts first, keys sorted once
+    index = autocomplete.Autocomplete()
+    started = time.perf_counter()
+    builder = autocomplete.IndexBuilder()
+    for doc in records:
+        builder.add(doc)
+    index.fields = builder.build()
+    bulk_build = time.perf_counter() - started
+
+    medications = index.fields[autocomplete.MEDICACOES]
+    assert medications.global_index.keys == incremental.fields[autocomplete.MEDICACOES].global_index.keys
+    print(
+        f"{len(records)} records, {len(medications.global_index.counts)} distinct medications, "
+        f"{len(medications.global_index.keys)} keys: built in {bulk_build * 1000:.0f} ms "
+        f"({insert_build * 1000:.0f} ms inserting record by record)"
+    )
+
+    indexed = list(medications.spellings)
+    print(f"{'prefix length':14} {'median us':>10} {'p99 us':>8} {'max us':>8} {'results':>8}")
+    for length in range(1, 7):
+        latencies, results = [], 0
+        for _ in range(args.lookups // 6):
+            prefix = rng.choice(indexed)[:length]
+            user_id = rng.choice(users)
+            started = time.perf_counter()
+            results += len(index.suggest(user_id, autocomplete.MEDICACOES, prefix))
+            latencies.append((time.perf_counter() - started) * 1e6)
+        print(
+            f"{length:14} {statistics.median(latencies):10.1f} {percentile(latencies, 0.99):8.1f} "
+            f"{max(latencies):8.1f} {results / len(latencies):8.1f}"
+        )
+
+    writes = []
+    for doc in rng.sample(records, min(1000, len(records))):
+        started = time.perf_counter()
+        index.record_change(doc, None)
+        index.record_change(None, doc)
+        writes.append((time.perf_counter() - started) * 1e6)
+    print(f"update of one record (remove + add): median {statistics.median(writes):.1f} us, p99 {percentile(writes, 0.99):.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Anamnese insert throughput with per-request inserts and with group commit.
+
+    python benchmarks/bench_inserts.py [--inserts 2000] [--concurrency 1 16 64 256]
+    python benchmarks/bench_inserts.py --simulated
+
+Fires `--inserts` creates with each concurrency level, once with one
+insert_one per request and once through groupcommit.InsertBatcher, and
+reports inserts per second, p50/p99 latency per insert and the mean batch
+size. Runs against MONGO_URL (backend/.env) in a scratch collection that is
+dropped afterwards. `--simulated` replaces MongoDB with a model of one: a
+network round trip per operation plus server time per operation and per
+document, with a bounded number of operations executing at once.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import groupcommit  # noqa: E402
+import sparse  # noqa: E402
+from samples import stored_document  # noqa: E402
+
+SCRATCH_COLLECTION = "bench_inserts"
+
+
+class SimulatedCollection:
+    """Round trip, per-operation and per-document server time; `workers` operations execute at once"""
+
+    def __init__(self, round_trip: float = 0.0005, per_operation: float = 0.0002, per_document: float = 0.00002, workers: int = 8):
+        self.round_trip = round_trip
+        self.per_operation = per_operation
+        self.per_document = per_document
+        self.workers = asyncio.Semaphore(workers)
+
+    async def _operation(self, documents: int):
+        await asyncio.sleep(self.round_trip / 2)
+        async with self.workers:
+            await asyncio.sleep(self.per_operation + self.per_document * documents)
+        await asyncio.sleep(self.round_trip / 2)
+
+    async def insert_one(self, document):
+        document.setdefault("_id", id(document))
+        await self._operation(1)
+
+    async def insert_many(self, documents, ordered=True):
+        for document in documents:
+            document.setdefault("_id", id(document))
+        await self._operation(len(documents))
+
+    async def drop(self):
+        pass
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run(collection, documents: List[dict], concurrency: int, batcher=None) -> dict:
+    queue = iter(documents)
+    latencies: List[float] = []
+
+    async def worker():
+        for document in queue:
+            document = dict(document)
+            started = time.perf_counter()
+            if batcher is None:
+                await collection.insert_one(document)
+            else:
+                await batcher.insert(document)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "throughput": len(documents) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "batch": batcher.stats.mean_batch_size if batcher else 1.0,
+    }
+
+
+async def main_async(args):
+    rng = random.Random(args.seed)
+    documents = [sparse.encode(stored_document(rng)) for _ in range(args.inserts)]
+
+    client = None
+    if args.simulated:
+        collection = SimulatedCollection()
+        target = "simulated MongoDB (0.5 ms round trip, 0.2 ms + 0.02 ms/document, 8 workers)"
+    else:
+        from dotenv import load_dotenv
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        load_dotenv(Path(__file__).resolve().parent.parent / '.env')
+        client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+        collection = client[os.environ['DB_NAME']][SCRATCH_COLLECTION]
+        target = f"{os.environ['MONGO_URL'].split('@')[-1]}, collection {SCRATCH_COLLECTION}"
+
+    print(f"{args.inserts} inserts per run against {target}")
+    print(f"{'concurrency':>11} {'mode':>10} {'inserts/s':>10} {'p50 ms':>8} {'p99 ms':>8} {'batch':>6}")
+    try:
+        for concurrency in args.concurrency:
+            for mode in ("per-request", "batched"):
+                await collection.drop()
+                batcher = None
+                if mode == "batched":
+                    batcher = groupcommit.InsertBatcher(collection, args.max_batch_size, args.linger_ms / 1000)
+                result = await run(collection, documents, concurrency, batcher)
+                print(
+                    f"{concurrency:11} {mode:>10} {result['throughput']:10.0f} "
+                    f"{result['p50_ms']:8.2f} {result['p99_ms']:8.2f} {result['batch']:6.1f}"
+                )
+        await collection.drop()
+    finally:
+        if client is not None:
+            client.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--inserts", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16, 64, 256])
+    parser.add_argument("--max-batch-size", type=int, default=groupcommit.DEFAULT_MAX_BATCH_SIZE)
+    parser.add_argument("--linger-ms", type=float, default=groupcommit.DEFAULT_LINGER_SECONDS * 1000)
+    parser.add_argument("--simulated", action="store_true", help="Model MongoDB instead of connecting to MONGO_URL")
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
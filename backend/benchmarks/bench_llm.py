@@ -0,0 +1,102 @@
+"""Summary latency with and without hedged LLM requests, on fake providers.
+
+    python benchmarks/bench_llm.py [--calls 400] [--concurrency 20]
+        [--primary "fake/primary?median_ms=40&sigma=0.9"]
+        [--alternate "fake/alternate?median_ms=50&sigma=0.5"]
+
+Latencies are scaled down (tens of ms) so the run takes seconds; only the
+shape of the distributions matters. Reports p50/p95/p99 of each client
+configuration, how often a hedge was sent and how many upstream calls that cost.
+"""
+import argparse
+import asyncio
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import llm  # noqa: E402
+
+
+class CountingProvider:
+    def __init__(self, provider):
+        self.provider = provider
+        self.name = provider.name
+        self.calls = 0
+
+    async def complete(self, system: str, prompt: str, session_id: str) -> str:
+        self.calls += 1
+        return await self.provider.complete(system, prompt, session_id)
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run(client: llm.LlmClient, calls: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    results: List[llm.Completion] = []
+    failures = 0
+
+    async def one(i: int):
+        nonlocal failures
+        async with semaphore:
+            try:
+                results.append(await client.complete("system", "prompt", f"bench_{i}"))
+            except llm.LlmError:
+                failures += 1
+
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    return results, failures
+
+
+async def main_async(args):
+    configurations = [("single call", False), ("hedged", True)]
+    print(f"{'client':14} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'hedged':>7} {'calls/req':>9} {'failed':>6}")
+    for label, hedging in configurations:
+        rng = random.Random(args.seed)
+        primary = CountingProvider(llm.provider_from_spec(args.primary))
+        alternate = CountingProvider(llm.provider_from_spec(args.alternate))
+        primary.provider.rng = random.Random(rng.random())
+        alternate.provider.rng = random.Random(rng.random())
+        client = llm.LlmClient(
+            primary, alternate, deadline=args.deadline, hedging=hedging,
+            hedge_quantile=args.hedge_quantile, min_hedge_delay=0, rng=rng
+        )
+        # Warm-up so the hedge delay is the observed p95, not the default
+        await run(client, llm.MIN_LATENCY_SAMPLES * 2, args.concurrency)
+        primary.calls = alternate.calls = 0
+
+        started = time.monotonic()
+        results, failures = await run(client, args.calls, args.concurrency)
+        latencies = [r.latency * 1000 for r in results]
+        hedged = sum(r.hedged for r in results) / max(len(results), 1)
+        upstream = (primary.calls + alternate.calls) / args.calls
+        print(
+            f"{label:14} {percentile(latencies, 0.5):8.1f} {percentile(latencies, 0.95):8.1f} "
+            f"{percentile(latencies, 0.99):8.1f} {hedged:7.1%} {upstream:9.2f} {failures:6d}"
+            f"   ({time.monotonic() - started:.1f} s)"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--primary", default="fake/primary?median_ms=40&sigma=0.9&failure_rate=0.01")
+    parser.add_argument("--alternate", default="fake/alternate?median_ms=50&sigma=0.5")
+    parser.add_argument("--deadline", type=float, default=5.0)
+    parser.add_argument("--hedge-quantile", type=float, default=0.95)
+    parser.add_argument("--seed", type=int, default=7)
+    # Retries are expected with failing fake providers
+    logging.basicConfig(level=logging.ERROR)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Validate/serialize cost per document for the anamnese models.
+
+    python benchmarks/bench_models.py [--docs 200] [--repeat 5]
+
+Reports the best-of-N time per document (microseconds) of each strategy used
+on the write path (JSON validation) and on the read path (model validation
+vs the cached adapter, then JSON serialization).
+"""
+import argparse
+import json
+import random
+import sys
+import timeit
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import model_io  # noqa: E402
+from models import Anamnese, AnamneseCreate, AnamneseUpdate  # noqa: E402
+from samples import create_payload, stored_document  # noqa: E402
+
+
+def per_doc_us(fn, docs: int, repeat: int) -> float:
+    return min(timeit.repeat(fn, number=1, repeat=repeat)) / docs * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    stored = [stored_document(rng) for _ in range(args.docs)]
+    payloads = [create_payload(rng) for _ in range(args.docs)]
+    create_raw = [json.dumps(p).encode() for p in payloads]
+    update_raw = [json.dumps({k: p[k] for k in ("hda", "habitos", "antecedentes")}).encode() for p in payloads]
+    stored_raw = [json.dumps(d).encode() for d in stored]
+    n, r = args.docs, args.repeat
+
+    validated: List[Anamnese] = [Anamnese.model_validate(d) for d in stored]
+    built: List[Anamnese] = [model_io.from_stored(Anamnese, d) for d in stored]
+    anamnese_adapter = model_io.adapter(Anamnese)
+
+    rows = [
+        ("AnamneseCreate", "validate (python, lax)", lambda: [AnamneseCreate.model_validate(json.loads(b)) for b in create_raw]),
+        ("AnamneseCreate", "validate_json (cached, strict)", lambda: [model_io.validate_json(AnamneseCreate, b) for b in create_raw]),
+        ("AnamneseUpdate", "validate (python, lax)", lambda: [AnamneseUpdate.model_validate(json.loads(b)) for b in update_raw]),
+        ("AnamneseUpdate", "validate_json (cached, strict)", lambda: [model_io.validate_json(AnamneseUpdate, b) for b in update_raw]),
+        ("Anamnese", "validate_json (full)", lambda: [anamnese_adapter.validate_json(b) for b in stored_raw]),
+        ("Anamnese", "model_validate", lambda: [Anamnese.model_validate(d) for d in stored]),
+        ("Anamnese", "from_stored (cached adapter)", lambda: [model_io.from_stored(Anamnese, d) for d in stored]),
+        ("Anamnese", "model_dump_json (validated)", lambda: [m.model_dump_json() for m in validated]),
+        ("Anamnese", "adapter.dump_json (built)", lambda: [anamnese_adapter.dump_json(m) for m in built]),
+        # End to end: stored document -> response bytes
+        ("Anamnese", "read path: response_model (before)", lambda: [
+            json.dumps(Anamnese.model_validate(d).model_dump(mode="json")).encode() for d in stored
+        ]),
+        ("Anamnese", "read path: from_stored + dump_json", lambda: [
+            anamnese_adapter.dump_json(model_io.from_stored(Anamnese, d)) for d in stored
+        ]),
+        ("List[Anamnese]", "adapter.dump_json (one call)", lambda: model_io.adapter(List[Anamnese]).dump_json(built)),
+    ]
+
+    print(f"{n} documents, best of {r} runs")
+    print(f"{'model':<16} {'operation':<36} {'us/doc':>10}")
+    for model, operation, fn in rows:
+        print(f"{model:<16} {operation:<36} {per_doc_us(fn, n, r):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
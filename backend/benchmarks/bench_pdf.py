@@ -0,0 +1,60 @@
+"""PDF export throughput and size per record.
+
+    python benchmarks/bench_pdf.py [--records 100] [--font /path/to/Font.ttf]
+
+Renders synthetic records with each configuration (uncompressed, compressed
+page streams, and an embedded TrueType subset when a font is available) and
+reports pages per second, milliseconds and bytes per record.
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pdf_render  # noqa: E402
+from samples import stored_document  # noqa: E402
+
+
+def bundled_fonts() -> dict:
+    # Bitstream Vera ships with ReportLab
+    import reportlab
+    fonts = Path(reportlab.__file__).parent / "fonts"
+    return {"font_path": str(fonts / "Vera.ttf"), "bold_font_path": str(fonts / "VeraBd.ttf"), "italic_font_path": str(fonts / "VeraIt.ttf")}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=100)
+    parser.add_argument("--font", default=None, help="TrueType font to embed (default: ReportLab's Vera)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    docs = [stored_document(rng) for _ in range(args.records)]
+    fonts = {"font_path": args.font} if args.font else bundled_fonts()
+    configurations = [
+        ("Helvetica, uncompressed", pdf_render.PdfOptions(page_compression=False)),
+        ("Helvetica, compressed", pdf_render.PdfOptions(page_compression=True)),
+        (f"{Path(fonts['font_path']).stem} subset, compressed", pdf_render.PdfOptions(page_compression=True, **fonts)),
+    ]
+
+    print(f"{args.records} records")
+    print(f"{'configuration':32} {'pages/s':>8} {'ms/record':>10} {'bytes/record':>13} {'pages/record':>13}")
+    for label, options in configurations:
+        pdf_render.render_anamnese(docs[0], options)  # styles and fonts are built once per process
+        started = time.perf_counter()
+        rendered = [pdf_render.render_anamnese(doc, options) for doc in docs]
+        elapsed = time.perf_counter() - started
+        pages = sum(r.pages for r in rendered)
+        size = sum(len(r.content) for r in rendered)
+        print(
+            f"{label:32} {pages / elapsed:8.1f} {elapsed / len(docs) * 1000:10.2f} "
+            f"{size / len(docs):13.0f} {pages / len(docs):13.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
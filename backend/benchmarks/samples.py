@@ -0,0 +1,74 @@
+"""Synthetic anamnese documents for benchmarks."""
+import random
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict
+
+SISTEMAS = [
+    "geral", "respiratorio", "cardiovascular", "gastrointestinal", "geniturinario", "musculoesqueletico",
+    "neurologico", "psiquiatrico", "endocrino", "hemato", "pele", "reprodutivo",
+]
+NOMES = ["José", "Maria", "Ana", "João", "Francisco", "Antônia", "Carlos", "Luíza", "Paulo", "Conceição"]
+SOBRENOMES = ["Silva", "Santos", "Oliveira", "Souza", "Lima", "Pereira", "Ferreira", "Costa", "Rodrigues", "Almeida"]
+CRONICOS = ["Hipertensão arterial", "Diabetes mellitus tipo 2", "Asma", "DPOC", "Hipotireoidismo", "Dislipidemia"]
+NARRATIVA = (
+    "Paciente refere dor torácica em aperto, de início há {dias} dias, com irradiação para membro superior "
+    "esquerdo. Piora aos esforços e melhora com repouso. Nega febre, tosse ou dispneia em repouso. "
+    "Relata episódios semelhantes no último ano, de menor intensidade, sem procurar atendimento. "
+)
+
+
+def create_payload(rng: random.Random = random) -> Dict[str, Any]:
+    """Request body of POST /api/anamneses (AnamneseCreate)"""
+    nome = f"{rng.choice(NOMES)} {rng.choice(SOBRENOMES)} {rng.choice(SOBRENOMES)}"
+    return {
+        "meta": {"consentimento": True, "profissional": {"nome": "Dra. Teste", "registro": "CRM 1234", "unidade": "UBS Centro"},
+                 "timestamp_iso": datetime.now(timezone.utc).isoformat()},
+        "identificacao": {
+            "nome_completo": nome, "sexo_biologico": rng.choice(["masculino", "feminino"]),
+            "idade": {"valor": rng.randint(18, 90), "unidade": "anos"}, "cor_etnia": "parda", "estado_civil": "casado",
+            "ocupacao": {"atividade": "professor"}, "escolaridade": "superior",
+            "naturalidade": {"cidade": "Recife", "uf": "PE"}, "procedencia": {"cidade": "Olinda", "uf": "PE"},
+            "mae": f"{rng.choice(NOMES)} {rng.choice(SOBRENOMES)}",
+        },
+        "queixa_principal": {"texto_entre_aspas": "dor no peito", "inicio": {"há": rng.randint(1, 30), "unidade": "dias"}},
+        "hda": {
+            "narrativa": NARRATIVA.format(dias=rng.randint(1, 30)) * rng.randint(1, 4),
+            "sintomas_principais": [{"nome": "dor torácica", "intensidade_0a10": rng.randint(1, 10), "cronologia": {"inicio": "súbito"}}],
+        },
+        "interrogatorio_sistematico": {
+            sistema: {"pergunta_guarda_chuva": "Alguma queixa?", "itens": [{"sintoma": "sintoma", "presente": rng.random() < 0.2, "detalhes": ""}]}
+            for sistema in SISTEMAS
+        },
+        "antecedentes": {
+            "pessoais": {
+                "cronicos": rng.sample(CRONICOS, rng.randint(0, 3)),
+                "alergias": [{"agente": "Dipirona", "reacao": "urticária"}] if rng.random() < 0.3 else [],
+                "medicacoes_uso": [{"nome": "Losartana", "dose": "50mg", "posologia": "12/12h"}] * rng.randint(0, 3),
+            },
+            "familiares": [{"parentesco": "pai", "condicao": "IAM"}],
+            "linha_do_tempo": [{"ano": "2015", "evento": "Diagnóstico de HAS"}],
+        },
+        "habitos": {
+            "atividade_fisica": {"tipo": "caminhada", "frequencia_semana": rng.randint(0, 5), "duracao_min": 30},
+            "sono": {"horas": rng.choice([5, 6, 7, 8]), "qualidade": "regular"},
+            "tabagismo": {"status": "ex", "macos_dia": 1, "anos": 20, "carga_tabagica_packyears": rng.randint(0, 60)},
+            "etilismo": {"tipos": ["cerveja"], "doses_semana": rng.randint(0, 30), "uso_pesado_ep": rng.random() < 0.2},
+        },
+        "psicossocial": {"composicao_familiar": "mora com esposa", "dependentes": rng.randint(0, 4)},
+    }
+
+
+def stored_document(rng: random.Random = random, user_id: str = "bench-user") -> Dict[str, Any]:
+    """Document as stored in the anamneses collection"""
+    now = datetime.now(timezone.utc) - timedelta(days=rng.randint(0, 900))
+    doc = create_payload(rng)
+    doc.update({
+        "id": str(uuid.uuid4()),
+        "user_id": user_id,
+        "auditoria": {"data_hora_anamnese": now.isoformat(), "versao_registro": 1},
+        "resumo_clinico_ia": None,
+        "created_at": now.isoformat(),
+        "updated_at": now.isoformat(),
+    })
+    return doc
@@ -0,0 +1,206 @@
+"""Cold-start instrumentation and deferred loading of heavy subsystems.
+
+PDF rendering (ReportLab), the LLM client (emergentintegrations, which pulls
+in litellm) and the columnar/numeric stacks (pyarrow, numpy) are imported on
+first use, through `load`, instead of when server.py is loaded. Once the server is accepting
+traffic they are pre-warmed in a worker thread, so the first PDF or summary
+request does not pay the import either. Every deferred import is timed and
+the process keeps a small startup report (import timings, time until the
+app was ready and until the first request was answered).
+
+Reports:
+
+    python coldstart.py imports [--top 25]     # per-module import time of server.py
+    python coldstart.py ttfr [--target-ms 2000] [--runs 3]
+                                               # spawn uvicorn, time to first response
+"""
+import argparse
+import asyncio
+import importlib
+import logging
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Subsystems loaded on first use, pre-warmed after startup
+HEAVY_MODULES = [
+    "pdf_render",
+    "emergentintegrations.llm.chat",
+    "export_columnar",
+    "numpy",
+]
+
+DEFAULT_TTFR_TARGET_MS = 2000
+DEFAULT_PROBE_PATH = "/api/auth/me"
+
+_MODULE_LOADED = time.monotonic()
+
+
+def process_uptime() -> float:
+    """Seconds since the process started (Linux), or since this module was loaded"""
+    try:
+        with open("/proc/self/stat") as f:
+            # Field 22 is the start time in clock ticks since boot; the command name may contain spaces
+            started_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            boot_uptime = float(f.read().split()[0])
+        return boot_uptime - started_ticks / os.sysconf("SC_CLK_TCK")
+    except (OSError, ValueError, IndexError):
+        return time.monotonic() - _MODULE_LOADED
+
+
+class StartupReport:
+    """Import timings and cold-start milestones of the running process"""
+
+    def __init__(self):
+        self.imports: Dict[str, float] = {}
+        self.ready_after: Optional[float] = None
+        self.first_request_after: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def record_import(self, name: str, seconds: float):
+        with self._lock:
+            self.imports.setdefault(name, seconds)
+
+    def mark_ready(self):
+        self.ready_after = process_uptime()
+        logger.info(f"Startup: app ready {self.ready_after * 1000:.0f} ms after process start")
+
+    def mark_first_request(self) -> bool:
+        """Record the first answered request; returns True only the first time"""
+        if self.first_request_after is not None:
+            return False
+        self.first_request_after = process_uptime()
+        logger.info(f"Startup: first request answered {self.first_request_after * 1000:.0f} ms after process start")
+        return True
+
+    def snapshot(self) -> dict:
+        def ms(seconds: Optional[float]) -> Optional[float]:
+            return None if seconds is None else round(seconds * 1000, 1)
+
+        with self._lock:
+            imports = {name: ms(seconds) for name, seconds in self.imports.items()}
+        return {
+            "ready_after_ms": ms(self.ready_after),
+            "first_request_after_ms": ms(self.first_request_after),
+            "imports_ms": imports,
+        }
+
+
+report = StartupReport()
+
+
+def load(name: str):
+    """Import a module, recording how long the first import took"""
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    started = time.perf_counter()
+    module = importlib.import_module(name)
+    report.record_import(name, time.perf_counter() - started)
+    return module
+
+
+async def prewarm(names: Sequence[str] = HEAVY_MODULES):
+    """Import heavy modules in a worker thread, after the server started accepting traffic"""
+    for name in names:
+        try:
+            await asyncio.to_thread(load, name)
+        except ImportError as e:
+            logger.warning(f"Pre-warm: could not import {name}: {e}")
+    loaded = {name: f"{seconds * 1000:.0f} ms" for name, seconds in report.imports.items()}
+    logger.info(f"Pre-warm done: {loaded}")
+
+
+# =======================
+# REPORTS
+# =======================
+
+_IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_timings(module: str = "server", cwd: Optional[Path] = None) -> List[tuple]:
+    """(module, self us, cumulative us, depth) for every import of a fresh `import module`"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=cwd or Path(__file__).parent,
+        capture_output=True,
+        text=True,
+    )
+    timings = []
+    for line in result.stderr.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            timings.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return timings
+
+
+def time_to_first_response(port: int, path: str = DEFAULT_PROBE_PATH, timeout: float = 60.0) -> float:
+    """Spawn uvicorn and return the seconds until `path` answers with any HTTP status"""
+    import httpx
+
+    started = time.monotonic()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"],
+        cwd=Path(__file__).parent,
+    )
+    try:
+        while time.monotonic() - started < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"uvicorn exited with code {server.returncode}")
+            try:
+                httpx.get(f"http://127.0.0.1:{port}{path}", timeout=1.0)
+                return time.monotonic() - started
+            except httpx.TransportError:
+                time.sleep(0.01)
+        raise TimeoutError(f"No response from {path} after {timeout:.0f} s")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Cold-start reports for the API server")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    imports_parser = subparsers.add_parser("imports", help="Per-module import time of server.py")
+    imports_parser.add_argument("--top", type=int, default=25)
+    ttfr_parser = subparsers.add_parser("ttfr", help="Time from process spawn to the first answered request")
+    ttfr_parser.add_argument("--target-ms", type=float, default=DEFAULT_TTFR_TARGET_MS)
+    ttfr_parser.add_argument("--runs", type=int, default=3)
+    ttfr_parser.add_argument("--port", type=int, default=8765)
+    ttfr_parser.add_argument("--path", default=DEFAULT_PROBE_PATH)
+    args = parser.parse_args()
+
+    # The spawned interpreters import server.py, which needs the Mongo settings
+    load_dotenv(Path(__file__).parent / '.env')
+    if args.command == "imports":
+        timings = import_timings()
+        total = next(cumulative for name, _, cumulative, depth in reversed(timings) if depth == 0 and name == "server")
+        print(f"import server: {total / 1000:.0f} ms")
+        print(f"{'module':50} {'self ms':>8} {'cumul. ms':>10}")
+        # Direct imports of server.py, heaviest first
+        direct = [t for t in timings if t[3] == 1]
+        for name, self_us, cumulative_us, _ in sorted(direct, key=lambda t: -t[2])[:args.top]:
+            print(f"{name:50} {self_us / 1000:8.1f} {cumulative_us / 1000:10.1f}")
+        return
+
+    results = [time_to_first_response(args.port, args.path) * 1000 for _ in range(args.runs)]
+    best = min(results)
+    print(f"time to first response: {', '.join(f'{ms:.0f}' for ms in results)} ms (best {best:.0f}, target {args.target_ms:.0f})")
+    sys.exit(0 if best <= args.target_ms else 1)
+
+
+if __name__ == "__main__":
+    main()
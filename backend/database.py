@@ -0,0 +1,188 @@
+"""MongoDB connection settings, read routing and readiness checks.
+
+One Motor client is shared by the app, with an explicit connection pool
+(size, idle time, wait-queue timeout) so a burst of requests queues for a
+bounded time instead of opening connections without limit. Two database
+handles share that pool:
+
+- `db` reads from the primary (read-your-writes: auth, get-after-update,
+  version history, derived-data maintenance);
+- `heavy_reads_db` routes list/search, exports and analytics with the heavy
+  read preference (secondaryPreferred by default) and a bounded staleness.
+
+On a standalone server or a single-node replica set every read preference
+resolves to the one node, so the same configuration runs unchanged in
+development:
+
+    mongod --replSet rs0 --dbpath /tmp/rs0 --port 27017
+    mongosh --eval 'rs.initiate()'
+    MONGO_URL=mongodb://localhost:27017/?replicaSet=rs0
+
+Check the connection and topology:
+
+    python database.py check
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import PyMongoError
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+
+logger = logging.getLogger(__name__)
+
+READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+# Lowest maxStalenessSeconds accepted by MongoDB
+MIN_MAX_STALENESS_SECONDS = 90
+
+
+@dataclass
+class MongoSettings:
+    url: str
+    db_name: str
+    max_pool_size: int = 100
+    min_pool_size: int = 0
+    max_idle_time_ms: int = 60_000
+    wait_queue_timeout_ms: int = 2_000
+    server_selection_timeout_ms: int = 5_000
+    connect_timeout_ms: int = 5_000
+    heavy_read_preference: str = "secondaryPreferred"
+    max_staleness_seconds: int = MIN_MAX_STALENESS_SECONDS
+    startup_timeout_seconds: float = 30.0
+    app_name: str = "anamnese-api"
+
+    @classmethod
+    def from_env(cls, environ: Mapping[str, str] = os.environ) -> "MongoSettings":
+        defaults = cls(url="", db_name="")
+        return cls(
+            url=environ['MONGO_URL'],
+            db_name=environ['DB_NAME'],
+            max_pool_size=int(environ.get('MONGO_MAX_POOL_SIZE', defaults.max_pool_size)),
+            min_pool_size=int(environ.get('MONGO_MIN_POOL_SIZE', defaults.min_pool_size)),
+            max_idle_time_ms=int(environ.get('MONGO_MAX_IDLE_TIME_MS', defaults.max_idle_time_ms)),
+            wait_queue_timeout_ms=int(environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', defaults.wait_queue_timeout_ms)),
+            server_selection_timeout_ms=int(environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', defaults.server_selection_timeout_ms)),
+            connect_timeout_ms=int(environ.get('MONGO_CONNECT_TIMEOUT_MS', defaults.connect_timeout_ms)),
+            heavy_read_preference=environ.get('MONGO_HEAVY_READ_PREFERENCE', defaults.heavy_read_preference),
+            max_staleness_seconds=int(environ.get('MONGO_MAX_STALENESS_SECONDS', defaults.max_staleness_seconds)),
+            startup_timeout_seconds=float(environ.get('MONGO_STARTUP_TIMEOUT_SECONDS', defaults.startup_timeout_seconds)),
+        )
+
+
+def read_preference(mode: str, max_staleness_seconds: int = -1):
+    """Read preference object for a mode name; max_staleness_seconds <= 0 means unbounded"""
+    if mode not in READ_PREFERENCES:
+        raise ValueError(f"Unknown read preference '{mode}', expected one of {', '.join(READ_PREFERENCES)}")
+    if mode == "primary":
+        return Primary()
+    if max_staleness_seconds <= 0:
+        return READ_PREFERENCES[mode]()
+    if max_staleness_seconds < MIN_MAX_STALENESS_SECONDS:
+        raise ValueError(f"max staleness must be at least {MIN_MAX_STALENESS_SECONDS} seconds")
+    return READ_PREFERENCES[mode](max_staleness=max_staleness_seconds)
+
+
+def create_client(settings: MongoSettings) -> AsyncIOMotorClient:
+    """Motor client with explicit pool limits; no connection is opened until first use"""
+    return AsyncIOMotorClient(
+        settings.url,
+        maxPoolSize=settings.max_pool_size,
+        minPoolSize=settings.min_pool_size,
+        maxIdleTimeMS=settings.max_idle_time_ms,
+        waitQueueTimeoutMS=settings.wait_queue_timeout_ms,
+        serverSelectionTimeoutMS=settings.server_selection_timeout_ms,
+        connectTimeoutMS=settings.connect_timeout_ms,
+        appname=settings.app_name,
+    )
+
+
+def heavy_reads_database(client: AsyncIOMotorClient, settings: MongoSettings):
+    """Handle on the app database that routes reads with the heavy read preference"""
+    return client.get_database(
+        settings.db_name,
+        read_preference=read_preference(settings.heavy_read_preference, settings.max_staleness_seconds),
+    )
+
+
+async def topology(client: AsyncIOMotorClient) -> Dict[str, Any]:
+    """Ping the deployment and describe it (replica set, primary, secondaries)"""
+    started = time.perf_counter()
+    hello = await client.admin.command("hello")
+    return {
+        "ping_ms": round((time.perf_counter() - started) * 1000, 1),
+        "replica_set": hello.get("setName"),
+        "primary": hello.get("primary"),
+        "secondaries": [host for host in hello.get("hosts", []) if host != hello.get("primary")],
+        "writable": bool(hello.get("isWritablePrimary")),
+    }
+
+
+async def check_ready(client: AsyncIOMotorClient) -> Optional[Dict[str, Any]]:
+    """Topology if the deployment accepts writes, None otherwise"""
+    try:
+        info = await topology(client)
+    except PyMongoError as e:
+        logger.warning(f"MongoDB not ready: {e}")
+        return None
+    return info if info["primary"] or info["writable"] else None
+
+
+async def wait_until_ready(client: AsyncIOMotorClient, settings: MongoSettings) -> Dict[str, Any]:
+    """Block startup until MongoDB accepts writes, retrying up to the startup timeout"""
+    deadline = time.monotonic() + settings.startup_timeout_seconds
+    delay = 0.5
+    while True:
+        info = await check_ready(client)
+        if info:
+            break
+        if time.monotonic() + delay > deadline:
+            raise RuntimeError(f"MongoDB not ready after {settings.startup_timeout_seconds:.0f} s")
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 5.0)
+
+    if settings.heavy_read_preference != "primary" and not info["replica_set"]:
+        logger.info("MongoDB is standalone: heavy reads are served by the primary")
+    logger.info(
+        f"MongoDB ready: replica set {info['replica_set'] or '-'}, "
+        f"{len(info['secondaries'])} secondaries, ping {info['ping_ms']} ms, "
+        f"pool {settings.min_pool_size}-{settings.max_pool_size}, heavy reads {settings.heavy_read_preference}"
+    )
+    return info
+
+
+def main():
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description="Check the MongoDB connection settings")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("check", help="Ping MongoDB and print the topology")
+    parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    settings = MongoSettings.from_env()
+    # Validates the read preference settings before connecting
+    read_preference(settings.heavy_read_preference, settings.max_staleness_seconds)
+    client = create_client(settings)
+    try:
+        info = asyncio.run(wait_until_ready(client, settings))
+        for key, value in info.items():
+            print(f"{key}: {value}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""Duplicate-patient detection with a blocking index.
+
+IdentificacaoModel has no patient identifier, so the same patient is often
+registered several times with name variations. Instead of comparing every
+pair of records (O(n^2)), each anamnese gets a handful of blocking keys built
+from phonetic name tokens, the mother's name, the birthplace and an estimated
+birth year. Keys are stored in the `dedup_index` collection (multikey index on
+user_id + keys) and maintained on every write; fuzzy scoring only runs between
+records that share a block.
+
+Backfill / rebuild:
+
+    python dedup.py rebuild [--user-id USER_ID]
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime, timezone
+from difflib import SequenceMatcher
+from itertools import combinations
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from pydantic import BaseModel
+
+from textnorm import name_tokens, normalize, phonetic
+
+DEDUP_COLLECTION = "dedup_index"
+STAGING_COLLECTION = "dedup_index_rebuild"
+# Blocks larger than this are too unspecific to be worth comparing
+MAX_BLOCK_SIZE = 200
+DEFAULT_THRESHOLD = 0.82
+
+
+class DuplicateCandidate(BaseModel):
+    anamnese_id: str
+    nome_completo: str
+    score: float
+
+
+class DuplicateCluster(BaseModel):
+    anamnese_ids: List[str]
+    nomes: List[str]
+    score: float
+
+
+class DuplicateClustersResponse(BaseModel):
+    total: int
+    clusters: List[DuplicateCluster]
+
+
+def _reference_date(anamnese: Dict[str, Any]) -> datetime:
+    value = (anamnese.get("auditoria") or {}).get("data_hora_anamnese") or anamnese.get("created_at")
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value or datetime.now(timezone.utc)
+
+
+def estimate_birth_year(anamnese: Dict[str, Any]) -> Optional[int]:
+    idade = (anamnese.get("identificacao") or {}).get("idade") or {}
+    if idade.get("valor") is None:
+        return None
+    years = int(idade["valor"]) if idade.get("unidade", "anos") == "anos" else 0
+    return _reference_date(anamnese).year - years
+
+
+def index_entry(anamnese: Dict[str, Any]) -> Dict[str, Any]:
+    """Dedup index document (normalized identity + blocking keys) of an anamnese"""
+    identificacao = anamnese.get("identificacao") or {}
+    tokens = name_tokens(identificacao.get("nome_completo", ""))
+    mae_tokens = name_tokens(identificacao.get("mae", ""))
+    naturalidade = identificacao.get("naturalidade") or {}
+    cidade = normalize(naturalidade.get("cidade", ""))
+    birth_year = estimate_birth_year(anamnese)
+
+    keys: List[str] = []
+    if tokens:
+        first, last = phonetic(tokens[0]), phonetic(tokens[-1])
+        if mae_tokens:
+            keys.append(f"nm:{first}:{last}:{phonetic(mae_tokens[0])}")
+        if birth_year is not None:
+            # Age is only known to the year, so neighbouring years share a key
+            for year in (birth_year, birth_year + 1):
+                keys.append(f"ny:{first}:{last}:{year}")
+                if cidade:
+                    keys.append(f"fcy:{first}:{cidade}:{year}")
+
+    return {
+        "anamnese_id": anamnese["id"],
+        "user_id": anamnese["user_id"],
+        "nome_completo": identificacao.get("nome_completo", ""),
+        "nome": " ".join(tokens),
+        "mae": " ".join(mae_tokens),
+        "naturalidade": cidade,
+        "birth_year": birth_year,
+        "keys": keys,
+    }
+
+
+def similarity(a: Dict[str, Any], b: Dict[str, Any]) -> float:
+    """Weighted fuzzy similarity of two index entries, in [0, 1]"""
+    parts: List[Tuple[float, float]] = [(0.6, SequenceMatcher(None, a["nome"], b["nome"]).ratio())]
+    if a["mae"] and b["mae"]:
+        parts.append((0.25, SequenceMatcher(None, a["mae"], b["mae"]).ratio()))
+    if a["birth_year"] is not None and b["birth_year"] is not None:
+        parts.append((0.1, max(0.0, 1 - abs(a["birth_year"] - b["birth_year"]) / 3)))
+    if a["naturalidade"] and b["naturalidade"]:
+        parts.append((0.05, 1.0 if a["naturalidade"] == b["naturalidade"] else 0.0))
+    total_weight = sum(weight for weight, _ in parts)
+    return sum(weight * value for weight, value in parts) / total_weight
+
+
+async def index_anamnese(collection, anamnese: Dict[str, Any]):
+    """Insert or refresh the dedup entry of an anamnese"""
+    entry = index_entry(anamnese)
+    await collection.replace_one({"anamnese_id": entry["anamnese_id"]}, entry, upsert=True)
+
+
+async def remove_anamnese(collection, anamnese_id: str):
+    await collection.delete_one({"anamnese_id": anamnese_id})
+
+
+async def ensure_indexes(collection):
+    await collection.create_index("anamnese_id", unique=True)
+    await collection.create_index([("user_id", 1), ("keys", 1)])
+
+
+_PROJECTION = {"_id": 0, "user_id": 0}
+
+
+async def candidates_for(collection, user_id: str, anamnese_id: str, threshold: float = DEFAULT_THRESHOLD) -> List[DuplicateCandidate]:
+    """Possible duplicates of a single anamnese, looked up through its blocks"""
+    entry = await collection.find_one({"anamnese_id": anamnese_id, "user_id": user_id}, _PROJECTION)
+    if not entry or not entry["keys"]:
+        return []
+    query = {"user_id": user_id, "keys": {"$in": entry["keys"]}, "anamnese_id": {"$ne": anamnese_id}}
+    matches = []
+    async for other in collection.find(query, _PROJECTION).limit(MAX_BLOCK_SIZE):
+        score = similarity(entry, other)
+        if score >= threshold:
+            matches.append(DuplicateCandidate(anamnese_id=other["anamnese_id"], nome_completo=other["nome_completo"], score=round(score, 4)))
+    matches.sort(key=lambda m: m.score, reverse=True)
+    return matches
+
+
+async def find_clusters(collection, user_id: str, threshold: float = DEFAULT_THRESHOLD) -> DuplicateClustersResponse:
+    """Group a user's records into candidate duplicate clusters, scoring only within blocks"""
+    pipeline = [
+        {"$match": {"user_id": user_id}},
+        {"$unwind": "$keys"},
+        {"$group": {"_id": "$keys", "ids": {"$push": "$anamnese_id"}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1, "$lte": MAX_BLOCK_SIZE}}},
+    ]
+    blocks = [block["ids"] async for block in collection.aggregate(pipeline)]
+    if not blocks:
+        return DuplicateClustersResponse(total=0, clusters=[])
+
+    block_ids = {anamnese_id for ids in blocks for anamnese_id in ids}
+    entries = {
+        entry["anamnese_id"]: entry
+        async for entry in collection.find({"user_id": user_id, "anamnese_id": {"$in": list(block_ids)}}, _PROJECTION)
+    }
+
+    parent: Dict[str, str] = {}
+
+    def root(node: str) -> str:
+        while parent.get(node, node) != node:
+            node = parent[node]
+        return node
+
+    compared: Set[Tuple[str, str]] = set()
+    best: Dict[str, float] = {}
+    for ids in blocks:
+        for a, b in combinations(sorted(set(ids)), 2):
+            if (a, b) in compared or a not in entries or b not in entries:
+                continue
+            compared.add((a, b))
+            score = similarity(entries[a], entries[b])
+            if score >= threshold:
+                ra, rb = root(a), root(b)
+                if ra != rb:
+                    parent[ra] = rb
+                best[a] = max(best.get(a, 0), score)
+                best[b] = max(best.get(b, 0), score)
+
+    groups: Dict[str, List[str]] = {}
+    for anamnese_id in best:
+        groups.setdefault(root(anamnese_id), []).append(anamnese_id)
+
+    clusters = [
+        DuplicateCluster(
+            anamnese_ids=sorted(ids),
+            nomes=[entries[i]["nome_completo"] for i in sorted(ids)],
+            score=round(min(best[i] for i in ids), 4),
+        )
+        for ids in groups.values()
+    ]
+    clusters.sort(key=lambda c: (-c.score, c.nomes[0]))
+    return DuplicateClustersResponse(total=len(clusters), clusters=clusters)
+
+
+async def rebuild(db, user_id: Optional[str] = None, batch_size: int = 1000) -> int:
+    """Recompute the dedup index from the anamneses collection.
+
+    The index is built in a staging collection and swapped in with a rename,
+    so lookups never see it half-built.
+    """
+    query = {"user_id": user_id} if user_id else {}
+    projection = {"_id": 0, "id": 1, "user_id": 1, "identificacao": 1, "auditoria": 1, "created_at": 1}
+    staging = db[STAGING_COLLECTION]
+    await staging.drop()
+    if user_id:
+        # The other users' entries are carried over as they are
+        await db[DEDUP_COLLECTION].aggregate([
+            {"$match": {"user_id": {"$ne": user_id}}},
+            {"$out": STAGING_COLLECTION},
+        ]).to_list(None)
+    batch: List[Dict[str, Any]] = []
+    count = 0
+    async for anamnese in db.anamneses.find(query, projection).batch_size(batch_size):
+        batch.append(index_entry(anamnese))
+        if len(batch) >= batch_size:
+            await staging.insert_many(batch)
+            count += len(batch)
+            batch = []
+    if batch:
+        await staging.insert_many(batch)
+        count += len(batch)
+    await ensure_indexes(staging)
+    await staging.rename(DEDUP_COLLECTION, dropTarget=True)
+    return count
+
+
+def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Maintain the duplicate-patient blocking index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = subparsers.add_parser("rebuild", help="Recompute the blocking index")
+    rebuild_parser.add_argument("--user-id", help="Only rebuild the entries of this user")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        count = asyncio.run(rebuild(db, args.user_id))
+        print(f"Indexed {count} anamneses")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Deterministic extractive clinical digest.
+
+Built locally in milliseconds from the same fields the AI summary prompt
+uses, with no network access: identification, chief complaint, the key
+sentences of the HDA narrative, chronic conditions, allergies, medications
+and pack-years. Serves as the instant preview of generate_summary and as the
+summary of PDFs exported before an AI summary exists.
+
+HDA sentences are scored by clinical cues (onset/duration, modifying
+factors, pertinent negatives, intensity, the listed main symptoms); the
+first sentence is always kept and the selection keeps narrative order.
+"""
+import re
+from typing import Any, Dict, List
+
+from prompts import _SENTENCE_END, _join
+from textnorm import normalize
+
+MAX_HDA_SENTENCES = 3
+
+_NUMBER = re.compile(r"\d")
+
+# Normalized (accent-free) cue words and their weights
+HDA_CUES = {
+    " ha ": 2, "desde": 2, "inicio": 2, "dias": 1, "semanas": 1, "meses": 1,
+    "piora": 2, "melhora": 2, "alivia": 2, "agrava": 2, "irradia": 2,
+    "nega": 1, "refere": 1, "associad": 1, "intensidade": 1,
+    "dor": 1, "febre": 1, "dispneia": 1, "sincope": 2, "sangr": 2, "perda de peso": 2,
+}
+
+
+def _score(sentence: str, symptoms: List[str]) -> int:
+    text = f" {normalize(sentence)} "
+    score = sum(weight for cue, weight in HDA_CUES.items() if cue in text)
+    score += 2 * sum(1 for symptom in symptoms if symptom and symptom in text)
+    if _NUMBER.search(sentence):
+        score += 1
+    return score
+
+
+def key_sentences(narrativa: str, symptoms: List[str], limit: int = MAX_HDA_SENTENCES) -> List[str]:
+    """Most informative sentences of a narrative, in their original order"""
+    sentences = [s.strip() for s in _SENTENCE_END.split(narrativa or "") if s.strip()]
+    if len(sentences) <= limit:
+        return sentences
+    normalized_symptoms = [normalize(symptom) for symptom in symptoms]
+    # Ties go to the earlier sentence
+    ranked = sorted(range(1, len(sentences)), key=lambda i: (-_score(sentences[i], normalized_symptoms), i))
+    chosen = sorted([0] + ranked[:limit - 1])
+    return [sentences[i] for i in chosen]
+
+
+def clinical_digest(anamnese: Dict[str, Any]) -> str:
+    """Structured plain-text digest of an anamnese, one finding per line"""
+    ident = anamnese.get("identificacao") or {}
+    idade = ident.get("idade") or {}
+    qp = anamnese.get("queixa_principal") or {}
+    inicio = qp.get("inicio") or {}
+    hda = anamnese.get("hda") or {}
+    pessoais = (anamnese.get("antecedentes") or {}).get("pessoais") or {}
+    tabagismo = (anamnese.get("habitos") or {}).get("tabagismo") or {}
+
+    symptoms = [s.get("nome", "") for s in hda.get("sintomas_principais") or []]
+    alergias = [f"{a.get('agente', '')} ({a.get('reacao', '')})" for a in pessoais.get("alergias") or []]
+    medicacoes = [
+        " ".join(part for part in (m.get("nome", ""), m.get("dose", ""), m.get("posologia", "")) if part)
+        for m in pessoais.get("medicacoes_uso") or []
+    ]
+
+    lines = [
+        f"Paciente: {ident.get('nome_completo', '')}, {idade.get('valor', '')} {idade.get('unidade', '')}, {ident.get('sexo_biologico', '')}.",
+        f"Queixa principal: \"{qp.get('texto_entre_aspas', '')}\" há {inicio.get('há', 0)} {inicio.get('unidade', '')}.",
+    ]
+    sentences = key_sentences(hda.get("narrativa", ""), symptoms)
+    if sentences:
+        lines.append(f"HDA: {' '.join(sentences)}")
+    lines += [
+        f"Comorbidades: {_join(pessoais.get('cronicos') or [], 'nenhuma referida')}.",
+        f"Alergias: {_join(alergias, 'nenhuma referida')}.",
+        f"Medicações em uso: {_join(medicacoes, 'nenhuma')}.",
+    ]
+    packyears = tabagismo.get("carga_tabagica_packyears") or 0
+    if packyears:
+        lines.append(f"Tabagismo: {tabagismo.get('status', '')}, {packyears:g} maços-ano.")
+    return "\n".join(lines)
@@ -0,0 +1,201 @@
+"""Columnar (Parquet/Arrow) export of flattened anamnese data.
+
+Nested anamnese documents are flattened into a fixed, typed schema (one row
+per anamnese) so research tooling can load them directly with
+`pandas.read_parquet` / `pyarrow.parquet.read_table`. Documents are streamed
+from a Motor cursor and written one row group at a time, so memory stays
+bounded by the row group size instead of the collection size.
+
+Command line usage:
+
+    python export_columnar.py --out anamneses.parquet [--user-id USER_ID]
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+import archive
+import sparse
+
+DEFAULT_ROW_GROUP_SIZE = 10_000
+
+# Low-cardinality text columns are dictionary-encoded
+CATEGORY = pa.dictionary(pa.int32(), pa.string())
+
+
+def _get(doc: Dict[str, Any], path: str, default: Any = None) -> Any:
+    node: Any = doc
+    for part in path.split("."):
+        if not isinstance(node, dict):
+            return default
+        node = node.get(part)
+        if node is None:
+            return default
+    return node
+
+
+def _timestamp(value: Any) -> Optional[datetime]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value
+
+
+def _text(path: str) -> Callable[[Dict[str, Any]], Optional[str]]:
+    return lambda doc: _get(doc, path, "")
+
+
+def _number(path: str, cast) -> Callable[[Dict[str, Any]], Any]:
+    return lambda doc: cast(_get(doc, path, 0) or 0)
+
+
+def _count(path: str) -> Callable[[Dict[str, Any]], int]:
+    return lambda doc: len(_get(doc, path, []) or [])
+
+
+def _positive_is_findings(doc: Dict[str, Any]) -> int:
+    interrogatorio = doc.get("interrogatorio_sistematico") or {}
+    return sum(
+        1
+        for sistema in interrogatorio.values()
+        for item in (sistema or {}).get("itens", [])
+        if isinstance(item, dict) and item.get("presente")
+    )
+
+
+# (column name, arrow type, extractor)
+COLUMNS: List[Tuple[str, pa.DataType, Callable[[Dict[str, Any]], Any]]] = [
+    ("id", pa.string(), _text("id")),
+    ("user_id", pa.string(), _text("user_id")),
+    ("created_at", pa.timestamp("us", tz="UTC"), lambda d: _timestamp(d.get("created_at"))),
+    ("updated_at", pa.timestamp("us", tz="UTC"), lambda d: _timestamp(d.get("updated_at"))),
+    ("data_hora_anamnese", pa.timestamp("us", tz="UTC"), lambda d: _timestamp(_get(d, "auditoria.data_hora_anamnese"))),
+    ("versao_registro", pa.int32(), _number("auditoria.versao_registro", int)),
+    ("consentimento", pa.bool_(), lambda d: bool(_get(d, "meta.consentimento", False))),
+    ("profissional_nome", pa.string(), _text("meta.profissional.nome")),
+    ("profissional_unidade", pa.string(), _text("meta.profissional.unidade")),
+    # Identificação
+    ("nome_completo", pa.string(), _text("identificacao.nome_completo")),
+    ("nome_social", pa.string(), _text("identificacao.nome_social")),
+    ("genero", CATEGORY, _text("identificacao.genero")),
+    ("sexo_biologico", CATEGORY, _text("identificacao.sexo_biologico")),
+    ("idade_valor", pa.int32(), _number("identificacao.idade.valor", int)),
+    ("idade_unidade", CATEGORY, _text("identificacao.idade.unidade")),
+    ("cor_etnia", CATEGORY, _text("identificacao.cor_etnia")),
+    ("estado_civil", CATEGORY, _text("identificacao.estado_civil")),
+    ("ocupacao_atividade", pa.string(), _text("identificacao.ocupacao.atividade")),
+    ("escolaridade", CATEGORY, _text("identificacao.escolaridade")),
+    ("religiao", CATEGORY, _text("identificacao.religiao")),
+    ("naturalidade_cidade", pa.string(), _text("identificacao.naturalidade.cidade")),
+    ("naturalidade_uf", CATEGORY, _text("identificacao.naturalidade.uf")),
+    ("procedencia_cidade", pa.string(), _text("identificacao.procedencia.cidade")),
+    ("procedencia_uf", CATEGORY, _text("identificacao.procedencia.uf")),
+    ("grau_confiabilidade", CATEGORY, _text("identificacao.grau_confiabilidade")),
+    # Queixa principal / HDA / IS
+    ("queixa_principal", pa.string(), _text("queixa_principal.texto_entre_aspas")),
+    ("queixa_inicio_ha", pa.float64(), lambda d: float(_get(d, "queixa_principal.inicio", {}).get("há") or 0)),
+    ("queixa_inicio_unidade", CATEGORY, lambda d: str(_get(d, "queixa_principal.inicio", {}).get("unidade") or "")),
+    ("hda_narrativa", pa.string(), _text("hda.narrativa")),
+    ("n_sintomas_principais", pa.int16(), _count("hda.sintomas_principais")),
+    ("n_is_achados_positivos", pa.int16(), _positive_is_findings),
+    # Antecedentes
+    ("cronicos", pa.list_(pa.string()), lambda d: list(_get(d, "antecedentes.pessoais.cronicos", []))),
+    ("n_cronicos", pa.int16(), _count("antecedentes.pessoais.cronicos")),
+    ("n_alergias", pa.int16(), _count("antecedentes.pessoais.alergias")),
+    ("n_medicacoes", pa.int16(), _count("antecedentes.pessoais.medicacoes_uso")),
+    ("n_cirurgias_hospitalizacoes", pa.int16(), _count("antecedentes.pessoais.cirurgias_hospitalizacoes")),
+    ("n_antecedentes_familiares", pa.int16(), _count("antecedentes.familiares")),
+    # Hábitos
+    ("atividade_fisica_tipo", pa.string(), _text("habitos.atividade_fisica.tipo")),
+    ("atividade_fisica_frequencia_semana", pa.int16(), _number("habitos.atividade_fisica.frequencia_semana", int)),
+    ("atividade_fisica_duracao_min", pa.int32(), _number("habitos.atividade_fisica.duracao_min", int)),
+    ("sono_horas", pa.float32(), _number("habitos.sono.horas", float)),
+    ("sono_qualidade", CATEGORY, _text("habitos.sono.qualidade")),
+    ("alimentacao_padrao", pa.string(), _text("habitos.alimentacao.padrao")),
+    ("tabagismo_status", CATEGORY, lambda d: _get(d, "habitos.tabagismo.status", "nunca")),
+    ("tabagismo_macos_dia", pa.float32(), _number("habitos.tabagismo.macos_dia", float)),
+    ("tabagismo_anos", pa.int16(), _number("habitos.tabagismo.anos", int)),
+    ("tabagismo_packyears", pa.float32(), _number("habitos.tabagismo.carga_tabagica_packyears", float)),
+    ("etilismo_tipos", pa.list_(pa.string()), lambda d: list(_get(d, "habitos.etilismo.tipos", []))),
+    ("etilismo_doses_semana", pa.int32(), _number("habitos.etilismo.doses_semana", int)),
+    ("etilismo_uso_pesado", pa.bool_(), lambda d: bool(_get(d, "habitos.etilismo.uso_pesado_ep", False))),
+    ("outras_substancias", pa.string(), _text("habitos.outras_substancias")),
+    # Psicossocial
+    ("dependentes", pa.int16(), _number("psicossocial.dependentes", int)),
+    ("renda_familiar_faixa", CATEGORY, _text("psicossocial.renda_familiar_faixa")),
+    ("saneamento", CATEGORY, _text("psicossocial.saneamento")),
+    ("agua_segura", CATEGORY, _text("psicossocial.agua_segura")),
+    ("suporte_social", pa.string(), _text("psicossocial.suporte_social")),
+    ("tem_resumo_ia", pa.bool_(), lambda d: bool(d.get("resumo_clinico_ia"))),
+]
+
+SCHEMA = pa.schema([pa.field(name, type_) for name, type_, _ in COLUMNS])
+
+
+def flatten(anamnese: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten one anamnese document into a row of the export schema"""
+    return {name: extract(anamnese) for name, _, extract in COLUMNS}
+
+
+def _to_table(columns: Dict[str, List[Any]]) -> pa.Table:
+    return pa.Table.from_pydict(columns, schema=SCHEMA)
+
+
+async def write_parquet(cursor, sink, row_group_size: int = DEFAULT_ROW_GROUP_SIZE, compression: str = "zstd") -> int:
+    """Stream a Motor cursor into `sink` (path or binary file), one row group per batch"""
+    writer = pq.ParquetWriter(sink, SCHEMA, compression=compression)
+    columns: Dict[str, List[Any]] = {name: [] for name, _, _ in COLUMNS}
+    pending = 0
+    total = 0
+    try:
+        async for anamnese in cursor.batch_size(min(row_group_size, 1000)):
+            anamnese = sparse.decode(anamnese)
+            for name, _, extract in COLUMNS:
+                columns[name].append(extract(anamnese))
+            pending += 1
+            if pending >= row_group_size:
+                await asyncio.to_thread(writer.write_table, _to_table(columns))
+                columns = {name: [] for name in columns}
+                total += pending
+                pending = 0
+        if pending or total == 0:
+            await asyncio.to_thread(writer.write_table, _to_table(columns))
+            total += pending
+    finally:
+        writer.close()
+    return total
+
+
+def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Export anamneses as a flattened Parquet file")
+    parser.add_argument("--out", required=True, help="Destination .parquet file")
+    parser.add_argument("--user-id", help="Only export the anamneses of this user")
+    parser.add_argument("--row-group-size", type=int, default=DEFAULT_ROW_GROUP_SIZE)
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    query = {"user_id": args.user_id} if args.user_id else {}
+    try:
+        cursor = archive.HydratingCursor(db.anamneses.find(query, {"_id": 0}), db[archive.COLD_COLLECTION])
+        count = asyncio.run(write_parquet(cursor, args.out, args.row_group_size))
+        print(f"Exported {count} anamneses to {args.out}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
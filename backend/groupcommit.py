@@ -0,0 +1,149 @@
+"""Group commit of concurrent inserts.
+
+At the end of a shift a ward submits its anamneses at once, and every
+create issues its own insert_one: one round trip, one server operation and
+one journal wait per record. The batcher collects the inserts that arrive
+within `linger` seconds (or until `max_batch_size` are waiting) and writes
+them with a single unordered insert_many. Each caller awaits a future that
+resolves to its own inserted _id, or raises its own error: a document
+rejected by the server (e.g. a duplicate key) fails only its caller, and
+the rest of the batch is still written.
+
+The cost is up to `linger` of added latency for a create that arrives
+alone. Batches are written concurrently, so a slow batch does not hold up
+the next one; the connection pool bounds how many are in flight.
+
+A caller cancelled while waiting (client disconnected) does not take its
+document out of the batch, just as a cancelled insert_one may already
+have reached the server. The other way round, a batch write cancelled
+before it finished (e.g. at shutdown) cancels the callers still waiting.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteConcernError, WriteError
+
+DEFAULT_MAX_BATCH_SIZE = 100
+DEFAULT_LINGER_SECONDS = 0.002
+
+DUPLICATE_KEY_CODES = {11000, 11001, 12582}
+
+
+@dataclass
+class BatchStats:
+    batches: int = 0
+    documents: int = 0
+    failed_documents: int = 0
+    largest_batch: int = 0
+    write_time: float = 0.0
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.documents / self.batches if self.batches else 0.0
+
+
+def _write_error(error: Dict[str, Any]) -> WriteError:
+    """The exception insert_one would have raised for this write error"""
+    cls = DuplicateKeyError if error.get("code") in DUPLICATE_KEY_CODES else WriteError
+    return cls(error.get("errmsg", "Write error"), error.get("code"), error)
+
+
+class InsertBatcher:
+    def __init__(self, collection, max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+                 linger: float = DEFAULT_LINGER_SECONDS, enabled: bool = True):
+        self.collection = collection
+        self.max_batch_size = max(1, max_batch_size)
+        self.linger = max(0.0, linger)
+        self.enabled = enabled
+        self.stats = BatchStats()
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._writes: Set[asyncio.Task] = set()
+
+    async def insert(self, document: Dict[str, Any]) -> Any:
+        """Insert one document, grouped with concurrent inserts; returns its _id"""
+        if not self.enabled:
+            return (await self.collection.insert_one(document)).inserted_id
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((document, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.linger, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        task = asyncio.ensure_future(self._write(batch))
+        self._writes.add(task)
+        task.add_done_callback(self._writes.discard)
+
+    async def _write(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        try:
+            await self._write_batch(batch)
+        finally:
+            # Cancelled mid-write (e.g. at shutdown): the outcome is unknown, as for a
+            # cancelled insert_one, but no caller is left waiting
+            for _, future in batch:
+                if not future.done():
+                    future.cancel()
+
+    async def _write_batch(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]):
+        started = time.perf_counter()
+        errors: Dict[int, BaseException] = {}
+        try:
+            await self.collection.insert_many([document for document, _ in batch], ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                errors[error["index"]] = _write_error(error)
+            if e.details.get("writeConcernErrors"):
+                # Written, but not acknowledged as asked: every caller sees it, as with insert_one
+                concern_error = e.details["writeConcernErrors"][0]
+                failure = WriteConcernError(concern_error.get("errmsg", "Write concern error"), concern_error.get("code"), concern_error)
+                errors = {index: errors.get(index, failure) for index in range(len(batch))}
+        except Exception as e:
+            errors = {index: e for index in range(len(batch))}
+
+        stats = self.stats
+        stats.batches += 1
+        stats.documents += len(batch)
+        stats.failed_documents += len(errors)
+        stats.largest_batch = max(stats.largest_batch, len(batch))
+        stats.write_time += time.perf_counter() - started
+
+        for index, (document, future) in enumerate(batch):
+            if future.done():
+                continue
+            if index in errors:
+                future.set_exception(errors[index])
+            else:
+                future.set_result(document["_id"])
+
+    async def close(self):
+        """Write what is pending and wait for the batches in flight"""
+        self._flush()
+        if self._writes:
+            await asyncio.gather(*self._writes, return_exceptions=True)
+
+    def snapshot(self) -> dict:
+        stats = self.stats
+        return {
+            "enabled": self.enabled,
+            "max_batch_size": self.max_batch_size,
+            "linger_ms": round(self.linger * 1000, 1),
+            "batches": stats.batches,
+            "documents": stats.documents,
+            "failed_documents": stats.failed_documents,
+            "mean_batch_size": round(stats.mean_batch_size, 1),
+            "largest_batch": stats.largest_batch,
+            "mean_write_ms": round(stats.write_time / stats.batches * 1000, 2) if stats.batches else 0.0,
+        }
@@ -0,0 +1,210 @@
+"""Live anamnese list updates over Server-Sent Events.
+
+One MongoDB change stream per process watches the anamneses collection and
+fans its events out to the SSE connections of the owning user. Opening a
+cursor per connection would cost a cursor and a pool slot each. Events are
+compact deltas carrying only what the dashboard list shows:
+
+    event: upsert   data: {"id": ..., "identificacao": {...}, "queixa_principal": {...}, "created_at": ...}
+    event: delete   data: {"id": ...}
+    event: resync   data: {}    (events were lost, refetch the list)
+
+Updates that touch no listed field (HDA edits, AI summaries) are filtered
+out inside the change stream pipeline. Delete events only carry the _id
+of the removed document, so its owner and record id come from the
+pre-image. Pre-images are enabled on the collection at startup (MongoDB
+6.0+). Without them deletes cannot be routed and are skipped, and clients
+see them on their next full refetch.
+
+Change streams need a replica set. When the stream cannot be opened the
+hub stays unavailable and the endpoint answers 503, so clients keep
+refetching as before.
+"""
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Optional, Set
+
+from models import IdentificacaoModel
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 15.0
+SUBSCRIBER_QUEUE_SIZE = 100
+RESTART_BACKOFF_SECONDS = (1, 2, 5, 10, 30)
+
+# Fields shown by the dashboard list; updates that touch none of them are not sent
+LIST_FIELDS = [
+    "id",
+    "identificacao.nome_completo",
+    "identificacao.idade",
+    "identificacao.grau_confiabilidade",
+    "queixa_principal.texto_entre_aspas",
+    "created_at",
+]
+LISTED_UPDATE_KEYS = r"^(identificacao|queixa_principal|created_at)(\.|$)"
+# Listed fields with a default, which the sparse storage encoding leaves out
+LIST_DEFAULTS = {"grau_confiabilidade": IdentificacaoModel.model_fields["grau_confiabilidade"].default}
+
+PIPELINE = [
+    {"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}},
+    {"$addFields": {"changedKeys": {"$map": {
+        "input": {"$objectToArray": {"$ifNull": ["$updateDescription.updatedFields", {}]}},
+        "as": "field",
+        "in": "$$field.k"
+    }}}},
+    {"$match": {"$or": [
+        {"operationType": {"$ne": "update"}},
+        {"changedKeys": {"$regex": LISTED_UPDATE_KEYS}},
+    ]}},
+    {"$project": {
+        "operationType": 1,
+        "fullDocument.user_id": 1,
+        **{f"fullDocument.{field}": 1 for field in LIST_FIELDS},
+        "fullDocumentBeforeChange.id": 1,
+        "fullDocumentBeforeChange.user_id": 1,
+    }},
+]
+
+
+def sse(event: str, data: Dict[str, Any]) -> str:
+    """One Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+def delta(change: Dict[str, Any]) -> Optional[tuple]:
+    """(user_id, event, data) of a projected change event, None if it cannot be routed"""
+    if change["operationType"] == "delete":
+        before = change.get("fullDocumentBeforeChange") or {}
+        if not before.get("user_id"):
+            return None
+        return before["user_id"], "delete", {"id": before["id"]}
+    document = change.get("fullDocument")
+    # Update of a document deleted before the lookup
+    if not document or not document.get("user_id"):
+        return None
+    user_id = document.pop("user_id")
+    document["identificacao"] = {**LIST_DEFAULTS, **(document.get("identificacao") or {})}
+    return user_id, "upsert", document
+
+
+class Subscriber:
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def put(self, frame: str):
+        try:
+            self.queue.put_nowait(frame)
+        except asyncio.QueueFull:
+            # Too slow to keep up: drop the backlog and tell the client to refetch
+            self.overflowed = True
+
+
+class ChangeHub:
+    def __init__(self, collection):
+        self.collection = collection
+        self.subscribers: Dict[str, Set[Subscriber]] = {}
+        self.available = False
+        self.events_sent = 0
+        self._task: Optional[asyncio.Task] = None
+
+    async def enable_pre_images(self):
+        """Record pre-images so deletes can be routed to their owner"""
+        try:
+            await self.collection.database.command({
+                "collMod": self.collection.name,
+                "changeStreamPreAndPostImages": {"enabled": True}
+            })
+        except Exception as e:
+            logger.warning(f"Change stream pre-images unavailable, deletes will not be pushed: {e}")
+
+    def subscribe(self, user_id: str) -> Subscriber:
+        subscriber = Subscriber(user_id)
+        self.subscribers.setdefault(user_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        subscribers = self.subscribers.get(subscriber.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self.subscribers[subscriber.user_id]
+
+    def dispatch(self, change: Dict[str, Any]):
+        routed = delta(change)
+        if routed is None:
+            return
+        user_id, event, data = routed
+        frame = sse(event, data)
+        for subscriber in self.subscribers.get(user_id, ()):
+            subscriber.put(frame)
+            self.events_sent += 1
+
+    def _resync_all(self):
+        frame = sse("resync", {})
+        for subscribers in self.subscribers.values():
+            for subscriber in subscribers:
+                subscriber.put(frame)
+
+    async def _watch(self):
+        resume_token = None
+        failures = 0
+        while True:
+            try:
+                async with self.collection.watch(
+                    PIPELINE,
+                    full_document="updateLookup",
+                    full_document_before_change="whenAvailable",
+                    resume_after=resume_token
+                ) as stream:
+                    self.available = True
+                    failures = 0
+                    async for change in stream:
+                        resume_token = stream.resume_token
+                        self.dispatch(change)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Events may have been missed while the stream was down
+                self._resync_all()
+                self.available = False
+                delay = RESTART_BACKOFF_SECONDS[min(failures, len(RESTART_BACKOFF_SECONDS) - 1)]
+                failures += 1
+                if failures == 1:
+                    logger.warning(f"Anamnese change stream stopped ({e}), retrying")
+                # A token that fell off the oplog cannot be resumed
+                if failures > 2:
+                    resume_token = None
+                await asyncio.sleep(delay)
+
+    async def start(self):
+        await self.enable_pre_images()
+        self._task = asyncio.create_task(self._watch())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self.available = False
+
+    async def stream(self, user_id: str):
+        """SSE frames for one connection of a user, with heartbeats, until the client disconnects"""
+        subscriber = self.subscribe(user_id)
+        try:
+            yield sse("ready", {})
+            while True:
+                if subscriber.overflowed:
+                    subscriber.overflowed = False
+                    while not subscriber.queue.empty():
+                        subscriber.queue.get_nowait()
+                    yield sse("resync", {})
+                    continue
+                try:
+                    yield await asyncio.wait_for(subscriber.queue.get(), HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(subscriber)
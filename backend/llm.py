@@ -0,0 +1,248 @@
+"""LLM client with deadlines, hedged requests and retries.
+
+Every completion runs under a deadline. If the primary provider has not
+answered after its observed p95 latency, a hedged request is sent to the
+alternate provider (another model, another provider, or the same model on
+another upstream connection) and whichever answers first wins; the loser is
+cancelled. A primary that fails before the hedge is sent falls back to the
+alternate at once. Failed attempts are retried with exponential backoff and
+full jitter while the deadline allows.
+
+Providers are addressed as "provider/model" specs. The "fake" provider
+answers locally after a latency drawn from a log-normal distribution, for
+development and load tests without network access or API keys:
+
+    fake/gpt-4o-mini?median_ms=800&sigma=0.6&failure_rate=0.02
+"""
+import asyncio
+import logging
+import math
+import random
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Optional, Tuple
+from urllib.parse import parse_qsl
+
+import coldstart
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DEADLINE_SECONDS = 30.0
+DEFAULT_MAX_RETRIES = 2
+# Hedge delay used until enough latencies were observed
+DEFAULT_HEDGE_DELAY_SECONDS = 3.0
+MIN_HEDGE_DELAY_SECONDS = 0.2
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+BACKOFF_BASE_SECONDS = 0.25
+BACKOFF_MAX_SECONDS = 4.0
+
+
+class LlmError(Exception):
+    pass
+
+
+class LlmTimeoutError(LlmError):
+    pass
+
+
+class FakeProviderError(LlmError):
+    pass
+
+
+# =======================
+# PROVIDERS
+# =======================
+
+class EmergentProvider:
+    """Any model reachable through emergentintegrations (openai, anthropic, gemini)"""
+
+    def __init__(self, provider: str, model: str, api_key: Optional[str]):
+        self.provider = provider
+        self.model = model
+        self.api_key = api_key
+        self.name = f"{provider}/{model}"
+
+    async def complete(self, system: str, prompt: str, session_id: str) -> str:
+        # Deferred: litellm makes this the slowest import of the app
+        emergent = coldstart.load("emergentintegrations.llm.chat")
+
+        chat = emergent.LlmChat(
+            api_key=self.api_key,
+            session_id=session_id,
+            system_message=system
+        ).with_model(self.provider, self.model)
+        return await chat.send_message(emergent.UserMessage(text=prompt))
+
+
+class FakeProvider:
+    """Local provider with a log-normal latency distribution and random failures"""
+
+    def __init__(self, model: str, median_ms: float = 800, sigma: float = 0.5, failure_rate: float = 0.0,
+                 rng: Optional[random.Random] = None):
+        self.model = model
+        self.median = median_ms / 1000
+        self.sigma = sigma
+        self.failure_rate = failure_rate
+        self.rng = rng or random.Random()
+        self.name = f"fake/{model}"
+
+    def sample_latency(self) -> float:
+        return self.rng.lognormvariate(math.log(self.median), self.sigma)
+
+    async def complete(self, system: str, prompt: str, session_id: str) -> str:
+        await asyncio.sleep(self.sample_latency())
+        if self.rng.random() < self.failure_rate:
+            raise FakeProviderError(f"{self.name}: simulated upstream failure")
+        first_line = prompt.strip().splitlines()[0] if prompt.strip() else ""
+        return f"[{self.name}] Resumo simulado. {first_line[:200]}"
+
+
+def provider_from_spec(spec: str, api_key: Optional[str] = None):
+    """Provider for a "provider/model[?options]" spec"""
+    spec, _, query = spec.partition("?")
+    provider, _, model = spec.partition("/")
+    if not provider or not model:
+        raise ValueError(f"Invalid LLM spec '{spec}', expected provider/model")
+    if provider == "fake":
+        options = {key: float(value) for key, value in parse_qsl(query)}
+        return FakeProvider(model, **options)
+    return EmergentProvider(provider, model, api_key)
+
+
+# =======================
+# CLIENT
+# =======================
+
+class LatencyTracker:
+    """Rolling window of call latencies.
+
+    A call cancelled before it answered (the loser of a hedge, or one cut by
+    the deadline) is kept as a censored sample: it would have taken at least
+    that long. Dropping those would leave only the fast calls in the window
+    and pull the hedge delay down. Percentiles are read from the
+    Kaplan-Meier estimate of the latency distribution.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        # (seconds, censored)
+        self.samples: Deque[Tuple[float, bool]] = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append((seconds, False))
+
+    def record_censored(self, seconds: float):
+        self.samples.append((seconds, True))
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self.samples) < MIN_LATENCY_SAMPLES:
+            return None
+        # Answered calls sort before censored ones of the same time
+        ordered = sorted(self.samples)
+        at_risk = len(ordered)
+        survival = 1.0
+        for seconds, censored in ordered:
+            if not censored:
+                survival *= 1 - 1 / at_risk
+                # Rounded: without censoring the product is k/n up to float error
+                if round(1 - survival, 9) > q:
+                    return seconds
+            at_risk -= 1
+        # Too many calls were cut short to reach the quantile: the longest wait is a lower bound
+        return ordered[-1][0]
+
+
+@dataclass
+class Completion:
+    text: str
+    provider: str
+    latency: float
+    attempts: int
+    hedged: bool
+
+
+class LlmClient:
+    def __init__(self, primary, alternate=None, deadline: float = DEFAULT_DEADLINE_SECONDS,
+                 hedging: bool = True, hedge_quantile: float = 0.95, min_hedge_delay: float = MIN_HEDGE_DELAY_SECONDS,
+                 max_retries: int = DEFAULT_MAX_RETRIES, rng: Optional[random.Random] = None):
+        self.primary = primary
+        self.alternate = alternate
+        self.deadline = deadline
+        self.hedging = hedging and alternate is not None
+        self.hedge_quantile = hedge_quantile
+        self.min_hedge_delay = min_hedge_delay
+        self.max_retries = max_retries
+        self.rng = rng or random.Random()
+        self.latencies: Dict[str, LatencyTracker] = {}
+
+    def _tracker(self, provider) -> LatencyTracker:
+        return self.latencies.setdefault(provider.name, LatencyTracker())
+
+    def hedge_delay(self) -> float:
+        """Time to wait for the primary before hedging: its p95 latency (hedge_quantile)"""
+        observed = self._tracker(self.primary).percentile(self.hedge_quantile)
+        return max(self.min_hedge_delay, observed if observed is not None else DEFAULT_HEDGE_DELAY_SECONDS)
+
+    async def _hedged(self, system: str, prompt: str, session_id: str, remaining: float) -> tuple:
+        """One attempt: the primary call, plus the alternate if the primary fails or is slower than its p95"""
+        deadline = time.monotonic() + remaining
+        started: Dict[asyncio.Task, Tuple[Any, float]] = {}
+
+        def send(provider, suffix: str = "") -> asyncio.Task:
+            task = asyncio.create_task(provider.complete(system, prompt, f"{session_id}{suffix}"))
+            started[task] = (provider, time.monotonic())
+            return task
+
+        primary = send(self.primary)
+        tasks = {primary}
+        hedged = False
+        try:
+            if self.hedging:
+                done, _ = await asyncio.wait(tasks, timeout=min(self.hedge_delay(), remaining))
+                if not done and deadline > time.monotonic():
+                    hedged = True
+                    tasks.add(send(self.alternate, "_hedge"))
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, timeout=max(0.0, deadline - time.monotonic()), return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    raise LlmTimeoutError(f"No LLM response within {self.deadline:g} s")
+                for task in done:
+                    provider, task_started = started[task]
+                    if task.exception() is None:
+                        self._tracker(provider).record(time.monotonic() - task_started)
+                        return task.result(), provider, hedged
+                    error = task.exception()
+                # The primary failed before a hedge was sent: fall back to the alternate now
+                if primary in done and len(started) == 1 and self.alternate is not None and deadline > time.monotonic():
+                    tasks.add(send(self.alternate, "_fallback"))
+            raise error
+        finally:
+            pending = [task for task in started if not task.done()]
+            for task in pending:
+                provider, task_started = started[task]
+                self._tracker(provider).record_censored(time.monotonic() - task_started)
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def complete(self, system: str, prompt: str, session_id: str) -> Completion:
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = self.deadline - (time.monotonic() - started)
+            try:
+                text, provider, hedged = await self._hedged(system, prompt, session_id, remaining)
+                return Completion(text=text, provider=provider.name, latency=time.monotonic() - started, attempts=attempt, hedged=hedged)
+            except LlmTimeoutError:
+                raise
+            except Exception as e:
+                # Full jitter: sleep uniformly in [0, capped exponential backoff]
+                backoff = self.rng.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** (attempt - 1)))
+                remaining = self.deadline - (time.monotonic() - started)
+                if attempt > self.max_retries or backoff >= remaining:
+                    raise
+                logger.warning(f"LLM attempt {attempt} failed ({e}), retrying in {backoff:.2f} s")
+                await asyncio.sleep(backoff)
@@ -0,0 +1,59 @@
+"""Cached model (de)serialization.
+
+Response models are built from stored documents and serialized to JSON
+bytes in a single pass by TypeAdapters cached per type, instead of going
+through FastAPI's response_model round trip (validate, dump to a dict,
+encode). Request bodies are validated straight from JSON bytes, skipping
+the intermediate dict FastAPI would otherwise build.
+"""
+from functools import lru_cache
+from typing import Any, Dict, Type, TypeVar
+
+from fastapi import Response
+from fastapi.exceptions import RequestValidationError
+from pydantic import BaseModel, TypeAdapter, ValidationError
+
+ModelT = TypeVar("ModelT", bound=BaseModel)
+
+
+@lru_cache(maxsize=None)
+def adapter(tp: Any) -> TypeAdapter:
+    return TypeAdapter(tp)
+
+
+def from_stored(cls: Type[ModelT], data: Dict[str, Any]) -> ModelT:
+    """Build `cls` from a stored document with the cached adapter of `cls`.
+
+    This is a full validation. Unknown keys (e.g. Mongo internals) are
+    dropped and missing fields are filled from the model defaults. There is
+    no non-validating path: validating in pydantic-core costs less than a
+    recursive `model_construct` over the nested sections (see
+    benchmarks/bench_models.py).
+    """
+    return adapter(cls).validate_python(data)
+
+
+def json_response(tp: Any, value: Any, **kwargs) -> Response:
+    """Serialize `value` with the cached adapter of `tp`, bypassing response_model validation"""
+    return Response(content=adapter(tp).dump_json(value), media_type="application/json", **kwargs)
+
+
+def request_body(tp: Type[BaseModel]) -> Dict[str, Any]:
+    """`openapi_extra` documenting `tp` as the JSON body of a route that reads the raw request.
+
+    Nested models are referenced from the OpenAPI components, where the
+    response models of the same routes already register them.
+    """
+    schema = tp.model_json_schema(ref_template="#/components/schemas/{model}")
+    schema.pop("$defs", None)
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": schema}}}}
+
+
+def validate_json(tp: Any, raw: bytes, strict: bool = True) -> Any:
+    """Validate a request body straight from JSON bytes with the cached adapter of `tp`"""
+    try:
+        return adapter(tp).validate_json(raw, strict=strict)
+    except ValidationError as e:
+        raise RequestValidationError(
+            [{**error, "loc": ("body", *error["loc"])} for error in e.errors(include_url=False)]
+        )
@@ -0,0 +1,242 @@
+"""Pydantic models of the anamnese API."""
+from pydantic import BaseModel, Field, ConfigDict
+from typing import List, Optional, Dict, Any
+import uuid
+from datetime import datetime, timezone
+
+class User(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    email: str
+    name: str
+    picture: Optional[str] = None
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class UserSession(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    user_id: str
+    session_token: str
+    expires_at: datetime
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    last_seen: Optional[datetime] = None
+
+class SessionDataResponse(BaseModel):
+    id: str
+    email: str
+    name: str
+    picture: Optional[str] = None
+    session_token: str
+
+# Anamnese Models
+class IdadeModel(BaseModel):
+    valor: int
+    unidade: str  # "anos", "meses", "dias"
+
+class LocalidadeModel(BaseModel):
+    cidade: str
+    uf: str
+
+class OcupacaoModel(BaseModel):
+    atividade: str
+    local: str = ""
+    condicoes: str = ""
+
+class IdentificacaoModel(BaseModel):
+    nome_completo: str
+    nome_social: str = ""
+    genero: str = ""
+    sexo_biologico: str  # masculino, feminino
+    idade: IdadeModel
+    cor_etnia: str
+    estado_civil: str
+    ocupacao: OcupacaoModel
+    escolaridade: str
+    religiao: str = ""
+    naturalidade: LocalidadeModel
+    procedencia: LocalidadeModel
+    mae: str = ""
+    responsavel_ou_cuidador: str = ""
+    plano_ou_previdencia: str = ""
+    grau_confiabilidade: str = "bom"
+
+class QueixaPrincipalModel(BaseModel):
+    texto_entre_aspas: str
+    inicio: Dict[str, Any]  # {"há": 3, "unidade": "dias"}
+
+class CronologiaModel(BaseModel):
+    inicio: str = ""
+    duracao: str = ""
+    frequencia: str = ""
+
+class SintomaModel(BaseModel):
+    nome: str
+    localizacao: str = ""
+    caracteristicas: str = ""
+    intensidade_0a10: Optional[int] = None
+    cronologia: CronologiaModel
+    situacoes: str = ""
+    fatores_agrava: str = ""
+    fatores_alivia: str = ""
+    associados: str = ""
+    pertinentes_positivos: List[str] = []
+    pertinentes_negativos: List[str] = []
+
+class HDAModel(BaseModel):
+    narrativa: str
+    sintomas_principais: List[SintomaModel] = []
+    impacto_vida: str = ""
+
+class SistemaISModel(BaseModel):
+    pergunta_guarda_chuva: str = ""
+    itens: List[Dict[str, Any]] = []  # [{"sintoma": "tosse", "presente": true, "detalhes": "..."}]
+
+class InterrogatorioSistematicoModel(BaseModel):
+    geral: SistemaISModel = SistemaISModel()
+    respiratorio: SistemaISModel = SistemaISModel()
+    cardiovascular: SistemaISModel = SistemaISModel()
+    gastrointestinal: SistemaISModel = SistemaISModel()
+    geniturinario: SistemaISModel = SistemaISModel()
+    musculoesqueletico: SistemaISModel = SistemaISModel()
+    neurologico: SistemaISModel = SistemaISModel()
+    psiquiatrico: SistemaISModel = SistemaISModel()
+    endocrino: SistemaISModel = SistemaISModel()
+    hemato: SistemaISModel = SistemaISModel()
+    pele: SistemaISModel = SistemaISModel()
+    reprodutivo: SistemaISModel = SistemaISModel()
+
+class AlergiaModel(BaseModel):
+    agente: str
+    reacao: str
+
+class MedicacaoModel(BaseModel):
+    nome: str
+    dose: str
+    posologia: str
+
+class AntecedentePessoalModel(BaseModel):
+    cronicos: List[str] = []
+    alergias: List[AlergiaModel] = []
+    medicacoes_uso: List[MedicacaoModel] = []
+    cirurgias_hospitalizacoes: List[str] = []
+    imunizacoes_relevantes: List[str] = []
+
+class AntecedenteFamiliarModel(BaseModel):
+    parentesco: str
+    condicao: str
+
+class EstadoAtualModel(BaseModel):
+    fisico: str = ""
+    mental: str = ""
+
+class EventoLinhaTempoModel(BaseModel):
+    ano: str
+    evento: str
+
+class AntecedentesModel(BaseModel):
+    pessoais: AntecedentePessoalModel
+    familiares: List[AntecedenteFamiliarModel] = []
+    estado_atual: EstadoAtualModel = EstadoAtualModel()
+    linha_do_tempo: List[EventoLinhaTempoModel] = []
+
+class AtividadeFisicaModel(BaseModel):
+    tipo: str = ""
+    frequencia_semana: int = 0
+    duracao_min: int = 0
+
+class SonoModel(BaseModel):
+    horas: float = 0
+    qualidade: str = ""
+
+class AlimentacaoModel(BaseModel):
+    padrao: str = ""
+    restricoes: str = ""
+
+class TabagismoModel(BaseModel):
+    status: str = "nunca"  # nunca, ex, atual
+    macos_dia: float = 0
+    anos: int = 0
+    carga_tabagica_packyears: float = 0
+
+class EtilismoModel(BaseModel):
+    tipos: List[str] = []
+    doses_semana: int = 0
+    uso_pesado_ep: bool = False
+
+class HabitosModel(BaseModel):
+    atividade_fisica: AtividadeFisicaModel = AtividadeFisicaModel()
+    sono: SonoModel = SonoModel()
+    alimentacao: AlimentacaoModel = AlimentacaoModel()
+    tabagismo: TabagismoModel = TabagismoModel()
+    etilismo: EtilismoModel = EtilismoModel()
+    outras_substancias: str = ""
+
+class PsicossocialModel(BaseModel):
+    composicao_familiar: str = ""
+    dependentes: int = 0
+    renda_familiar_faixa: str = ""
+    saneamento: str = ""
+    agua_segura: str = ""
+    riscos_ocupacionais: str = ""
+    suporte_social: str = ""
+    crencas_praticas_culturais: str = ""
+    barreiras_acesso: str = ""
+
+class AuditoriaModel(BaseModel):
+    data_hora_anamnese: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    versao_registro: int = 1
+
+class MetaModel(BaseModel):
+    consentimento: bool = False
+    profissional: Dict[str, str] = {"nome": "", "registro": "", "unidade": ""}
+    timestamp_iso: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class Anamnese(BaseModel):
+    model_config = ConfigDict(extra="ignore")
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    user_id: str
+    patient_id: Optional[str] = None
+    meta: MetaModel
+    identificacao: IdentificacaoModel
+    queixa_principal: QueixaPrincipalModel
+    hda: HDAModel
+    interrogatorio_sistematico: InterrogatorioSistematicoModel = InterrogatorioSistematicoModel()
+    antecedentes: AntecedentesModel
+    habitos: HabitosModel
+    psicossocial: PsicossocialModel
+    auditoria: AuditoriaModel = AuditoriaModel()
+    resumo_clinico_ia: Optional[str] = None
+    # Stub of a record in cold storage: only list/search fields are filled
+    archived: bool = False
+    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+class AnamneseCreate(BaseModel):
+    meta: MetaModel
+    identificacao: IdentificacaoModel
+    queixa_principal: QueixaPrincipalModel
+    hda: HDAModel
+    interrogatorio_sistematico: InterrogatorioSistematicoModel = InterrogatorioSistematicoModel()
+    antecedentes: AntecedentesModel
+    habitos: HabitosModel
+    psicossocial: PsicossocialModel
+
+class AnamneseUpdate(BaseModel):
+    meta: Optional[MetaModel] = None
+    identificacao: Optional[IdentificacaoModel] = None
+    queixa_principal: Optional[QueixaPrincipalModel] = None
+    hda: Optional[HDAModel] = None
+    interrogatorio_sistematico: Optional[InterrogatorioSistematicoModel] = None
+    antecedentes: Optional[AntecedentesModel] = None
+    habitos: Optional[HabitosModel] = None
+    psicossocial: Optional[PsicossocialModel] = None
+
+class GenerateSummaryResponse(BaseModel):
+    resumo_clinico: str
+    provider: Optional[str] = None
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+
+class StatsResponse(BaseModel):
+    total: int
+    geral: Dict[str, Any]
+    grupos: List[Dict[str, Any]]
@@ -0,0 +1,239 @@
+"""Longitudinal patient index.
+
+Every anamnese is linked to a patient entity through a stable `patient_id`
+derived from the normalized identity (name, mother's name, birthplace) of the
+clinician's patient. The id is stored on the anamnese itself, so a patient's
+whole history is one indexed query on (user_id, patient_id, created_at), and
+the timeline merges encounter dates with `antecedentes.linha_do_tempo`
+events server-side.
+
+The id is derived from the identity, not assigned: editing the name, the
+mother's name or the birthplace of an anamnese moves it to the patient of
+the new identity (a corrected typo joins the right patient). The old
+patient is removed once no anamnese points to it, and its timeline URL
+then answers 404.
+
+Backfill / rebuild:
+
+    python patients.py rebuild [--user-id USER_ID]
+"""
+import argparse
+import asyncio
+import os
+import re
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+from pymongo import UpdateOne
+
+import archive
+from textnorm import name_tokens, normalize
+
+PATIENTS_COLLECTION = "patients"
+
+# Namespace for deterministic patient ids (uuid5)
+PATIENT_NAMESPACE = uuid.UUID("6f1c3d1e-5b0a-4c8e-9a53-2f7d7c0b9e41")
+
+_YEAR = re.compile(r"(1[89]\d{2}|2\d{3})")
+
+
+class TimelineEntry(BaseModel):
+    tipo: str  # "atendimento" or "evento"
+    ano: Optional[int] = None
+    data: str
+    descricao: str
+    anamnese_ids: List[str]
+
+
+class Patient(BaseModel):
+    id: str
+    nome_completo: str
+    mae: str = ""
+    naturalidade: Dict[str, str] = {}
+    created_at: datetime
+    updated_at: datetime
+
+
+class PatientTimelineResponse(BaseModel):
+    patient: Patient
+    encontros: int
+    timeline: List[TimelineEntry]
+
+
+def patient_id_for(user_id: str, identificacao: Dict[str, Any]) -> str:
+    """Patient id of an identification block, scoped to the clinician.
+
+    Stable across case, accents and spacing of the identity fields; changes
+    when one of them is edited (see the module docstring).
+    """
+    naturalidade = identificacao.get("naturalidade") or {}
+    identity = "|".join([
+        user_id,
+        " ".join(name_tokens(identificacao.get("nome_completo", ""))),
+        " ".join(name_tokens(identificacao.get("mae", ""))),
+        normalize(naturalidade.get("cidade", "")),
+        normalize(naturalidade.get("uf", "")),
+    ])
+    return str(uuid.uuid5(PATIENT_NAMESPACE, identity))
+
+
+def _patient_upsert(anamnese: Dict[str, Any]) -> UpdateOne:
+    identificacao = anamnese.get("identificacao") or {}
+    now = datetime.now(timezone.utc).isoformat()
+    return UpdateOne(
+        {"id": anamnese["patient_id"]},
+        {
+            "$set": {
+                "user_id": anamnese["user_id"],
+                "nome_completo": identificacao.get("nome_completo", ""),
+                "mae": identificacao.get("mae", ""),
+                "naturalidade": identificacao.get("naturalidade") or {},
+                "updated_at": now,
+            },
+            "$setOnInsert": {"created_at": now},
+        },
+        upsert=True,
+    )
+
+
+async def link_anamnese(db, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]):
+    """Keep the patients collection in sync with an anamnese create/update/delete"""
+    if new and new.get("patient_id"):
+        await db[PATIENTS_COLLECTION].bulk_write([_patient_upsert(new)])
+    previous = (old or {}).get("patient_id")
+    if previous and previous != (new or {}).get("patient_id"):
+        # Drop patients left without encounters
+        if not await db.anamneses.find_one({"user_id": old["user_id"], "patient_id": previous}, {"_id": 1}):
+            await db[PATIENTS_COLLECTION].delete_one({"id": previous})
+
+
+async def ensure_indexes(db):
+    await db[PATIENTS_COLLECTION].create_index("id", unique=True)
+    await db[PATIENTS_COLLECTION].create_index("user_id")
+    await db.anamneses.create_index([("user_id", 1), ("patient_id", 1), ("created_at", 1)])
+
+
+def _year(text: str) -> Optional[int]:
+    match = _YEAR.search(text or "")
+    return int(match.group(1)) if match else None
+
+
+def _date(value: Any) -> str:
+    return value.isoformat() if isinstance(value, datetime) else str(value or "")
+
+
+def merge_timeline(anamneses: List[Dict[str, Any]]) -> List[TimelineEntry]:
+    """Merge encounters and reported history events into one chronological list.
+
+    The same history event is usually repeated in every anamnese of the
+    patient; repeated (year, event) pairs are collapsed into one entry that
+    lists every anamnese reporting it.
+    """
+    entries: List[TimelineEntry] = []
+    events: Dict[tuple, TimelineEntry] = {}
+    for anamnese in anamneses:
+        data = _date((anamnese.get("auditoria") or {}).get("data_hora_anamnese") or anamnese.get("created_at"))
+        entries.append(TimelineEntry(
+            tipo="atendimento",
+            ano=_year(data),
+            data=data,
+            descricao=(anamnese.get("queixa_principal") or {}).get("texto_entre_aspas", ""),
+            anamnese_ids=[anamnese["id"]],
+        ))
+        for evento in (anamnese.get("antecedentes") or {}).get("linha_do_tempo") or []:
+            key = (normalize(evento.get("ano", "")), normalize(evento.get("evento", "")))
+            if key in events:
+                events[key].anamnese_ids.append(anamnese["id"])
+                continue
+            events[key] = TimelineEntry(
+                tipo="evento",
+                ano=_year(evento.get("ano", "")),
+                data=evento.get("ano", ""),
+                descricao=evento.get("evento", ""),
+                anamnese_ids=[anamnese["id"]],
+            )
+    entries.extend(events.values())
+    # Undated events first, then by year; encounters sort by full timestamp within a year
+    entries.sort(key=lambda e: (e.ano is not None, e.ano or 0, e.tipo == "atendimento", e.data))
+    return entries
+
+
+TIMELINE_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "archived": 1,
+    "created_at": 1,
+    "auditoria.data_hora_anamnese": 1,
+    "queixa_principal.texto_entre_aspas": 1,
+    "antecedentes.linha_do_tempo": 1,
+}
+
+
+async def get_timeline(db, user_id: str, patient_id: str) -> Optional[PatientTimelineResponse]:
+    patient = await db[PATIENTS_COLLECTION].find_one({"id": patient_id, "user_id": user_id}, {"_id": 0, "user_id": 0})
+    if not patient:
+        return None
+    cursor = db.anamneses.find(
+        {"user_id": user_id, "patient_id": patient_id}, TIMELINE_PROJECTION
+    ).sort("created_at", 1)
+    anamneses = await archive.HydratingCursor(cursor, db[archive.COLD_COLLECTION]).to_list(None)
+    return PatientTimelineResponse(
+        patient=Patient(**patient),
+        encontros=len(anamneses),
+        timeline=merge_timeline(anamneses),
+    )
+
+
+async def rebuild(db, user_id: Optional[str] = None, batch_size: int = 1000) -> int:
+    """Assign patient_id to existing anamneses and recreate the patients collection"""
+    query = {"user_id": user_id} if user_id else {}
+    projection = {"_id": 0, "id": 1, "user_id": 1, "identificacao": 1}
+    await db[PATIENTS_COLLECTION].delete_many(query)
+    anamnese_ops: List[UpdateOne] = []
+    patient_ops: List[UpdateOne] = []
+    count = 0
+
+    async def flush():
+        if anamnese_ops:
+            await db.anamneses.bulk_write(anamnese_ops, ordered=False)
+            await db[PATIENTS_COLLECTION].bulk_write(patient_ops, ordered=False)
+            anamnese_ops.clear()
+            patient_ops.clear()
+
+    async for anamnese in db.anamneses.find(query, projection).batch_size(batch_size):
+        anamnese["patient_id"] = patient_id_for(anamnese["user_id"], anamnese.get("identificacao") or {})
+        anamnese_ops.append(UpdateOne({"id": anamnese["id"]}, {"$set": {"patient_id": anamnese["patient_id"]}}))
+        patient_ops.append(_patient_upsert(anamnese))
+        count += 1
+        if len(anamnese_ops) >= batch_size:
+            await flush()
+    await flush()
+    await ensure_indexes(db)
+    return count
+
+
+def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Maintain the longitudinal patient index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = subparsers.add_parser("rebuild", help="Link every anamnese to its patient")
+    rebuild_parser.add_argument("--user-id", help="Only rebuild the patients of this user")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        count = asyncio.run(rebuild(db, args.user_id))
+        print(f"Linked {count} anamneses to patients")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,341 @@
+"""PDF rendering of anamneses.
+
+Paragraph styles (and the optional TrueType font family) are built once per
+process and reused by every render. Each section of the record has its own
+template function; every user-provided value is escaped before it reaches
+ReportLab's paragraph markup. Page content streams are compressed by
+default, and a custom TrueType font (e.g. for full Unicode coverage) is
+embedded as a subset holding only the glyphs used, instead of the whole
+font file.
+
+Benchmark:
+
+    python benchmarks/bench_pdf.py [--records 100]
+"""
+import io
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer
+
+import digest
+
+ACCENT_COLOR = '#2C5F7C'
+
+SISTEMAS_IS = {
+    "geral": "Geral",
+    "respiratorio": "Respiratório",
+    "cardiovascular": "Cardiovascular",
+    "gastrointestinal": "Gastrointestinal",
+    "geniturinario": "Geniturinário",
+    "musculoesqueletico": "Musculoesquelético",
+    "neurologico": "Neurológico",
+    "psiquiatrico": "Psiquiátrico",
+    "endocrino": "Endócrino",
+    "hemato": "Hematológico",
+    "pele": "Pele e fâneros",
+    "reprodutivo": "Reprodutivo",
+}
+
+PSICOSSOCIAL_CAMPOS = [
+    ("composicao_familiar", "Composição familiar"),
+    ("dependentes", "Dependentes"),
+    ("renda_familiar_faixa", "Renda familiar"),
+    ("saneamento", "Saneamento"),
+    ("agua_segura", "Água segura"),
+    ("riscos_ocupacionais", "Riscos ocupacionais"),
+    ("suporte_social", "Suporte social"),
+    ("crencas_praticas_culturais", "Crenças e práticas culturais"),
+    ("barreiras_acesso", "Barreiras de acesso"),
+]
+
+
+@dataclass(frozen=True)
+class PdfOptions:
+    page_compression: bool = True
+    # TrueType files embedded as subsets; None uses the built-in Helvetica (not embedded)
+    font_path: Optional[str] = None
+    bold_font_path: Optional[str] = None
+    italic_font_path: Optional[str] = None
+
+
+@dataclass
+class RenderedPdf:
+    content: bytes
+    pages: int
+
+
+@dataclass(frozen=True)
+class Styles:
+    title: ParagraphStyle
+    heading: ParagraphStyle
+    body: ParagraphStyle
+
+
+@lru_cache(maxsize=None)
+def _font_family(font_path: Optional[str], bold_font_path: Optional[str], italic_font_path: Optional[str]) -> str:
+    """Register a TrueType family once; returns the family name to use in styles"""
+    if not font_path:
+        return "Helvetica"
+    family = Path(font_path).stem
+    variants = {
+        "normal": (family, font_path),
+        "bold": (f"{family}-Bold", bold_font_path or font_path),
+        "italic": (f"{family}-Italic", italic_font_path or font_path),
+    }
+    for name, path in variants.values():
+        # TTFont embeds only the glyphs used in each document (subsetting)
+        pdfmetrics.registerFont(TTFont(name, path))
+    pdfmetrics.registerFontFamily(
+        family,
+        normal=variants["normal"][0],
+        bold=variants["bold"][0],
+        italic=variants["italic"][0],
+        boldItalic=variants["bold"][0],
+    )
+    return family
+
+
+@lru_cache(maxsize=None)
+def styles(options: PdfOptions = PdfOptions()) -> Styles:
+    """Paragraph styles, compiled once per process and font family"""
+    family = _font_family(options.font_path, options.bold_font_path, options.italic_font_path)
+    sample = getSampleStyleSheet()
+    bold = f"{family}-Bold"
+    return Styles(
+        title=ParagraphStyle('AnamneseTitle', parent=sample['Heading1'], fontName=bold, fontSize=16,
+                             textColor=ACCENT_COLOR, spaceAfter=12, alignment=TA_CENTER),
+        heading=ParagraphStyle('AnamneseHeading', parent=sample['Heading2'], fontName=bold, fontSize=12,
+                               textColor=ACCENT_COLOR, spaceAfter=8, spaceBefore=12),
+        body=ParagraphStyle('AnamneseBody', parent=sample['BodyText'], fontName=family, fontSize=10, spaceAfter=6),
+    )
+
+
+# =======================
+# SECTION TEMPLATES
+# =======================
+
+# Paragraph markup, one entry per paragraph; values are escaped by the templates
+Lines = List[str]
+
+
+def _text(value: Any) -> str:
+    return escape(str(value)) if value is not None else ""
+
+
+def _field(label: str, value: Any) -> str:
+    return f"<b>{_text(label)}:</b> {_text(value)}"
+
+
+def _local(localidade: Optional[Dict[str, Any]]) -> str:
+    localidade = localidade or {}
+    return "/".join(part for part in (localidade.get("cidade", ""), localidade.get("uf", "")) if part)
+
+
+def _identificacao(a: Dict[str, Any]) -> Lines:
+    ident = a.get("identificacao") or {}
+    idade = ident.get("idade") or {}
+    lines = [_field("Nome", ident.get("nome_completo", ""))]
+    if ident.get("nome_social"):
+        lines.append(_field("Nome Social", ident["nome_social"]))
+    lines += [
+        _field("Idade", f"{idade.get('valor', '')} {idade.get('unidade', '')}"),
+        _field("Sexo Biológico", ident.get("sexo_biologico", "")),
+    ]
+    if ident.get("genero"):
+        lines.append(_field("Gênero", ident["genero"]))
+    lines += [
+        _field("Cor/Etnia", ident.get("cor_etnia", "")),
+        _field("Estado Civil", ident.get("estado_civil", "")),
+        _field("Ocupação", (ident.get("ocupacao") or {}).get("atividade", "")),
+        _field("Escolaridade", ident.get("escolaridade", "")),
+    ]
+    for key, label in (("religiao", "Religião"), ("mae", "Mãe"), ("responsavel_ou_cuidador", "Responsável/cuidador"),
+                       ("plano_ou_previdencia", "Plano/previdência")):
+        if ident.get(key):
+            lines.append(_field(label, ident[key]))
+    lines += [
+        _field("Naturalidade", _local(ident.get("naturalidade"))),
+        _field("Procedência", _local(ident.get("procedencia"))),
+    ]
+    return lines
+
+
+def _queixa_principal(a: Dict[str, Any]) -> Lines:
+    qp = a.get("queixa_principal") or {}
+    inicio = qp.get("inicio") or {}
+    return [
+        _text(qp.get("texto_entre_aspas", "")),
+        f"Início: há {_text(inicio.get('há', 0))} {_text(inicio.get('unidade', ''))}",
+    ]
+
+
+def _hda(a: Dict[str, Any]) -> Lines:
+    hda = a.get("hda") or {}
+    lines = [_text(hda.get("narrativa", ""))]
+    for sintoma in hda.get("sintomas_principais") or []:
+        detalhes = [
+            sintoma.get("localizacao", ""),
+            sintoma.get("caracteristicas", ""),
+            f"intensidade {sintoma['intensidade_0a10']}/10" if sintoma.get("intensidade_0a10") is not None else "",
+            f"agrava: {sintoma['fatores_agrava']}" if sintoma.get("fatores_agrava") else "",
+            f"alivia: {sintoma['fatores_alivia']}" if sintoma.get("fatores_alivia") else "",
+        ]
+        lines.append(f"• <b>{_text(sintoma.get('nome', ''))}</b> {_text('; '.join(d for d in detalhes if d))}")
+    if hda.get("impacto_vida"):
+        lines.append(_field("Impacto na vida", hda["impacto_vida"]))
+    return lines
+
+
+def _interrogatorio(a: Dict[str, Any]) -> Lines:
+    lines = []
+    negados = []
+    for key, conteudo in (a.get("interrogatorio_sistematico") or {}).items():
+        itens = (conteudo or {}).get("itens") or []
+        positivos = [
+            f"{item.get('sintoma', '')} ({item['detalhes']})" if item.get("detalhes") else item.get("sintoma", "")
+            for item in itens if item.get("presente")
+        ]
+        if positivos:
+            lines.append(_field(SISTEMAS_IS.get(key, key), ", ".join(positivos)))
+        elif itens:
+            negados.append(SISTEMAS_IS.get(key, key))
+    if negados:
+        lines.append(f"<i>Sem queixas: {_text(', '.join(negados))}</i>")
+    return lines
+
+
+def _antecedentes(a: Dict[str, Any]) -> Lines:
+    antecedentes = a.get("antecedentes") or {}
+    ant = antecedentes.get("pessoais") or {}
+    lines = []
+    if ant.get("cronicos"):
+        lines.append(_field("Crônicos", ", ".join(ant["cronicos"])))
+    if ant.get("alergias"):
+        lines.append(_field("Alergias", ", ".join(f"{al.get('agente', '')} ({al.get('reacao', '')})" for al in ant["alergias"])))
+    if ant.get("medicacoes_uso"):
+        medicacoes = "<br/>".join(
+            f"• {_text(m.get('nome', ''))} - {_text(m.get('dose', ''))} - {_text(m.get('posologia', ''))}"
+            for m in ant["medicacoes_uso"]
+        )
+        lines.append(f"<b>Medicações em uso:</b><br/>{medicacoes}")
+    if ant.get("cirurgias_hospitalizacoes"):
+        lines.append(_field("Cirurgias/hospitalizações", ", ".join(ant["cirurgias_hospitalizacoes"])))
+    if ant.get("imunizacoes_relevantes"):
+        lines.append(_field("Imunizações", ", ".join(ant["imunizacoes_relevantes"])))
+    estado = antecedentes.get("estado_atual") or {}
+    if estado.get("fisico") or estado.get("mental"):
+        lines.append(_field("Estado atual", "; ".join(v for v in (estado.get("fisico", ""), estado.get("mental", "")) if v)))
+    if antecedentes.get("linha_do_tempo"):
+        eventos = "<br/>".join(
+            f"• {_text(evento.get('ano', ''))}: {_text(evento.get('evento', ''))}"
+            for evento in antecedentes["linha_do_tempo"]
+        )
+        lines.append(f"<b>Linha do tempo:</b><br/>{eventos}")
+    return lines
+
+
+def _familiares(a: Dict[str, Any]) -> Lines:
+    return [
+        _field(f.get("parentesco", "").capitalize(), f.get("condicao", ""))
+        for f in (a.get("antecedentes") or {}).get("familiares") or []
+    ]
+
+
+def _habitos(a: Dict[str, Any]) -> Lines:
+    hab = a.get("habitos") or {}
+    atividade = hab.get("atividade_fisica") or {}
+    sono = hab.get("sono") or {}
+    alimentacao = hab.get("alimentacao") or {}
+    tabagismo = hab.get("tabagismo") or {}
+    etilismo = hab.get("etilismo") or {}
+    lines = [
+        _field("Tabagismo", f"{tabagismo.get('status', '')} (Carga tabágica: {tabagismo.get('carga_tabagica_packyears', 0)} pack-years)"),
+        _field("Etilismo", f"{etilismo.get('doses_semana', 0)} doses/semana"
+               + (f" ({', '.join(etilismo['tipos'])})" if etilismo.get("tipos") else "")),
+    ]
+    if atividade.get("tipo"):
+        lines.append(_field("Atividade física", f"{atividade['tipo']}, {atividade.get('frequencia_semana', 0)}x/semana, "
+                                                f"{atividade.get('duracao_min', 0)} min"))
+    if sono.get("horas"):
+        lines.append(_field("Sono", f"{sono['horas']} h/noite" + (f", {sono['qualidade']}" if sono.get("qualidade") else "")))
+    if alimentacao.get("padrao"):
+        lines.append(_field("Alimentação", alimentacao["padrao"]))
+    if hab.get("outras_substancias"):
+        lines.append(_field("Outras substâncias", hab["outras_substancias"]))
+    return lines
+
+
+def _psicossocial(a: Dict[str, Any]) -> Lines:
+    psicossocial = a.get("psicossocial") or {}
+    return [_field(label, psicossocial[key]) for key, label in PSICOSSOCIAL_CAMPOS if psicossocial.get(key)]
+
+
+def _resumo(a: Dict[str, Any]) -> Tuple[str, Lines]:
+    if a.get("resumo_clinico_ia"):
+        return "RESUMO CLÍNICO (IA)", [_text(a["resumo_clinico_ia"]).replace("\n", "<br/>")]
+    return "RESUMO CLÍNICO (automático)", [_text(digest.clinical_digest(a)).replace("\n", "<br/>")]
+
+
+SECTIONS = [
+    ("IDENTIFICAÇÃO", _identificacao),
+    ("QUEIXA PRINCIPAL", _queixa_principal),
+    ("HISTÓRIA DA DOENÇA ATUAL", _hda),
+    ("INTERROGATÓRIO SISTEMÁTICO", _interrogatorio),
+    ("ANTECEDENTES", _antecedentes),
+    ("ANTECEDENTES FAMILIARES", _familiares),
+    ("HÁBITOS DE VIDA", _habitos),
+    ("CONTEXTO PSICOSSOCIAL", _psicossocial),
+]
+
+
+# =======================
+# RENDERING
+# =======================
+
+def _footer(a: Dict[str, Any]) -> Lines:
+    created = a.get("created_at") or datetime.now(timezone.utc)
+    if not isinstance(created, str):
+        created = created.isoformat()
+    confiabilidade = (a.get("identificacao") or {}).get("grau_confiabilidade", "")
+    return [
+        f"<i>Documento gerado em: {created[:10]} às {created[11:16]}</i>",
+        f"<i>Grau de confiabilidade: {_text(confiabilidade)}</i>",
+    ]
+
+
+def render_anamnese(anamnese: Dict[str, Any], options: PdfOptions = PdfOptions()) -> RenderedPdf:
+    """Render one anamnese document (as stored) to PDF"""
+    style = styles(options)
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer, pagesize=A4, topMargin=2*cm, bottomMargin=2*cm,
+        pageCompression=1 if options.page_compression else 0,
+        title="Anamnese Clínica",
+    )
+
+    story = [Paragraph("ANAMNESE CLÍNICA", style.title), Spacer(1, 0.5*cm)]
+    sections = [(title, render(anamnese)) for title, render in SECTIONS]
+    sections.append(_resumo(anamnese))
+    for title, lines in sections:
+        if not lines:
+            continue
+        story.append(Paragraph(title, style.heading))
+        story.extend(Paragraph(line, style.body) for line in lines)
+        story.append(Spacer(1, 0.3*cm))
+
+    story.append(Spacer(1, 1*cm))
+    story.extend(Paragraph(line, style.body) for line in _footer(anamnese))
+
+    doc.build(story)
+    return RenderedPdf(content=buffer.getvalue(), pages=doc.page)
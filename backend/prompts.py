@@ -0,0 +1,342 @@
+"""Token-budgeted prompt for the AI clinical summary.
+
+The prompt is assembled from per-section templates. Every section has a full
+and a compact rendering; sections are fitted to the token budget by
+priority: first every section gets its compact form (lowest priority ones
+are dropped when even that does not fit), then sections are upgraded to
+their full form, most important first, and the last one that does not fit
+is truncated at a sentence boundary. Sections are always emitted in clinical
+order, whatever their priority.
+
+Tokens are counted with tiktoken when the encoding of the model is available
+locally, with a characters-per-token estimate otherwise. Loading an encoding
+reads (or downloads) its file, so the server loads it with `load_counter`,
+in a worker thread, at startup.
+"""
+import asyncio
+import math
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+DEFAULT_MODEL = "gpt-4o-mini"
+DEFAULT_TOKEN_BUDGET = 1200
+# Fallback estimate for Portuguese clinical text
+CHARS_PER_TOKEN = 3.6
+# Truncating a section below this is not worth the tokens
+MIN_SECTION_TOKENS = 24
+# Appended to truncated text, after the last whole sentence or after a hard cut
+SENTENCES_CUT = " […]"
+TEXT_CUT = "…"
+# A failed load of a tiktoken encoding is retried after this long
+ENCODING_RETRY_SECONDS = 60.0
+
+SYSTEM_MESSAGE = "Você é um assistente médico especializado em resumos clínicos estruturados."
+
+HEADER = (
+    "Você é um médico experiente. Gere um resumo clínico estruturado e profissional "
+    "em português a partir dos seguintes dados de anamnese:"
+)
+FOOTER = (
+    "Gere um resumo clínico conciso (máximo 300 palavras) destacando os pontos mais "
+    "relevantes para o diagnóstico e conduta."
+)
+
+_SENTENCE_END = re.compile(r"(?<=[.!?;])\s+")
+
+
+# =======================
+# TOKEN COUNTING
+# =======================
+
+class TokenCounter:
+    """Counts and truncates text in tokens of a given model"""
+
+    def __init__(self, model: str = DEFAULT_MODEL):
+        self.encoding = _encoding(model)
+        self.name = f"tiktoken:{self.encoding.name}" if self.encoding else "estimate"
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.encoding:
+            return len(self.encoding.encode(text))
+        return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Longest prefix of whole sentences within max_tokens, hard-cut if the first sentence is too long.
+
+        The tokens of the truncation marker are counted within max_tokens.
+        """
+        if self.count(text) <= max_tokens:
+            return text
+        kept: List[str] = []
+        used = self.count(SENTENCES_CUT)
+        for sentence in _SENTENCE_END.split(text):
+            cost = self.count(sentence + " ")
+            if used + cost > max_tokens:
+                break
+            kept.append(sentence)
+            used += cost
+        if kept:
+            return " ".join(kept) + SENTENCES_CUT
+        available = max(max_tokens - self.count(TEXT_CUT), 0)
+        if self.encoding:
+            cut = self.encoding.decode(self.encoding.encode(text)[:available])
+        else:
+            cut = text[:int(available * CHARS_PER_TOKEN)]
+        return cut.rstrip() + TEXT_CUT
+
+
+_encodings: Dict[str, Any] = {}
+# Model -> time.monotonic() of its last failed load
+_encoding_failures: Dict[str, float] = {}
+
+
+def _encoding(model: str):
+    # tiktoken downloads encodings on first use; without network access fall back to
+    # the estimate. Only loaded encodings are kept: a failed load is retried, at most
+    # once every ENCODING_RETRY_SECONDS
+    encoding = _encodings.get(model)
+    if encoding is not None:
+        return encoding
+    failed_at = _encoding_failures.get(model)
+    if failed_at is not None and time.monotonic() - failed_at < ENCODING_RETRY_SECONDS:
+        return None
+    try:
+        import tiktoken
+        encoding = _encodings[model] = tiktoken.encoding_for_model(model)
+    except Exception:
+        _encoding_failures[model] = time.monotonic()
+        return None
+    _encoding_failures.pop(model, None)
+    return encoding
+
+
+def counter_for(model: str = DEFAULT_MODEL) -> TokenCounter:
+    """Counter of a model, with tiktoken as soon as its encoding could be loaded"""
+    return TokenCounter(model)
+
+
+async def load_counter(model: str = DEFAULT_MODEL) -> TokenCounter:
+    """counter_for without blocking the event loop on the first load of the encoding"""
+    return await asyncio.to_thread(counter_for, model)
+
+
+# =======================
+# SECTION TEMPLATES
+# =======================
+
+def _get(doc: Dict[str, Any], path: str, default: Any = "") -> Any:
+    for key in path.split("."):
+        doc = doc.get(key) if isinstance(doc, dict) else None
+        if doc is None:
+            return default
+    return doc
+
+
+def _join(items: List[str], empty: str) -> str:
+    items = [item for item in items if item]
+    return ", ".join(items) if items else empty
+
+
+def _identificacao(a: Dict[str, Any], compact: bool) -> str:
+    ident = a.get("identificacao") or {}
+    idade = ident.get("idade") or {}
+    lines = [
+        f"Nome: {ident.get('nome_completo', '')}",
+        f"Idade: {idade.get('valor', '')} {idade.get('unidade', '')}",
+        f"Sexo: {ident.get('sexo_biologico', '')}",
+        f"Ocupação: {_get(ident, 'ocupacao.atividade')}",
+    ]
+    if compact:
+        return "; ".join(lines)
+    return "\n".join(lines)
+
+
+def _queixa_principal(a: Dict[str, Any], compact: bool) -> str:
+    inicio = _get(a, "queixa_principal.inicio", {}) or {}
+    return f"{_get(a, 'queixa_principal.texto_entre_aspas')}\nInício: há {inicio.get('há', 0)} {inicio.get('unidade', '')}"
+
+
+def _hda(a: Dict[str, Any], compact: bool) -> str:
+    narrativa = _get(a, "hda.narrativa")
+    sintomas = [s.get("nome", "") for s in _get(a, "hda.sintomas_principais", [])]
+    if compact:
+        # Opening sentences carry onset and character of the complaint
+        narrativa = " ".join(_SENTENCE_END.split(narrativa)[:2])
+    lines = [narrativa]
+    if sintomas:
+        lines.append(f"Sintomas principais: {_join(sintomas, '')}")
+    impacto = _get(a, "hda.impacto_vida")
+    if impacto and not compact:
+        lines.append(f"Impacto na vida: {impacto}")
+    return "\n".join(lines)
+
+
+def _antecedentes_pessoais(a: Dict[str, Any], compact: bool) -> str:
+    pessoais = _get(a, "antecedentes.pessoais", {}) or {}
+    alergias = [f"{al.get('agente', '')} ({al.get('reacao', '')})" for al in pessoais.get("alergias") or []]
+    if compact:
+        medicacoes = [m.get("nome", "") for m in pessoais.get("medicacoes_uso") or []]
+    else:
+        medicacoes = [f"{m.get('nome', '')} {m.get('dose', '')} {m.get('posologia', '')}".strip() for m in pessoais.get("medicacoes_uso") or []]
+    lines = [
+        f"Crônicos: {_join(pessoais.get('cronicos') or [], 'Nenhum')}",
+        f"Alergias: {_join(alergias, 'Nenhuma')}",
+        f"Medicações: {_join(medicacoes, 'Nenhuma')}",
+    ]
+    cirurgias = pessoais.get("cirurgias_hospitalizacoes") or []
+    if cirurgias and not compact:
+        lines.append(f"Cirurgias/hospitalizações: {_join(cirurgias, '')}")
+    return "\n".join(lines)
+
+
+def _positive_findings(a: Dict[str, Any]) -> List[Tuple[str, List[Dict[str, Any]]]]:
+    interrogatorio = a.get("interrogatorio_sistematico") or {}
+    findings = []
+    for sistema, conteudo in interrogatorio.items():
+        itens = [item for item in (conteudo or {}).get("itens") or [] if item.get("presente")]
+        if itens:
+            findings.append((sistema, itens))
+    return findings
+
+
+def _interrogatorio(a: Dict[str, Any], compact: bool) -> str:
+    lines = []
+    for sistema, itens in _positive_findings(a):
+        if compact:
+            sintomas = [item.get("sintoma", "") for item in itens]
+        else:
+            sintomas = [
+                f"{item.get('sintoma', '')} ({item['detalhes']})" if item.get("detalhes") else item.get("sintoma", "")
+                for item in itens
+            ]
+        lines.append(f"{sistema}: {_join(sintomas, '')}")
+    return "\n".join(lines)
+
+
+def _habitos(a: Dict[str, Any], compact: bool) -> str:
+    habitos = a.get("habitos") or {}
+    lines = [
+        f"Tabagismo: {_get(habitos, 'tabagismo.status', 'não informado')} "
+        f"(carga tabágica: {_get(habitos, 'tabagismo.carga_tabagica_packyears', 0)} pack-years)",
+        f"Etilismo: {_get(habitos, 'etilismo.doses_semana', 0)} doses/semana",
+        f"Atividade física: {_get(habitos, 'atividade_fisica.tipo')}",
+    ]
+    if not compact:
+        if _get(habitos, "sono.horas", 0):
+            lines.append(f"Sono: {_get(habitos, 'sono.horas')} h ({_get(habitos, 'sono.qualidade')})")
+        if habitos.get("outras_substancias"):
+            lines.append(f"Outras substâncias: {habitos['outras_substancias']}")
+    return "\n".join(lines)
+
+
+def _familiares(a: Dict[str, Any], compact: bool) -> str:
+    familiares = _get(a, "antecedentes.familiares", []) or []
+    if compact:
+        # Condition list only: who had it matters less than what runs in the family
+        return _join(sorted({f.get("condicao", "") for f in familiares}), "")
+    return "\n".join(f"{f.get('parentesco', '')}: {f.get('condicao', '')}" for f in familiares)
+
+
+def _psicossocial(a: Dict[str, Any], compact: bool) -> str:
+    psicossocial = a.get("psicossocial") or {}
+    fields = [("Suporte social", "suporte_social"), ("Riscos ocupacionais", "riscos_ocupacionais"), ("Barreiras de acesso", "barreiras_acesso")]
+    if not compact:
+        fields += [("Composição familiar", "composicao_familiar"), ("Saneamento", "saneamento")]
+    return "\n".join(f"{label}: {psicossocial[key]}" for label, key in fields if psicossocial.get(key))
+
+
+@dataclass
+class Section:
+    key: str
+    title: str
+    # Lower is more important
+    priority: int
+    render: Callable[[Dict[str, Any], bool], str]
+
+
+# Clinical order of the prompt
+SECTIONS = [
+    Section("identificacao", "IDENTIFICAÇÃO", 0, _identificacao),
+    Section("queixa_principal", "QUEIXA PRINCIPAL", 0, _queixa_principal),
+    Section("hda", "HISTÓRIA DA DOENÇA ATUAL", 1, _hda),
+    Section("interrogatorio_sistematico", "INTERROGATÓRIO SISTEMÁTICO (achados positivos)", 3, _interrogatorio),
+    Section("antecedentes_pessoais", "ANTECEDENTES PESSOAIS", 1, _antecedentes_pessoais),
+    Section("antecedentes_familiares", "ANTECEDENTES FAMILIARES", 4, _familiares),
+    Section("habitos", "HÁBITOS", 2, _habitos),
+    Section("psicossocial", "CONTEXTO PSICOSSOCIAL", 5, _psicossocial),
+]
+
+
+# =======================
+# PROMPT ASSEMBLY
+# =======================
+
+@dataclass
+class BuiltPrompt:
+    text: str
+    tokens: int
+    budget: int
+    counter: str
+    # Section key -> "full", "compact", "truncated" or "omitted"
+    sections: Dict[str, str] = field(default_factory=dict)
+
+
+def _block(title: str, body: str) -> str:
+    return f"**{title}:**\n{body}"
+
+
+def build_summary_prompt(anamnese: Dict[str, Any], budget: int = DEFAULT_TOKEN_BUDGET, model: str = DEFAULT_MODEL,
+                         counter: Optional[TokenCounter] = None) -> BuiltPrompt:
+    """Summary prompt of an anamnese fitted to `budget` tokens, counted with `counter` (see load_counter)"""
+    counter = counter or counter_for(model)
+    # Blocks are joined by blank lines
+    separator = counter.count("\n\n")
+    remaining = budget - counter.count(HEADER) - counter.count(FOOTER) - 2 * separator
+
+    rendered: Dict[str, Dict[str, str]] = {}
+    for section in SECTIONS:
+        full = section.render(anamnese, False).strip()
+        if full:
+            compact = section.render(anamnese, True).strip() or full
+            rendered[section.key] = {"full": _block(section.title, full), "compact": _block(section.title, compact)}
+
+    by_priority = sorted((s for s in SECTIONS if s.key in rendered), key=lambda s: s.priority)
+    chosen: Dict[str, str] = {}
+    modes: Dict[str, str] = {s.key: "omitted" for s in SECTIONS if s.key in rendered}
+
+    # Pass 1: compact forms, most important first
+    for section in by_priority:
+        cost = counter.count(rendered[section.key]["compact"]) + separator
+        if cost <= remaining:
+            chosen[section.key] = rendered[section.key]["compact"]
+            modes[section.key] = "compact"
+            remaining -= cost
+
+    # Pass 2: upgrade to full forms with what is left, truncating the first one that does not fit
+    for section in by_priority:
+        if section.key not in chosen:
+            continue
+        full = rendered[section.key]["full"]
+        if full == chosen[section.key]:
+            modes[section.key] = "full"
+            continue
+        extra = counter.count(full) - counter.count(chosen[section.key])
+        if extra <= remaining:
+            chosen[section.key] = full
+            modes[section.key] = "full"
+            remaining -= extra
+        elif remaining >= MIN_SECTION_TOKENS:
+            available = counter.count(chosen[section.key]) + remaining
+            truncated = counter.truncate(full, available)
+            if counter.count(truncated) > counter.count(chosen[section.key]):
+                remaining -= counter.count(truncated) - counter.count(chosen[section.key])
+                chosen[section.key] = truncated
+                modes[section.key] = "truncated"
+
+    blocks = [HEADER] + [chosen[s.key] for s in SECTIONS if s.key in chosen] + [FOOTER]
+    text = "\n\n".join(blocks)
+    return BuiltPrompt(text=text, tokens=counter.count(text), budget=budget, counter=counter.name, sections=modes)
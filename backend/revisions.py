@@ -0,0 +1,153 @@
+"""Compact version history for anamneses.
+
+Instead of a full snapshot per edit, each update stores the structural diff
+(set/unset operations on nested paths) from the previous version. Every
+CHECKPOINT_EVERY versions a full snapshot is stored, so reconstructing any
+version costs one checkpoint read plus at most CHECKPOINT_EVERY - 1 diffs.
+"""
+import copy
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from pydantic import BaseModel
+
+REVISIONS_COLLECTION = "anamnese_revisions"
+CHECKPOINT_EVERY = 10
+
+# Not part of the clinical record history: Mongo internals and generated content
+UNVERSIONED_FIELDS = {"_id", "resumo_clinico_ia"}
+
+
+class RevisionInfo(BaseModel):
+    versao: int
+    tipo: str  # "checkpoint" or "delta"
+    created_at: datetime
+    campos_alterados: List[str] = []
+
+
+class ChangeOperation(BaseModel):
+    op: str  # "set" or "unset"
+    path: List[str]
+    value: Any = None
+
+
+class VersionDiffResponse(BaseModel):
+    anamnese_id: str
+    from_version: int
+    to_version: int
+    changes: List[ChangeOperation]
+
+
+def _snapshot(anamnese: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: v for k, v in anamnese.items() if k not in UNVERSIONED_FIELDS}
+
+
+def version_of(anamnese: Dict[str, Any]) -> int:
+    return int((anamnese.get("auditoria") or {}).get("versao_registro") or 1)
+
+
+def diff(old: Dict[str, Any], new: Dict[str, Any], path: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """Structural diff: nested dicts are recursed into, lists and scalars are replaced whole"""
+    path = path or []
+    operations: List[Dict[str, Any]] = []
+    for key in old.keys() - new.keys():
+        operations.append({"op": "unset", "path": path + [key]})
+    for key, value in new.items():
+        if key not in old:
+            operations.append({"op": "set", "path": path + [key], "value": value})
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            operations.extend(diff(old[key], value, path + [key]))
+        elif value != old[key]:
+            operations.append({"op": "set", "path": path + [key], "value": value})
+    return operations
+
+
+def apply(document: Dict[str, Any], operations: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Return a copy of `document` with the diff operations applied"""
+    result = copy.deepcopy(document)
+    for operation in operations:
+        *parents, leaf = operation["path"]
+        node = result
+        for key in parents:
+            node = node.setdefault(key, {})
+        if operation["op"] == "unset":
+            node.pop(leaf, None)
+        else:
+            node[leaf] = copy.deepcopy(operation["value"])
+    return result
+
+
+async def ensure_indexes(collection):
+    await collection.create_index([("anamnese_id", 1), ("versao", 1)], unique=True)
+
+
+def _revision(anamnese: Dict[str, Any], versao: int, **content) -> Dict[str, Any]:
+    return {
+        "anamnese_id": anamnese["id"],
+        "user_id": anamnese["user_id"],
+        "versao": versao,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        **content,
+    }
+
+
+async def record_checkpoint(collection, anamnese: Dict[str, Any]):
+    """Store a full snapshot of the anamnese at its current version"""
+    await collection.insert_one(_revision(anamnese, version_of(anamnese), tipo="checkpoint", documento=_snapshot(anamnese)))
+
+
+async def record_update(collection, previous: Dict[str, Any], current: Dict[str, Any]):
+    """Store the revision produced by an update (previous -> current)"""
+    previous_version = version_of(previous)
+    # Records created before version history existed get their base snapshot lazily
+    if not await collection.find_one({"anamnese_id": previous["id"], "versao": previous_version}, {"_id": 1}):
+        await record_checkpoint(collection, previous)
+
+    versao = version_of(current)
+    if versao % CHECKPOINT_EVERY == 0:
+        await record_checkpoint(collection, current)
+    else:
+        operations = diff(_snapshot(previous), _snapshot(current))
+        await collection.insert_one(_revision(current, versao, tipo="delta", operacoes=operations))
+
+
+async def reconstruct(collection, user_id: str, anamnese_id: str, versao: int) -> Optional[Dict[str, Any]]:
+    """Rebuild a past version from the nearest checkpoint and the diffs after it"""
+    checkpoint = await collection.find_one(
+        {"anamnese_id": anamnese_id, "user_id": user_id, "tipo": "checkpoint", "versao": {"$lte": versao}},
+        sort=[("versao", -1)],
+    )
+    if not checkpoint:
+        return None
+
+    document = checkpoint["documento"]
+    applied = checkpoint["versao"]
+    cursor = collection.find(
+        {"anamnese_id": anamnese_id, "tipo": "delta", "versao": {"$gt": applied, "$lte": versao}},
+        {"_id": 0, "versao": 1, "operacoes": 1},
+    ).sort("versao", 1)
+    async for delta in cursor:
+        document = apply(document, delta["operacoes"])
+        applied = delta["versao"]
+
+    return document if applied == versao else None
+
+
+async def list_revisions(collection, user_id: str, anamnese_id: str) -> List[RevisionInfo]:
+    cursor = collection.find(
+        {"anamnese_id": anamnese_id, "user_id": user_id},
+        {"_id": 0, "versao": 1, "tipo": 1, "created_at": 1, "operacoes.path": 1},
+    ).sort("versao", 1)
+    return [
+        RevisionInfo(
+            versao=revision["versao"],
+            tipo=revision["tipo"],
+            created_at=revision["created_at"],
+            campos_alterados=sorted({".".join(op["path"]) for op in revision.get("operacoes", [])}),
+        )
+        async for revision in cursor
+    ]
+
+
+async def delete_revisions(collection, anamnese_id: str):
+    await collection.delete_many({"anamnese_id": anamnese_id})
@@ -0,0 +1,187 @@
+"""Vectorized population risk scoring over a clinician's cohort.
+
+Risk factors already captured in the anamnese (pack-years, heavy drinking,
+sedentary habits, short sleep, chronic conditions) are loaded in batches into
+NumPy arrays; each factor is normalized to [0, 1] and the score is the
+weighted sum of the factor matrix. Ranking uses a partial partition so a
+"highest-risk patients" page only sorts the rows it returns.
+
+NumPy is imported on first use, through coldstart.load, so loading the API
+does not pay for it.
+"""
+from typing import TYPE_CHECKING, Any, Dict, List
+
+from pydantic import BaseModel, Field
+
+import archive
+import coldstart
+
+if TYPE_CHECKING:
+    import numpy as np
+
+FACTORS = ["tabagismo", "etilismo_pesado", "sedentarismo", "sono_curto", "cronicos"]
+
+PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "archived": 1,
+    "identificacao.nome_completo": 1,
+    "identificacao.idade": 1,
+    "habitos.tabagismo.carga_tabagica_packyears": 1,
+    "habitos.etilismo.uso_pesado_ep": 1,
+    "habitos.etilismo.doses_semana": 1,
+    "habitos.atividade_fisica.frequencia_semana": 1,
+    "habitos.atividade_fisica.duracao_min": 1,
+    "habitos.sono.horas": 1,
+    "antecedentes.pessoais.cronicos": 1,
+}
+
+
+class RiskWeights(BaseModel):
+    tabagismo: float = 3.0
+    etilismo_pesado: float = 2.0
+    sedentarismo: float = 1.5
+    sono_curto: float = 1.0
+    cronicos: float = 2.5
+
+
+class RiskThresholds(BaseModel):
+    packyears_max: float = Field(default=40.0, gt=0)  # pack-years at which the smoking factor saturates
+    doses_semana_pesado: int = 14  # weekly doses counted as heavy drinking
+    atividade_min_semana: int = 150  # weekly active minutes below which habits are sedentary
+    sono_horas_min: float = 6.0  # reported sleep below this is short sleep
+    cronicos_max: int = Field(default=3, gt=0)  # chronic conditions at which the factor saturates
+
+
+class RiskQuery(BaseModel):
+    weights: RiskWeights = RiskWeights()
+    thresholds: RiskThresholds = RiskThresholds()
+    min_score: float = 0
+    page: int = Field(default=1, ge=1)
+    page_size: int = Field(default=20, ge=1, le=500)
+
+
+class RiskScoreItem(BaseModel):
+    id: str
+    nome_completo: str
+    idade: Dict[str, Any]
+    score: float
+    fatores: Dict[str, float]
+
+
+class RiskScoreResponse(BaseModel):
+    total: int
+    page: int
+    page_size: int
+    itens: List[RiskScoreItem]
+
+
+def _column(docs: List[Dict[str, Any]], path: str, dtype: Any = float, default: Any = 0) -> "np.ndarray":
+    np = coldstart.load("numpy")
+
+    parts = path.split(".")
+
+    def extract(doc):
+        for part in parts:
+            doc = doc.get(part) if isinstance(doc, dict) else None
+            if doc is None:
+                return default
+        return doc
+
+    return np.fromiter((extract(d) for d in docs), dtype=dtype, count=len(docs))
+
+
+def factor_matrix(docs: List[Dict[str, Any]], thresholds: RiskThresholds) -> "np.ndarray":
+    """Normalized risk factors, one row per document and one column per FACTORS entry"""
+    np = coldstart.load("numpy")
+
+    packyears = _column(docs, "habitos.tabagismo.carga_tabagica_packyears")
+    pesado = _column(docs, "habitos.etilismo.uso_pesado_ep", dtype=np.bool_, default=False)
+    doses = _column(docs, "habitos.etilismo.doses_semana")
+    frequencia = _column(docs, "habitos.atividade_fisica.frequencia_semana")
+    duracao = _column(docs, "habitos.atividade_fisica.duracao_min")
+    sono = _column(docs, "habitos.sono.horas")
+    cronicos = np.fromiter(
+        (len(((d.get("antecedentes") or {}).get("pessoais") or {}).get("cronicos") or []) for d in docs),
+        dtype=np.float64,
+        count=len(docs),
+    )
+
+    matrix = np.empty((len(docs), len(FACTORS)), dtype=np.float64)
+    matrix[:, 0] = np.clip(packyears / thresholds.packyears_max, 0, 1)
+    matrix[:, 1] = pesado | (doses >= thresholds.doses_semana_pesado)
+    matrix[:, 2] = (frequencia * duracao) < thresholds.atividade_min_semana
+    # Zero hours means "not informed", not "no sleep"
+    matrix[:, 3] = (sono > 0) & (sono < thresholds.sono_horas_min)
+    matrix[:, 4] = np.clip(cronicos / thresholds.cronicos_max, 0, 1)
+    return matrix
+
+
+def weight_vector(weights: RiskWeights) -> "np.ndarray":
+    np = coldstart.load("numpy")
+
+    return np.array([getattr(weights, factor) for factor in FACTORS], dtype=np.float64)
+
+
+async def score_cohort(collection, user_id: str, query: RiskQuery, batch_size: int = 5000) -> RiskScoreResponse:
+    """Score every anamnese of a user and return one page ranked by descending score"""
+    np = coldstart.load("numpy")
+
+    weights = weight_vector(query.weights)
+    ids: List[str] = []
+    nomes: List[str] = []
+    idades: List[Dict[str, Any]] = []
+    matrices: List["np.ndarray"] = []
+
+    batch: List[Dict[str, Any]] = []
+    cursor = archive.HydratingCursor(
+        collection.find({"user_id": user_id}, PROJECTION), collection.database[archive.COLD_COLLECTION]
+    ).batch_size(batch_size)
+    async for doc in cursor:
+        identificacao = doc.get("identificacao") or {}
+        ids.append(doc["id"])
+        nomes.append(identificacao.get("nome_completo", ""))
+        idades.append(identificacao.get("idade") or {})
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            matrices.append(factor_matrix(batch, query.thresholds))
+            batch = []
+    if batch:
+        matrices.append(factor_matrix(batch, query.thresholds))
+
+    if not matrices:
+        return RiskScoreResponse(total=0, page=query.page, page_size=query.page_size, itens=[])
+
+    factors = np.concatenate(matrices)
+    contributions = factors * weights
+    scores = contributions.sum(axis=1)
+
+    eligible = np.flatnonzero(scores >= query.min_score) if query.min_score > 0 else np.arange(len(scores))
+    total = len(eligible)
+    start = (query.page - 1) * query.page_size
+    stop = min(start + query.page_size, total)
+    if start >= total:
+        return RiskScoreResponse(total=total, page=query.page, page_size=query.page_size, itens=[])
+
+    # Only rows that can land in the first `stop` positions are sorted; ties
+    # are broken by position so consecutive pages never overlap
+    keys = -scores[eligible]
+    if stop < total:
+        kth = np.partition(keys, stop - 1)[stop - 1]
+        candidates = np.flatnonzero(keys <= kth)
+    else:
+        candidates = np.arange(total)
+    order = candidates[np.lexsort((candidates, keys[candidates]))]
+    ranked = eligible[order[start:stop]]
+
+    itens = [
+        RiskScoreItem(
+            id=ids[i],
+            nome_completo=nomes[i],
+            idade=idades[i],
+            score=round(float(scores[i]), 4),
+            fatores={factor: round(float(contributions[i, j]), 4) for j, factor in enumerate(FACTORS) if contributions[i, j]},
+        )
+        for i in ranked
+    ]
+    return RiskScoreResponse(total=total, page=query.page, page_size=query.page_size, itens=itens)
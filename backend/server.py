@@ -1,33 +1,53 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, status
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse
+from starlette.background import BackgroundTask
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne, ReturnDocument
 import os
+import asyncio
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict
 import uuid
 from datetime import datetime, timezone, timedelta
 import httpx
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import cm
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
-from reportlab.lib.enums import TA_LEFT, TA_CENTER
-import io
 import json
-from emergentintegrations.llm.chat import LlmChat, UserMessage
+import tempfile
+import time
+import admission
+import archive
+import autocomplete
+import coldstart
+import database
+import groupcommit
+import stats
+import risk
+import dedup
+import patients
+import revisions
+import singleflight
+import sparse
+import model_io
+import prompts
+import llm
+import digest
+import live
+from models import (
+    User, UserSession, SessionDataResponse, Anamnese, AnamneseCreate, AnamneseUpdate,
+    AuditoriaModel, GenerateSummaryResponse, StatsResponse
+)
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# MongoDB connection: `db` reads from the primary, `heavy_reads_db` serves
+# list/export/analytics reads with the configured read preference
+mongo_settings = database.MongoSettings.from_env()
+client = database.create_client(mongo_settings)
+db = client[mongo_settings.db_name]
+heavy_reads_db = database.heavy_reads_database(client, mongo_settings)
 
 # Create the main app
 app = FastAPI()
@@ -35,242 +55,216 @@ api_router = APIRouter(prefix="/api")
 
 # LLM Configuration
 EMERGENT_LLM_KEY = os.environ.get('EMERGENT_LLM_KEY')
+SUMMARY_MODEL = os.environ.get('SUMMARY_MODEL', prompts.DEFAULT_MODEL)
+SUMMARY_PROMPT_TOKEN_BUDGET = int(os.environ.get('SUMMARY_PROMPT_TOKEN_BUDGET', str(prompts.DEFAULT_TOKEN_BUDGET)))
+# "provider/model" specs; hedged requests and fallbacks go to the alternate. None by default:
+# a second request to the primary's own upstream does not help when that upstream is the one failing
+SUMMARY_LLM = os.environ.get('SUMMARY_LLM', f"openai/{SUMMARY_MODEL}")
+SUMMARY_LLM_ALTERNATE = os.environ.get('SUMMARY_LLM_ALTERNATE', '')
+LLM_DEADLINE_SECONDS = float(os.environ.get('LLM_DEADLINE_SECONDS', str(llm.DEFAULT_DEADLINE_SECONDS)))
+LLM_HEDGING = os.environ.get('LLM_HEDGING', 'true').lower() == 'true'
+LLM_MAX_RETRIES = int(os.environ.get('LLM_MAX_RETRIES', str(llm.DEFAULT_MAX_RETRIES)))
+
+# Reported as the provider of preview summaries
+DIGEST_PROVIDER = "local/extractive"
+
+summary_llm = llm.LlmClient(
+    llm.provider_from_spec(SUMMARY_LLM, EMERGENT_LLM_KEY),
+    alternate=llm.provider_from_spec(SUMMARY_LLM_ALTERNATE, EMERGENT_LLM_KEY) if SUMMARY_LLM_ALTERNATE else None,
+    deadline=LLM_DEADLINE_SECONDS,
+    hedging=LLM_HEDGING,
+    max_retries=LLM_MAX_RETRIES
+)
+
+# Session Configuration
+SESSION_TTL = timedelta(days=float(os.environ.get('SESSION_TTL_DAYS', '7')))
+SESSION_SLIDING_EXPIRATION = os.environ.get('SESSION_SLIDING_EXPIRATION', 'true').lower() == 'true'
+SESSION_SWEEP_INTERVAL_SECONDS = float(os.environ.get('SESSION_SWEEP_INTERVAL_SECONDS', '3600'))
+SESSION_TOUCH_FLUSH_SECONDS = float(os.environ.get('SESSION_TOUCH_FLUSH_SECONDS', '60'))
+
+# Validation Configuration
+STRICT_WRITE_VALIDATION = os.environ.get('STRICT_WRITE_VALIDATION', 'true').lower() == 'true'
+
+# PDF Configuration: optional TrueType fonts are embedded as subsets
+PDF_PAGE_COMPRESSION = os.environ.get('PDF_PAGE_COMPRESSION', 'true').lower() == 'true'
+PDF_FONT = os.environ.get('PDF_FONT') or None
+PDF_FONT_BOLD = os.environ.get('PDF_FONT_BOLD') or None
+PDF_FONT_ITALIC = os.environ.get('PDF_FONT_ITALIC') or None
+
+# Admission Configuration: per-user/global token buckets and per-class concurrency
+ADMISSION_CONTROL = os.environ.get('ADMISSION_CONTROL', 'true').lower() == 'true'
+admission_control = admission.AdmissionController(admission.AdmissionSettings(
+    user_rate=float(os.environ.get('ADMISSION_USER_RATE', str(admission.DEFAULT_USER_RATE))),
+    user_burst=float(os.environ.get('ADMISSION_USER_BURST', str(admission.DEFAULT_USER_BURST))),
+    global_rate=float(os.environ.get('ADMISSION_GLOBAL_RATE', str(admission.DEFAULT_GLOBAL_RATE))),
+    global_burst=float(os.environ.get('ADMISSION_GLOBAL_BURST', str(admission.DEFAULT_GLOBAL_BURST))),
+    concurrency={
+        admission.DEFAULT: int(os.environ.get('ADMISSION_DEFAULT_CONCURRENCY', str(admission.DEFAULT_CONCURRENCY[admission.DEFAULT]))),
+        admission.PDF: int(os.environ.get('ADMISSION_PDF_CONCURRENCY', str(admission.DEFAULT_CONCURRENCY[admission.PDF]))),
+        admission.LLM: int(os.environ.get('ADMISSION_LLM_CONCURRENCY', str(admission.DEFAULT_CONCURRENCY[admission.LLM]))),
+    },
+    queue_timeout=float(os.environ.get('ADMISSION_QUEUE_TIMEOUT_MS', str(admission.DEFAULT_QUEUE_TIMEOUT_SECONDS * 1000))) / 1000
+))
+
+# Single-flight Configuration: concurrent identical reads/renders share one execution
+SINGLE_FLIGHT = os.environ.get('SINGLE_FLIGHT', 'true').lower() == 'true'
+flights = singleflight.SingleFlight(enabled=SINGLE_FLIGHT)
+
+# Insert Batching Configuration: concurrent creates within the linger time share one insert_many
+INSERT_BATCHING = os.environ.get('INSERT_BATCHING', 'false').lower() == 'true'
+anamnese_inserts = groupcommit.InsertBatcher(
+    db.anamneses,
+    max_batch_size=int(os.environ.get('INSERT_BATCH_MAX_SIZE', str(groupcommit.DEFAULT_MAX_BATCH_SIZE))),
+    linger=float(os.environ.get('INSERT_BATCH_LINGER_MS', str(groupcommit.DEFAULT_LINGER_SECONDS * 1000))) / 1000,
+    enabled=INSERT_BATCHING
+)
+
+# Live Updates Configuration: change stream pushed to dashboards over SSE (needs a replica set)
+LIVE_UPDATES = os.environ.get('LIVE_UPDATES', 'true').lower() == 'true'
+live_updates = live.ChangeHub(db.anamneses)
+
+# Archive Configuration: records not modified for ARCHIVE_AFTER_DAYS move to zstd cold storage
+ARCHIVE_AFTER_DAYS = float(os.environ.get('ARCHIVE_AFTER_DAYS', str(archive.DEFAULT_ARCHIVE_AFTER_DAYS)))
+ARCHIVE_ZSTD_LEVEL = int(os.environ.get('ARCHIVE_ZSTD_LEVEL', str(archive.DEFAULT_ZSTD_LEVEL)))
+# 0 disables the periodic task; `python archive.py run` does the same from cron
+ARCHIVE_INTERVAL_SECONDS = float(os.environ.get('ARCHIVE_INTERVAL_SECONDS', '0'))
+archive_scheduler = archive.ArchiveScheduler(db, ARCHIVE_INTERVAL_SECONDS, ARCHIVE_AFTER_DAYS, ARCHIVE_ZSTD_LEVEL)
+
+# Autocomplete Configuration: in-memory prefix index of medications, allergies and chronic conditions
+AUTOCOMPLETE_GLOBAL_MIN_USERS = int(os.environ.get('AUTOCOMPLETE_GLOBAL_MIN_USERS', str(autocomplete.DEFAULT_GLOBAL_MIN_USERS)))
+# 0 loads the index once at startup; with several workers, reloads pick up the other workers' writes
+AUTOCOMPLETE_REFRESH_SECONDS = float(os.environ.get('AUTOCOMPLETE_REFRESH_SECONDS', '0'))
+suggestions = autocomplete.Autocomplete(AUTOCOMPLETE_GLOBAL_MIN_USERS)
+
+# Cold-start Configuration: import PDF/LLM/columnar modules in the background once serving
+PREWARM_IMPORTS = os.environ.get('PREWARM_IMPORTS', 'true').lower() == 'true'
 
 # =======================
-# MODELS
-# =======================
-
-class User(BaseModel):
-    model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    email: str
-    name: str
-    picture: Optional[str] = None
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-
-class UserSession(BaseModel):
-    model_config = ConfigDict(extra="ignore")
-    user_id: str
-    session_token: str
-    expires_at: datetime
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-
-class SessionDataResponse(BaseModel):
-    id: str
-    email: str
-    name: str
-    picture: Optional[str] = None
-    session_token: str
-
-# Anamnese Models
-class IdadeModel(BaseModel):
-    valor: int
-    unidade: str  # "anos", "meses", "dias"
-
-class LocalidadeModel(BaseModel):
-    cidade: str
-    uf: str
-
-class OcupacaoModel(BaseModel):
-    atividade: str
-    local: str = ""
-    condicoes: str = ""
-
-class IdentificacaoModel(BaseModel):
-    nome_completo: str
-    nome_social: str = ""
-    genero: str = ""
-    sexo_biologico: str  # masculino, feminino
-    idade: IdadeModel
-    cor_etnia: str
-    estado_civil: str
-    ocupacao: OcupacaoModel
-    escolaridade: str
-    religiao: str = ""
-    naturalidade: LocalidadeModel
-    procedencia: LocalidadeModel
-    mae: str = ""
-    responsavel_ou_cuidador: str = ""
-    plano_ou_previdencia: str = ""
-    grau_confiabilidade: str = "bom"
-
-class QueixaPrincipalModel(BaseModel):
-    texto_entre_aspas: str
-    inicio: Dict[str, Any]  # {"há": 3, "unidade": "dias"}
-
-class CronologiaModel(BaseModel):
-    inicio: str = ""
-    duracao: str = ""
-    frequencia: str = ""
-
-class SintomaModel(BaseModel):
-    nome: str
-    localizacao: str = ""
-    caracteristicas: str = ""
-    intensidade_0a10: Optional[int] = None
-    cronologia: CronologiaModel
-    situacoes: str = ""
-    fatores_agrava: str = ""
-    fatores_alivia: str = ""
-    associados: str = ""
-    pertinentes_positivos: List[str] = []
-    pertinentes_negativos: List[str] = []
-
-class HDAModel(BaseModel):
-    narrativa: str
-    sintomas_principais: List[SintomaModel] = []
-    impacto_vida: str = ""
-
-class SistemaISModel(BaseModel):
-    pergunta_guarda_chuva: str = ""
-    itens: List[Dict[str, Any]] = []  # [{"sintoma": "tosse", "presente": true, "detalhes": "..."}]
-
-class InterrogatorioSistematicoModel(BaseModel):
-    geral: SistemaISModel = SistemaISModel()
-    respiratorio: SistemaISModel = SistemaISModel()
-    cardiovascular: SistemaISModel = SistemaISModel()
-    gastrointestinal: SistemaISModel = SistemaISModel()
-    geniturinario: SistemaISModel = SistemaISModel()
-    musculoesqueletico: SistemaISModel = SistemaISModel()
-    neurologico: SistemaISModel = SistemaISModel()
-    psiquiatrico: SistemaISModel = SistemaISModel()
-    endocrino: SistemaISModel = SistemaISModel()
-    hemato: SistemaISModel = SistemaISModel()
-    pele: SistemaISModel = SistemaISModel()
-    reprodutivo: SistemaISModel = SistemaISModel()
-
-class AlergiaModel(BaseModel):
-    agente: str
-    reacao: str
-
-class MedicacaoModel(BaseModel):
-    nome: str
-    dose: str
-    posologia: str
-
-class AntecedentePessoalModel(BaseModel):
-    cronicos: List[str] = []
-    alergias: List[AlergiaModel] = []
-    medicacoes_uso: List[MedicacaoModel] = []
-    cirurgias_hospitalizacoes: List[str] = []
-    imunizacoes_relevantes: List[str] = []
-
-class AntecedenteFamiliarModel(BaseModel):
-    parentesco: str
-    condicao: str
-
-class EstadoAtualModel(BaseModel):
-    fisico: str = ""
-    mental: str = ""
-
-class EventoLinhaTempoModel(BaseModel):
-    ano: str
-    evento: str
-
-class AntecedentesModel(BaseModel):
-    pessoais: AntecedentePessoalModel
-    familiares: List[AntecedenteFamiliarModel] = []
-    estado_atual: EstadoAtualModel = EstadoAtualModel()
-    linha_do_tempo: List[EventoLinhaTempoModel] = []
-
-class AtividadeFisicaModel(BaseModel):
-    tipo: str = ""
-    frequencia_semana: int = 0
-    duracao_min: int = 0
-
-class SonoModel(BaseModel):
-    horas: float = 0
-    qualidade: str = ""
-
-class AlimentacaoModel(BaseModel):
-    padrao: str = ""
-    restricoes: str = ""
-
-class TabagismoModel(BaseModel):
-    status: str = "nunca"  # nunca, ex, atual
-    macos_dia: float = 0
-    anos: int = 0
-    carga_tabagica_packyears: float = 0
-
-class EtilismoModel(BaseModel):
-    tipos: List[str] = []
-    doses_semana: int = 0
-    uso_pesado_ep: bool = False
-
-class HabitosModel(BaseModel):
-    atividade_fisica: AtividadeFisicaModel = AtividadeFisicaModel()
-    sono: SonoModel = SonoModel()
-    alimentacao: AlimentacaoModel = AlimentacaoModel()
-    tabagismo: TabagismoModel = TabagismoModel()
-    etilismo: EtilismoModel = EtilismoModel()
-    outras_substancias: str = ""
-
-class PsicossocialModel(BaseModel):
-    composicao_familiar: str = ""
-    dependentes: int = 0
-    renda_familiar_faixa: str = ""
-    saneamento: str = ""
-    agua_segura: str = ""
-    riscos_ocupacionais: str = ""
-    suporte_social: str = ""
-    crencas_praticas_culturais: str = ""
-    barreiras_acesso: str = ""
-
-class AuditoriaModel(BaseModel):
-    data_hora_anamnese: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    versao_registro: int = 1
-
-class MetaModel(BaseModel):
-    consentimento: bool = False
-    profissional: Dict[str, str] = {"nome": "", "registro": "", "unidade": ""}
-    timestamp_iso: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-
-class Anamnese(BaseModel):
-    model_config = ConfigDict(extra="ignore")
-    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
-    user_id: str
-    meta: MetaModel
-    identificacao: IdentificacaoModel
-    queixa_principal: QueixaPrincipalModel
-    hda: HDAModel
-    interrogatorio_sistematico: InterrogatorioSistematicoModel = InterrogatorioSistematicoModel()
-    antecedentes: AntecedentesModel
-    habitos: HabitosModel
-    psicossocial: PsicossocialModel
-    auditoria: AuditoriaModel = AuditoriaModel()
-    resumo_clinico_ia: Optional[str] = None
-    created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-    updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
-
-class AnamneseCreate(BaseModel):
-    meta: MetaModel
-    identificacao: IdentificacaoModel
-    queixa_principal: QueixaPrincipalModel
-    hda: HDAModel
-    interrogatorio_sistematico: InterrogatorioSistematicoModel = InterrogatorioSistematicoModel()
-    antecedentes: AntecedentesModel
-    habitos: HabitosModel
-    psicossocial: PsicossocialModel
-
-class AnamneseUpdate(BaseModel):
-    meta: Optional[MetaModel] = None
-    identificacao: Optional[IdentificacaoModel] = None
-    queixa_principal: Optional[QueixaPrincipalModel] = None
-    hda: Optional[HDAModel] = None
-    interrogatorio_sistematico: Optional[InterrogatorioSistematicoModel] = None
-    antecedentes: Optional[AntecedentesModel] = None
-    habitos: Optional[HabitosModel] = None
-    psicossocial: Optional[PsicossocialModel] = None
-
-class GenerateSummaryResponse(BaseModel):
-    resumo_clinico: str
+# SESSION MAINTENANCE
+# =======================
+
+class SessionMaintenance:
+    """Background upkeep of the user_sessions collection.
+
+    Authenticated requests only record a last_seen timestamp in memory. The
+    pending touches are flushed in a single bulk write every flush interval
+    (sliding expiration), and expired sessions are purged with one
+    delete_many per sweep instead of lazily on the request path.
+    """
+
+    def __init__(self, collection, ttl: timedelta, sweep_interval: float, flush_interval: float, sliding: bool = True):
+        self.collection = collection
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self.flush_interval = flush_interval
+        self.sliding = sliding
+        self._touches: Dict[str, datetime] = {}
+        self._tasks: List[asyncio.Task] = []
+
+    def touch(self, session_token: str):
+        """Record activity for a session; persisted on the next flush"""
+        if self.sliding:
+            self._touches[session_token] = datetime.now(timezone.utc)
+
+    def forget(self, session_token: str):
+        """Drop any pending touch for a session that was removed"""
+        self._touches.pop(session_token, None)
+
+    def effective_expiry(self, session_token: str, stored_expiry: datetime) -> datetime:
+        """Expiry taking unflushed touches into account"""
+        last_seen = self._touches.get(session_token)
+        if last_seen is None:
+            return stored_expiry
+        return max(stored_expiry, last_seen + self.ttl)
+
+    async def flush_touches(self) -> int:
+        """Write all pending last_seen touches in one bulk operation"""
+        if not self._touches:
+            return 0
+        touches, self._touches = self._touches, {}
+        operations = [
+            UpdateOne(
+                {"session_token": token},
+                {"$set": {
+                    "last_seen": last_seen.isoformat(),
+                    "expires_at": (last_seen + self.ttl).isoformat()
+                }}
+            )
+            for token, last_seen in touches.items()
+        ]
+        try:
+            result = await self.collection.bulk_write(operations, ordered=False)
+        except Exception:
+            # Kept for the next flush, so the extensions are not lost; newer touches win
+            for token, last_seen in touches.items():
+                pending = self._touches.get(token)
+                if pending is None or pending < last_seen:
+                    self._touches[token] = last_seen
+            raise
+        return result.modified_count
+
+    async def purge_expired(self) -> int:
+        """Delete every expired session in a single delete_many"""
+        now = datetime.now(timezone.utc)
+        # Sessions touched since the last flush are active even if their stored expiry passed
+        active = [token for token, last_seen in self._touches.items() if last_seen + self.ttl >= now]
+        # expires_at is stored as an ISO string, older records may hold a BSON date
+        query = {"$or": [
+            {"expires_at": {"$lt": now.isoformat()}},
+            {"expires_at": {"$lt": now}}
+        ]}
+        if active:
+            query["session_token"] = {"$nin": active}
+        result = await self.collection.delete_many(query)
+        return result.deleted_count
+
+    async def ensure_indexes(self):
+        await self.collection.create_index("session_token")
+        await self.collection.create_index("expires_at")
+
+    async def _run_periodically(self, interval: float, job, name: str):
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                count = await job()
+                if count:
+                    logger.info(f"Session maintenance ({name}): {count} sessions")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Session maintenance ({name}) failed: {e}")
+
+    def start(self):
+        if self.sweep_interval > 0:
+            self._tasks.append(asyncio.create_task(
+                self._run_periodically(self.sweep_interval, self.purge_expired, "purged")
+            ))
+        if self.sliding and self.flush_interval > 0:
+            self._tasks.append(asyncio.create_task(
+                self._run_periodically(self.flush_interval, self.flush_touches, "touched")
+            ))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        await self.flush_touches()
+
+session_maintenance = SessionMaintenance(
+    db.user_sessions,
+    ttl=SESSION_TTL,
+    sweep_interval=SESSION_SWEEP_INTERVAL_SECONDS,
+    flush_interval=SESSION_TOUCH_FLUSH_SECONDS,
+    sliding=SESSION_SLIDING_EXPIRATION
+)
 
 # =======================
 # AUTH HELPERS
 # =======================
 
-async def get_current_user(request: Request) -> Optional[User]:
-    """Get current user from session token (cookie or header)"""
+def session_token_of(request: Request) -> Optional[str]:
+    """Session token from the cookie or the Authorization header"""
     session_token = request.cookies.get("session_token")
     
     if not session_token:
@@ -278,6 +272,12 @@ async def get_current_user(request: Request) -> Optional[User]:
         if auth_header and auth_header.startswith("Bearer "):
             session_token = auth_header.replace("Bearer ", "")
     
+    return session_token
+
+async def get_current_user(request: Request) -> Optional[User]:
+    """Get current user from session token (cookie or header)"""
+    session_token = session_token_of(request)
+    
     if not session_token:
         return None
     
@@ -291,8 +291,8 @@ async def get_current_user(request: Request) -> Optional[User]:
     elif expires_at.tzinfo is None:
         expires_at = expires_at.replace(tzinfo=timezone.utc)
     
-    if expires_at < datetime.now(timezone.utc):
-        await db.user_sessions.delete_one({"session_token": session_token})
+    # Expired sessions are removed by the background sweeper
+    if session_maintenance.effective_expiry(session_token, expires_at) < datetime.now(timezone.utc):
         return None
     
     user_doc = await db.users.find_one({"id": session["user_id"]}, {"_id": 0})
@@ -302,6 +302,8 @@ async def get_current_user(request: Request) -> Optional[User]:
     if isinstance(user_doc.get('created_at'), str):
         user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
     
+    session_maintenance.touch(session_token)
+    admission_control.remember(session_token, user_doc["id"])
     return User(**user_doc)
 
 async def require_auth(request: Request) -> User:
@@ -350,7 +352,7 @@ async def get_session_data(request: Request):
         user_id = user_doc["id"]
     
     session_token = data["session_token"]
-    expires_at = datetime.now(timezone.utc) + timedelta(days=7)
+    expires_at = datetime.now(timezone.utc) + SESSION_TTL
     
     session = UserSession(
         user_id=user_id,
@@ -383,6 +385,8 @@ async def logout(request: Request, response: Response):
     """Logout user"""
     session_token = request.cookies.get("session_token")
     if session_token:
+        session_maintenance.forget(session_token)
+        admission_control.forget(session_token)
         await db.user_sessions.delete_one({"session_token": session_token})
     
     response.delete_cookie("session_token", path="/", domain=None)
@@ -392,19 +396,21 @@ async def logout(request: Request, response: Response):
 # ANAMNESE ROUTES
 # =======================
 
-@api_router.post("/anamneses", response_model=Anamnese)
-async def create_anamnese(input: AnamneseCreate, request: Request):
+@api_router.post("/anamneses", response_model=Anamnese, openapi_extra=model_io.request_body(AnamneseCreate))
+async def create_anamnese(request: Request):
     """Create new anamnese"""
     user = await require_auth(request)
+    input = model_io.validate_json(AnamneseCreate, await request.body(), strict=STRICT_WRITE_VALIDATION)
     
     anamnese_data = input.model_dump()
     anamnese_data["user_id"] = user.id
     anamnese_data["id"] = str(uuid.uuid4())
+    anamnese_data["patient_id"] = patients.patient_id_for(user.id, anamnese_data["identificacao"])
     anamnese_data["auditoria"] = AuditoriaModel().model_dump()
     anamnese_data["created_at"] = datetime.now(timezone.utc)
     anamnese_data["updated_at"] = datetime.now(timezone.utc)
     
-    anamnese_obj = Anamnese(**anamnese_data)
+    anamnese_obj = model_io.from_stored(Anamnese, anamnese_data)
     
     doc = anamnese_obj.model_dump()
     doc["meta"]["timestamp_iso"] = doc["meta"]["timestamp_iso"].isoformat()
@@ -412,9 +418,12 @@ async def create_anamnese(input: AnamneseCreate, request: Request):
     doc["created_at"] = doc["created_at"].isoformat()
     doc["updated_at"] = doc["updated_at"].isoformat()
     
-    await db.anamneses.insert_one(doc)
+    # Stored without its default-valued fields; history and derived data get the full document
+    await anamnese_inserts.insert(sparse.encode(doc))
+    await record_revision(None, doc)
+    await sync_derived_data(None, doc)
     
-    return anamnese_obj
+    return model_io.json_response(Anamnese, anamnese_obj)
 
 @api_router.get("/anamneses", response_model=List[Anamnese])
 async def list_anamneses(request: Request, search: Optional[str] = None):
@@ -428,140 +437,328 @@ async def list_anamneses(request: Request, search: Optional[str] = None):
             {"queixa_principal.texto_entre_aspas": {"$regex": search, "$options": "i"}}
         ]
     
-    anamneses = await db.anamneses.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
+    anamneses = await heavy_reads_db.anamneses.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
     
-    for a in anamneses:
-        for field in ["created_at", "updated_at"]:
-            if isinstance(a.get(field), str):
-                a[field] = datetime.fromisoformat(a[field])
-        if isinstance(a.get("meta", {}).get("timestamp_iso"), str):
-            a["meta"]["timestamp_iso"] = datetime.fromisoformat(a["meta"]["timestamp_iso"])
-        if isinstance(a.get("auditoria", {}).get("data_hora_anamnese"), str):
-            a["auditoria"]["data_hora_anamnese"] = datetime.fromisoformat(a["auditoria"]["data_hora_anamnese"])
-    
-    return anamneses
+    return model_io.json_response(List[Anamnese], [model_io.from_stored(Anamnese, a) for a in anamneses])
 
 @api_router.get("/anamneses/{anamnese_id}", response_model=Anamnese)
 async def get_anamnese(anamnese_id: str, request: Request):
     """Get specific anamnese"""
     user = await require_auth(request)
     
-    anamnese = await db.anamneses.find_one({"id": anamnese_id, "user_id": user.id}, {"_id": 0})
+    anamnese = await fetch_anamnese(db, user.id, anamnese_id)
     if not anamnese:
         raise HTTPException(status_code=404, detail="Anamnese not found")
     
-    for field in ["created_at", "updated_at"]:
-        if isinstance(anamnese.get(field), str):
-            anamnese[field] = datetime.fromisoformat(anamnese[field])
-    if isinstance(anamnese.get("meta", {}).get("timestamp_iso"), str):
-        anamnese["meta"]["timestamp_iso"] = datetime.fromisoformat(anamnese["meta"]["timestamp_iso"])
-    if isinstance(anamnese.get("auditoria", {}).get("data_hora_anamnese"), str):
-        anamnese["auditoria"]["data_hora_anamnese"] = datetime.fromisoformat(anamnese["auditoria"]["data_hora_anamnese"])
+    async def render():
+        return model_io.adapter(Anamnese).dump_json(model_io.from_stored(Anamnese, anamnese))
     
-    return anamnese
+    content = await flights.do(("get", user.id, anamnese_id, record_version(anamnese)), render)
+    return Response(content=content, media_type="application/json")
 
-@api_router.put("/anamneses/{anamnese_id}", response_model=Anamnese)
-async def update_anamnese(anamnese_id: str, input: AnamneseUpdate, request: Request):
+@api_router.put("/anamneses/{anamnese_id}", response_model=Anamnese, openapi_extra=model_io.request_body(AnamneseUpdate))
+async def update_anamnese(anamnese_id: str, request: Request):
     """Update anamnese"""
     user = await require_auth(request)
-    
-    existing = await db.anamneses.find_one({"id": anamnese_id, "user_id": user.id}, {"_id": 0})
-    if not existing:
-        raise HTTPException(status_code=404, detail="Anamnese not found")
-    
-    update_data = input.model_dump(exclude_unset=True)
+    input = model_io.validate_json(AnamneseUpdate, await request.body(), strict=STRICT_WRITE_VALIDATION)
+    
+    # Sections sent are replaced whole; default-valued fields are left out of storage
+    sections = {
+        section: value for section, value in input.model_dump().items()
+        if section in input.model_fields_set and value is not None
+    }
+    update = sparse.section_update(sections)
+    update_data = update.setdefault("$set", {})
     update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    if "identificacao" in sections:
+        update_data["patient_id"] = patients.patient_id_for(user.id, sections["identificacao"])
+    
+    # Every update produces a new version of the record. The pre-image comes from the
+    # update itself, so concurrent PUTs each diff against the version they replaced.
+    # A record archived between its restore and the update is restored once more
+    target = {"id": anamnese_id, "user_id": user.id}
+    before = None
+    for _ in range(2):
+        current = await db.anamneses.find_one(target, {"_id": 0, "id": 1, "archived": 1})
+        if not current:
+            break
+        if current.get("archived"):
+            await archive.restore(db, anamnese_id)
+        before = await db.anamneses.find_one_and_update(
+            {**target, "archived": {"$ne": True}},
+            {**update, "$inc": {"auditoria.versao_registro": 1}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE
+        )
+        if before:
+            break
+    if not before:
+        raise HTTPException(status_code=404, detail="Anamnese not found")
+    existing = sparse.decode(before)
+    updated = sparse.decode(sparse.apply_section_update(before, update))
+    updated["auditoria"]["versao_registro"] = revisions.version_of(existing) + 1
+    await record_revision(existing, updated)
+    await sync_derived_data(existing, updated)
     
-    await db.anamneses.update_one(
-        {"id": anamnese_id, "user_id": user.id},
-        {"$set": update_data}
-    )
-    
-    updated = await db.anamneses.find_one({"id": anamnese_id}, {"_id": 0})
-    
-    for field in ["created_at", "updated_at"]:
-        if isinstance(updated.get(field), str):
-            updated[field] = datetime.fromisoformat(updated[field])
-    if isinstance(updated.get("meta", {}).get("timestamp_iso"), str):
-        updated["meta"]["timestamp_iso"] = datetime.fromisoformat(updated["meta"]["timestamp_iso"])
-    if isinstance(updated.get("auditoria", {}).get("data_hora_anamnese"), str):
-        updated["auditoria"]["data_hora_anamnese"] = datetime.fromisoformat(updated["auditoria"]["data_hora_anamnese"])
-    
-    return updated
+    return model_io.json_response(Anamnese, model_io.from_stored(Anamnese, updated))
 
 @api_router.delete("/anamneses/{anamnese_id}")
 async def delete_anamnese(anamnese_id: str, request: Request):
     """Delete anamnese"""
     user = await require_auth(request)
     
-    result = await db.anamneses.delete_one({"id": anamnese_id, "user_id": user.id})
-    if result.deleted_count == 0:
+    deleted = await db.anamneses.find_one_and_delete({"id": anamnese_id, "user_id": user.id}, {"_id": 0})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Anamnese not found")
+    if deleted.get("archived"):
+        # The derived collections are updated from the full document
+        deleted = await archive.hydrate(db[archive.COLD_COLLECTION], deleted)
+        await archive.delete(db, anamnese_id)
+    deleted = sparse.decode(deleted)
+    await revisions.delete_revisions(db[revisions.REVISIONS_COLLECTION], anamnese_id)
+    await sync_derived_data(deleted, None)
     
     return {"message": "Anamnese deleted"}
 
 # =======================
-# AI SUMMARY
+# SHARED READS
 # =======================
 
-@api_router.post("/anamneses/{anamnese_id}/generate-summary", response_model=GenerateSummaryResponse)
-async def generate_summary(anamnese_id: str, request: Request):
-    """Generate AI clinical summary"""
+async def fetch_anamnese(database, user_id: str, anamnese_id: str) -> Optional[dict]:
+    """Fetch an anamnese, rehydrating archived records and filling in omitted defaults"""
+    anamnese = await database.anamneses.find_one({"id": anamnese_id, "user_id": user_id}, {"_id": 0})
+    anamnese = await archive.hydrate(database[archive.COLD_COLLECTION], anamnese)
+    return sparse.decode(anamnese) if anamnese else None
+
+async def find_anamnese(database, source: str, user_id: str, anamnese_id: str) -> Optional[dict]:
+    """fetch_anamnese, sharing the query with concurrent fetches of the same record and source.
+
+    A fetch that started before a write may answer callers that arrive after
+    it, so this is only used by the exports, which already read from
+    secondaries when those are configured. get_anamnese reads the primary on
+    its own so a client always sees its own writes. The returned document may
+    be shared between requests and must not be mutated.
+    """
+    return await flights.do(
+        ("find", source, user_id, anamnese_id),
+        lambda: fetch_anamnese(database, user_id, anamnese_id)
+    )
+
+def record_version(anamnese: dict) -> tuple:
+    """Version of a fetched anamnese, part of the single-flight key of its renders"""
+    # The AI summary is saved without a version bump
+    return (
+        anamnese.get("auditoria", {}).get("versao_registro"),
+        anamnese.get("updated_at"),
+        anamnese.get("resumo_clinico_ia")
+    )
+
+# =======================
+# VERSION HISTORY
+# =======================
+
+async def record_revision(old: Optional[dict], new: dict):
+    """Store the checkpoint (create) or diff (update) of an anamnese write"""
+    try:
+        if old is None:
+            await revisions.record_checkpoint(db[revisions.REVISIONS_COLLECTION], new)
+        else:
+            await revisions.record_update(db[revisions.REVISIONS_COLLECTION], old, new)
+    except Exception as e:
+        logging.error(f"Error recording anamnese revision: {e}")
+
+@api_router.get("/anamneses/{anamnese_id}/versions", response_model=List[revisions.RevisionInfo])
+async def list_anamnese_versions(anamnese_id: str, request: Request):
+    """List stored versions of an anamnese"""
     user = await require_auth(request)
     
-    anamnese = await db.anamneses.find_one({"id": anamnese_id, "user_id": user.id}, {"_id": 0})
-    if not anamnese:
+    history = await revisions.list_revisions(db[revisions.REVISIONS_COLLECTION], user.id, anamnese_id)
+    if not history:
         raise HTTPException(status_code=404, detail="Anamnese not found")
     
-    # Build prompt
-    prompt = f"""Você é um médico experiente. Gere um resumo clínico estruturado e profissional em português a partir dos seguintes dados de anamnese:
-
-**IDENTIFICAÇÃO:**
-Nome: {anamnese['identificacao']['nome_completo']}
-Idade: {anamnese['identificacao']['idade']['valor']} {anamnese['identificacao']['idade']['unidade']}
-Sexo: {anamnese['identificacao']['sexo_biologico']}
-Ocupação: {anamnese['identificacao']['ocupacao']['atividade']}
+    return history
 
-**QUEIXA PRINCIPAL:**
-{anamnese['queixa_principal']['texto_entre_aspas']}
-Início: há {anamnese['queixa_principal']['inicio'].get('há', 0)} {anamnese['queixa_principal']['inicio'].get('unidade', '')}
+@api_router.get("/anamneses/{anamnese_id}/versions/{versao}", response_model=Anamnese)
+async def get_anamnese_version(anamnese_id: str, versao: int, request: Request):
+    """Reconstruct a past version of an anamnese"""
+    user = await require_auth(request)
+    
+    anamnese = await revisions.reconstruct(db[revisions.REVISIONS_COLLECTION], user.id, anamnese_id, versao)
+    if not anamnese:
+        raise HTTPException(status_code=404, detail="Version not found")
+    
+    return model_io.json_response(Anamnese, model_io.from_stored(Anamnese, anamnese))
 
-**HISTÓRIA DA DOENÇA ATUAL:**
-{anamnese['hda']['narrativa']}
+@api_router.get("/anamneses/{anamnese_id}/diff", response_model=revisions.VersionDiffResponse)
+async def diff_anamnese_versions(anamnese_id: str, from_version: int, to_version: int, request: Request):
+    """Structural changes between two versions of an anamnese"""
+    user = await require_auth(request)
+    
+    collection = db[revisions.REVISIONS_COLLECTION]
+    old = await revisions.reconstruct(collection, user.id, anamnese_id, from_version)
+    new = await revisions.reconstruct(collection, user.id, anamnese_id, to_version)
+    if not old or not new:
+        raise HTTPException(status_code=404, detail="Version not found")
+    
+    return revisions.VersionDiffResponse(
+        anamnese_id=anamnese_id,
+        from_version=from_version,
+        to_version=to_version,
+        changes=revisions.diff(old, new)
+    )
 
-**ANTECEDENTES PESSOAIS:**
-Crônicos: {', '.join(anamnese['antecedentes']['pessoais']['cronicos']) if anamnese['antecedentes']['pessoais']['cronicos'] else 'Nenhum'}
-Alergias: {', '.join([f"{a['agente']} ({a['reacao']})" for a in anamnese['antecedentes']['pessoais']['alergias']]) if anamnese['antecedentes']['pessoais']['alergias'] else 'Nenhuma'}
-Medicações: {', '.join([f"{m['nome']} {m['dose']} {m['posologia']}" for m in anamnese['antecedentes']['pessoais']['medicacoes_uso']]) if anamnese['antecedentes']['pessoais']['medicacoes_uso'] else 'Nenhuma'}
+# =======================
+# DERIVED DATA
+# =======================
 
-**HÁBITOS:**
-Tabagismo: {anamnese['habitos']['tabagismo']['status']} (carga tabágica: {anamnese['habitos']['tabagismo']['carga_tabagica_packyears']} pack-years)
-Etilismo: {anamnese['habitos']['etilismo']['doses_semana']} doses/semana
-Atividade física: {anamnese['habitos']['atividade_fisica']['tipo']}
+async def sync_derived_data(old: Optional[dict], new: Optional[dict]):
+    """Propagate an anamnese write (old=None on create, new=None on delete) to derived collections.
 
-Gere um resumo clínico conciso (máximo 300 palavras) destacando os pontos mais relevantes para o diagnóstico e conduta."""
+    Failures are logged rather than raised: every derived collection can be
+    recomputed with its module's `rebuild` command.
+    """
+    try:
+        await stats.record_change(db[stats.STATS_COLLECTION], old, new)
+    except Exception as e:
+        logging.error(f"Error updating stats: {e}")
     
     try:
-        chat = LlmChat(
-            api_key=EMERGENT_LLM_KEY,
-            session_id=f"anamnese_{anamnese_id}",
-            system_message="Você é um assistente médico especializado em resumos clínicos estruturados."
-        ).with_model("openai", "gpt-4o-mini")
-        
-        user_message = UserMessage(text=prompt)
-        summary = await chat.send_message(user_message)
-        
-        # Save summary to database
-        await db.anamneses.update_one(
-            {"id": anamnese_id},
-            {"$set": {"resumo_clinico_ia": summary}}
-        )
-        
-        return GenerateSummaryResponse(resumo_clinico=summary)
+        if new:
+            await dedup.index_anamnese(db[dedup.DEDUP_COLLECTION], new)
+        else:
+            await dedup.remove_anamnese(db[dedup.DEDUP_COLLECTION], old["id"])
+    except Exception as e:
+        logging.error(f"Error updating dedup index: {e}")
     
+    try:
+        await patients.link_anamnese(db, old, new)
+    except Exception as e:
+        logging.error(f"Error updating patient index: {e}")
+    
+    try:
+        suggestions.record_change(old, new)
+    except Exception as e:
+        logging.error(f"Error updating autocomplete index: {e}")
+
+# =======================
+# ANALYTICS
+# =======================
+
+@api_router.get("/stats", response_model=StatsResponse)
+async def get_stats(request: Request, faixa_etaria: Optional[str] = None, sexo: Optional[str] = None):
+    """Cohort stats for current user, grouped by age band and sex"""
+    user = await require_auth(request)
+    return await stats.read_stats(heavy_reads_db[stats.STATS_COLLECTION], user.id, faixa_etaria, sexo)
+
+@api_router.post("/risk/scores", response_model=risk.RiskScoreResponse)
+async def score_risk(query: risk.RiskQuery, request: Request):
+    """Rank current user's patients by weighted risk score"""
+    user = await require_auth(request)
+    return await risk.score_cohort(heavy_reads_db.anamneses, user.id, query)
+
+# =======================
+# DUPLICATE DETECTION
+# =======================
+
+@api_router.get("/dedup/clusters", response_model=dedup.DuplicateClustersResponse)
+async def get_duplicate_clusters(request: Request, threshold: float = dedup.DEFAULT_THRESHOLD):
+    """Candidate duplicate-patient clusters for current user"""
+    user = await require_auth(request)
+    return await dedup.find_clusters(heavy_reads_db[dedup.DEDUP_COLLECTION], user.id, threshold)
+
+@api_router.get("/dedup/candidates/{anamnese_id}", response_model=List[dedup.DuplicateCandidate])
+async def get_duplicate_candidates(anamnese_id: str, request: Request, threshold: float = dedup.DEFAULT_THRESHOLD):
+    """Possible duplicates of a specific anamnese"""
+    user = await require_auth(request)
+    return await dedup.candidates_for(db[dedup.DEDUP_COLLECTION], user.id, anamnese_id, threshold)
+
+# =======================
+# PATIENTS
+# =======================
+
+@api_router.get("/patients/{patient_id}/timeline", response_model=patients.PatientTimelineResponse)
+async def get_patient_timeline(patient_id: str, request: Request):
+    """Chronological history of a patient across all of their anamneses"""
+    user = await require_auth(request)
+    
+    timeline = await patients.get_timeline(heavy_reads_db, user.id, patient_id)
+    if not timeline:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    
+    return timeline
+
+# =======================
+# AUTOCOMPLETE
+# =======================
+
+@api_router.get("/autocomplete", response_model=List[autocomplete.Suggestion])
+async def autocomplete_terms(request: Request, field: str, q: str = "", limit: int = autocomplete.DEFAULT_LIMIT):
+    """Suggestions for medicacoes_uso, alergias or cronicos: current user's terms first, then common ones"""
+    user = await require_auth(request)
+    
+    if field not in autocomplete.FIELDS:
+        raise HTTPException(status_code=400, detail=f"field must be one of: {', '.join(autocomplete.FIELDS)}")
+    
+    return suggestions.suggest(user.id, field, q, max(1, min(limit, autocomplete.MAX_LIMIT)))
+
+# =======================
+# AI SUMMARY
+# =======================
+
+@api_router.post("/anamneses/{anamnese_id}/generate-summary", response_model=GenerateSummaryResponse)
+async def generate_summary(anamnese_id: str, request: Request, preview: bool = False):
+    """Generate AI clinical summary (preview=true: instant local digest, not saved)"""
+    user = await require_auth(request)
+    
+    anamnese = await db.anamneses.find_one({"id": anamnese_id, "user_id": user.id}, {"_id": 0})
+    if not anamnese:
+        raise HTTPException(status_code=404, detail="Anamnese not found")
+    if anamnese.get("archived"):
+        if preview:
+            anamnese = await archive.hydrate(db[archive.COLD_COLLECTION], anamnese)
+        else:
+            # The summary is saved, so the record goes back to the hot collection first
+            anamnese = await archive.restore(db, anamnese_id) or anamnese
+    anamnese = sparse.decode(anamnese)
+    
+    if preview:
+        return GenerateSummaryResponse(resumo_clinico=digest.clinical_digest(anamnese), provider=DIGEST_PROVIDER)
+    
+    counter = await prompts.load_counter(SUMMARY_MODEL)
+    prompt = prompts.build_summary_prompt(anamnese, budget=SUMMARY_PROMPT_TOKEN_BUDGET, model=SUMMARY_MODEL, counter=counter)
+    
+    try:
+        completion = await summary_llm.complete(prompts.SYSTEM_MESSAGE, prompt.text, f"anamnese_{anamnese_id}")
+    except llm.LlmTimeoutError as e:
+        logging.error(f"Summary generation timed out: {e}")
+        raise HTTPException(status_code=504, detail=f"Failed to generate summary: {str(e)}")
     except Exception as e:
         logging.error(f"Error generating summary: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to generate summary: {str(e)}")
+    
+    summary = completion.text
+    completion_tokens = counter.count(summary)
+    logger.info(
+        f"Summary {anamnese_id}: {completion.provider} in {completion.latency:.2f} s "
+        f"(attempts {completion.attempts}, hedged {completion.hedged}), "
+        f"{prompt.tokens}/{prompt.budget} prompt tokens ({prompt.counter}), "
+        f"{completion_tokens} completion tokens, sections {prompt.sections}"
+    )
+    
+    # Save summary to database. Bumping updated_at keeps a concurrent archiving run
+    # from replacing the record with a stub built before the summary existed
+    saved = {"$set": {"resumo_clinico_ia": summary, "updated_at": datetime.now(timezone.utc).isoformat()}}
+    result = await db.anamneses.update_one({"id": anamnese_id, "archived": {"$ne": True}}, saved)
+    if not result.matched_count and await archive.restore(db, anamnese_id):
+        # Archived again while the summary was being generated
+        await db.anamneses.update_one({"id": anamnese_id, "archived": {"$ne": True}}, saved)
+    
+    return GenerateSummaryResponse(
+        resumo_clinico=summary,
+        provider=completion.provider,
+        prompt_tokens=prompt.tokens,
+        completion_tokens=completion_tokens
+    )
 
 # =======================
 # PDF EXPORT
@@ -572,117 +769,29 @@ async def export_pdf(anamnese_id: str, request: Request):
     """Export anamnese as PDF"""
     user = await require_auth(request)
     
-    anamnese = await db.anamneses.find_one({"id": anamnese_id, "user_id": user.id}, {"_id": 0})
+    anamnese = await find_anamnese(heavy_reads_db, "heavy", user.id, anamnese_id)
     if not anamnese:
         raise HTTPException(status_code=404, detail="Anamnese not found")
     
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=2*cm, bottomMargin=2*cm)
-    
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        textColor='#2C5F7C',
-        spaceAfter=12,
-        alignment=TA_CENTER
-    )
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=12,
-        textColor='#2C5F7C',
-        spaceAfter=8,
-        spaceBefore=12
-    )
-    body_style = ParagraphStyle(
-        'CustomBody',
-        parent=styles['BodyText'],
-        fontSize=10,
-        spaceAfter=6
+    # Deferred: pulls in ReportLab
+    pdf_render = coldstart.load("pdf_render")
+    
+    options = pdf_render.PdfOptions(
+        page_compression=PDF_PAGE_COMPRESSION,
+        font_path=PDF_FONT,
+        bold_font_path=PDF_FONT_BOLD,
+        italic_font_path=PDF_FONT_ITALIC
     )
     
-    story = []
-    
-    # Title
-    story.append(Paragraph("ANAMNESE CLÍNICA", title_style))
-    story.append(Spacer(1, 0.5*cm))
-    
-    # Identificação
-    story.append(Paragraph("IDENTIFICAÇÃO", heading_style))
-    ident = anamnese['identificacao']
-    story.append(Paragraph(f"<b>Nome:</b> {ident['nome_completo']}", body_style))
-    if ident.get('nome_social'):
-        story.append(Paragraph(f"<b>Nome Social:</b> {ident['nome_social']}", body_style))
-    story.append(Paragraph(f"<b>Idade:</b> {ident['idade']['valor']} {ident['idade']['unidade']}", body_style))
-    story.append(Paragraph(f"<b>Sexo Biológico:</b> {ident['sexo_biologico']}", body_style))
-    if ident.get('genero'):
-        story.append(Paragraph(f"<b>Gênero:</b> {ident['genero']}", body_style))
-    story.append(Paragraph(f"<b>Cor/Etnia:</b> {ident['cor_etnia']}", body_style))
-    story.append(Paragraph(f"<b>Estado Civil:</b> {ident['estado_civil']}", body_style))
-    story.append(Paragraph(f"<b>Ocupação:</b> {ident['ocupacao']['atividade']}", body_style))
-    story.append(Paragraph(f"<b>Escolaridade:</b> {ident['escolaridade']}", body_style))
-    story.append(Paragraph(f"<b>Naturalidade:</b> {ident['naturalidade']['cidade']}/{ident['naturalidade']['uf']}", body_style))
-    story.append(Paragraph(f"<b>Procedência:</b> {ident['procedencia']['cidade']}/{ident['procedencia']['uf']}", body_style))
-    story.append(Spacer(1, 0.3*cm))
-    
-    # Queixa Principal
-    story.append(Paragraph("QUEIXA PRINCIPAL", heading_style))
-    qp = anamnese['queixa_principal']
-    story.append(Paragraph(f"{qp['texto_entre_aspas']}", body_style))
-    story.append(Paragraph(f"Início: há {qp['inicio'].get('há', 0)} {qp['inicio'].get('unidade', '')}", body_style))
-    story.append(Spacer(1, 0.3*cm))
-    
-    # HDA
-    story.append(Paragraph("HISTÓRIA DA DOENÇA ATUAL", heading_style))
-    story.append(Paragraph(anamnese['hda']['narrativa'], body_style))
-    if anamnese['hda'].get('impacto_vida'):
-        story.append(Paragraph(f"<b>Impacto na vida:</b> {anamnese['hda']['impacto_vida']}", body_style))
-    story.append(Spacer(1, 0.3*cm))
-    
-    # Antecedentes
-    story.append(Paragraph("ANTECEDENTES", heading_style))
-    ant = anamnese['antecedentes']['pessoais']
-    if ant['cronicos']:
-        story.append(Paragraph(f"<b>Crônicos:</b> {', '.join(ant['cronicos'])}", body_style))
-    if ant['alergias']:
-        alergia_text = ', '.join([f"{a['agente']} ({a['reacao']})" for a in ant['alergias']])
-        story.append(Paragraph(f"<b>Alergias:</b> {alergia_text}", body_style))
-    if ant['medicacoes_uso']:
-        med_text = '<br/>'.join([f"• {m['nome']} - {m['dose']} - {m['posologia']}" for m in ant['medicacoes_uso']])
-        story.append(Paragraph(f"<b>Medicações em uso:</b><br/>{med_text}", body_style))
-    story.append(Spacer(1, 0.3*cm))
-    
-    # Hábitos
-    story.append(Paragraph("HÁBITOS DE VIDA", heading_style))
-    hab = anamnese['habitos']
-    story.append(Paragraph(f"<b>Tabagismo:</b> {hab['tabagismo']['status']} (Carga tabágica: {hab['tabagismo']['carga_tabagica_packyears']} pack-years)", body_style))
-    story.append(Paragraph(f"<b>Etilismo:</b> {hab['etilismo']['doses_semana']} doses/semana", body_style))
-    if hab['atividade_fisica']['tipo']:
-        story.append(Paragraph(f"<b>Atividade física:</b> {hab['atividade_fisica']['tipo']}", body_style))
-    story.append(Spacer(1, 0.3*cm))
-    
-    # AI Summary if available
-    if anamnese.get('resumo_clinico_ia'):
-        story.append(Paragraph("RESUMO CLÍNICO (IA)", heading_style))
-        story.append(Paragraph(anamnese['resumo_clinico_ia'], body_style))
-        story.append(Spacer(1, 0.3*cm))
-    
-    # Footer info
-    story.append(Spacer(1, 1*cm))
-    if isinstance(anamnese.get('created_at'), str):
-        created = anamnese['created_at']
-    else:
-        created = anamnese.get('created_at', datetime.now(timezone.utc)).isoformat()
-    story.append(Paragraph(f"<i>Documento gerado em: {created[:10]} às {created[11:16]}</i>", body_style))
-    story.append(Paragraph(f"<i>Grau de confiabilidade: {ident['grau_confiabilidade']}</i>", body_style))
+    async def render():
+        # Rendered off the event loop so concurrent reads are not stalled behind it
+        pdf = await asyncio.to_thread(pdf_render.render_anamnese, anamnese, options)
+        return pdf.content
     
-    doc.build(story)
-    buffer.seek(0)
+    content = await flights.do(("pdf", user.id, anamnese_id, record_version(anamnese)), render)
     
-    return StreamingResponse(
-        buffer,
+    return Response(
+        content=content,
         media_type="application/pdf",
         headers={"Content-Disposition": f"attachment; filename=anamnese_{anamnese_id}.pdf"}
     )
@@ -696,7 +805,7 @@ async def export_json(anamnese_id: str, request: Request):
     """Export anamnese as JSON"""
     user = await require_auth(request)
     
-    anamnese = await db.anamneses.find_one({"id": anamnese_id, "user_id": user.id}, {"_id": 0})
+    anamnese = await find_anamnese(heavy_reads_db, "heavy", user.id, anamnese_id)
     if not anamnese:
         raise HTTPException(status_code=404, detail="Anamnese not found")
     
@@ -710,16 +819,124 @@ async def export_json(anamnese_id: str, request: Request):
             return obj.isoformat()
         return obj
     
-    anamnese_json = serialize_dates(anamnese)
+    async def render():
+        return json.dumps(serialize_dates(anamnese), ensure_ascii=False).encode("utf-8")
     
-    return JSONResponse(
-        content=anamnese_json,
+    content = await flights.do(("json", user.id, anamnese_id, record_version(anamnese)), render)
+    
+    return Response(
+        content=content,
+        media_type="application/json",
         headers={"Content-Disposition": f"attachment; filename=anamnese_{anamnese_id}.json"}
     )
 
+# =======================
+# COLUMNAR EXPORT
+# =======================
+
+@api_router.get("/anamneses/export/parquet")
+async def export_parquet(request: Request, row_group_size: Optional[int] = None):
+    """Export all anamneses of current user as a flattened Parquet file"""
+    user = await require_auth(request)
+    
+    # Deferred: pulls in pyarrow
+    export_columnar = coldstart.load("export_columnar")
+    row_group_size = row_group_size or export_columnar.DEFAULT_ROW_GROUP_SIZE
+    
+    # Row groups are spilled to a temporary file so memory stays bounded
+    tmp = tempfile.NamedTemporaryFile(suffix=".parquet", delete=False)
+    tmp.close()
+    try:
+        cursor = archive.HydratingCursor(
+            heavy_reads_db.anamneses.find({"user_id": user.id}, {"_id": 0}).sort("created_at", -1),
+            heavy_reads_db[archive.COLD_COLLECTION]
+        )
+        await export_columnar.write_parquet(cursor, tmp.name, row_group_size=max(1, row_group_size))
+    except Exception:
+        os.unlink(tmp.name)
+        raise
+    
+    return FileResponse(
+        tmp.name,
+        media_type="application/vnd.apache.parquet",
+        filename="anamneses.parquet",
+        background=BackgroundTask(os.unlink, tmp.name)
+    )
+
+# =======================
+# LIVE UPDATES
+# =======================
+
+@api_router.get("/events/anamneses")
+async def anamnese_events(request: Request):
+    """Live list deltas (Server-Sent Events) for current user"""
+    user = await require_auth(request)
+    if not live_updates.available:
+        raise HTTPException(status_code=503, detail="Live updates unavailable")
+    
+    return StreamingResponse(
+        live_updates.stream(user.id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# =======================
+# HEALTH
+# =======================
+
+@api_router.get("/health/ready")
+async def readiness():
+    """Readiness probe: MongoDB reachable and accepting writes"""
+    info = await database.check_ready(client)
+    if not info:
+        return JSONResponse(status_code=503, content={"status": "unavailable"})
+    return {"status": "ready", "replica_set": info["replica_set"], "ping_ms": info["ping_ms"]}
+
+@api_router.get("/health/metrics")
+async def metrics(request: Request):
+    """Admission control, single-flight, cold-storage rehydration, autocomplete, insert batching and startup counters"""
+    await require_auth(request)
+    return {
+        "startup": coldstart.report.snapshot(),
+        "admission": admission_control.snapshot(),
+        "single_flight": flights.snapshot(),
+        "archive": archive.timings.snapshot(),
+        "autocomplete": suggestions.snapshot(),
+        "insert_batching": anamnese_inserts.snapshot()
+    }
+
 # Include router
 app.include_router(api_router)
 
+@app.middleware("http")
+async def admit_request(request: Request, call_next):
+    """Admission control; registered before CORS so rejections still carry CORS headers"""
+    endpoint = admission.endpoint_class(request.method, request.url.path, request.query_params) if ADMISSION_CONTROL else None
+    if endpoint is None:
+        return await call_next(request)
+    
+    session_token = session_token_of(request)
+    if session_token and not admission_control.knows(session_token):
+        # Learn the session's user (e.g. right after a restart) so clients behind
+        # the same proxy are not all charged to the proxy address
+        await get_current_user(request)
+    key = admission_control.identity(session_token, request.client.host if request.client else None)
+    try:
+        admission_control.check_rate(key, endpoint)
+        await admission_control.acquire(endpoint)
+    except admission.Rejected as e:
+        return JSONResponse(
+            status_code=e.status_code,
+            content={"detail": e.reason},
+            headers={"Retry-After": e.retry_after_header}
+        )
+    
+    started = time.monotonic()
+    try:
+        return await call_next(request)
+    finally:
+        admission_control.release(endpoint, time.monotonic() - started)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -734,6 +951,57 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.middleware("http")
+async def record_first_request(request: Request, call_next):
+    response = await call_next(request)
+    if coldstart.report.first_request_after is None:
+        coldstart.report.mark_first_request()
+    return response
+
+@app.on_event("startup")
+async def check_database():
+    # Fail fast if MongoDB stays unreachable; runs before the other startup hooks
+    await database.wait_until_ready(client, mongo_settings)
+
+@app.on_event("startup")
+async def start_session_maintenance():
+    await session_maintenance.ensure_indexes()
+    session_maintenance.start()
+
+@app.on_event("startup")
+async def ensure_derived_indexes():
+    await stats.ensure_indexes(db[stats.STATS_COLLECTION])
+    await dedup.ensure_indexes(db[dedup.DEDUP_COLLECTION])
+    await patients.ensure_indexes(db)
+    await revisions.ensure_indexes(db[revisions.REVISIONS_COLLECTION])
+    await archive.ensure_indexes(db[archive.COLD_COLLECTION])
+
+@app.on_event("startup")
+async def start_archiving():
+    archive_scheduler.start()
+
+@app.on_event("startup")
+async def load_autocomplete():
+    suggestions.start(heavy_reads_db, AUTOCOMPLETE_REFRESH_SECONDS)
+
+@app.on_event("startup")
+async def start_live_updates():
+    if LIVE_UPDATES:
+        await live_updates.start()
+
+@app.on_event("startup")
+async def report_startup():
+    coldstart.report.mark_ready()
+    if PREWARM_IMPORTS:
+        app.state.prewarm_task = asyncio.create_task(coldstart.prewarm())
+    # Reads (or downloads) the token encoding before the first summary needs it
+    app.state.encoding_task = asyncio.create_task(prompts.load_counter(SUMMARY_MODEL))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await live_updates.stop()
+    await suggestions.stop()
+    await archive_scheduler.stop()
+    await session_maintenance.stop()
+    await anamnese_inserts.close()
     client.close()
@@ -0,0 +1,73 @@
+"""Single-flight coalescing of identical concurrent work.
+
+Opening a record fires get_anamnese and often the PDF and JSON exports
+too, sometimes from several tabs at once. Concurrent calls with the same
+key share one execution: the first caller starts it, the others await the
+same task, and all of them receive its result or its exception. Nothing is
+cached. The key is forgotten as soon as the execution finishes, so a call
+that arrives afterwards starts a fresh one.
+
+The execution runs in its own task and callers await it shielded. A caller
+that is cancelled (client disconnected) does not cancel the work the other
+callers are waiting on.
+
+Keys are tuples whose first item names the resource; the counters are kept
+per resource. The coalescing ratio is the share of calls answered by an
+execution started for someone else.
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, Tuple
+
+
+@dataclass
+class FlightStats:
+    calls: int = 0
+    executions: int = 0
+
+    @property
+    def coalesced(self) -> int:
+        return self.calls - self.executions
+
+    @property
+    def ratio(self) -> float:
+        return self.coalesced / self.calls if self.calls else 0.0
+
+
+class SingleFlight:
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._inflight: Dict[Tuple[Hashable, ...], asyncio.Task] = {}
+        self.stats: Dict[str, FlightStats] = {}
+
+    async def do(self, key: Tuple[Hashable, ...], fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Result of fn(), shared with every concurrent call of the same key"""
+        stats = self.stats.setdefault(key[0], FlightStats())
+        stats.calls += 1
+        if not self.enabled:
+            stats.executions += 1
+            return await fn()
+
+        task = self._inflight.get(key)
+        if task is None:
+            stats.executions += 1
+            task = self._inflight[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda done, key=key: self._finished(key, done))
+        return await asyncio.shield(task)
+
+    def _finished(self, key: Tuple[Hashable, ...], task: asyncio.Task):
+        self._inflight.pop(key, None)
+        # Retrieved here too, in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def snapshot(self) -> dict:
+        return {
+            resource: {
+                "calls": stats.calls,
+                "executions": stats.executions,
+                "coalesced": stats.coalesced,
+                "ratio": round(stats.ratio, 3),
+            }
+            for resource, stats in self.stats.items()
+        }
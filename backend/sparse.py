@@ -0,0 +1,226 @@
+"""Sparse storage encoding of anamneses.
+
+Most of an anamnese is defaults: twelve empty review-of-systems entries,
+empty strings across identificacao/habitos/psicossocial, zeroed habit
+counters. Storing `model_dump()` verbatim writes all of them into every
+document. `encode` drops every field equal to its Pydantic default (a whole
+section when the section itself is default) and `decode` puts the defaults
+back, so the encoding is invisible to anything reading through them:
+`model_io.from_stored` fills the same defaults when building models.
+
+Fields without a static default (generated ids, timestamps) are always
+stored, and so is every path in ALWAYS_STORED: fields updated in place by
+Mongo operators, like the `$inc` of versao_registro.
+
+    python sparse.py migrate [--dry-run] [--batch-size 500]
+"""
+import argparse
+import asyncio
+import copy
+import os
+import typing
+from collections import defaultdict
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+import bson
+from pydantic import BaseModel
+from pydantic_core import PydanticUndefined
+from pymongo import UpdateOne
+
+import model_io
+from models import Anamnese
+
+ALWAYS_STORED = {("auditoria", "versao_registro")}
+
+_NO_DEFAULT = object()
+
+# (name, static default or _NO_DEFAULT, nested model, nested model is a list item)
+FieldPlan = Tuple[str, Any, Optional[Type[BaseModel]], bool]
+
+
+def _nested_model(annotation: Any) -> Tuple[Optional[Type[BaseModel]], bool]:
+    if typing.get_origin(annotation) is typing.Union:
+        args = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        annotation = args[0] if len(args) == 1 else annotation
+    if typing.get_origin(annotation) in (list, List):
+        (item_type,) = typing.get_args(annotation) or (Any,)
+        if isinstance(item_type, type) and issubclass(item_type, BaseModel):
+            return item_type, True
+        return None, False
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation, False
+    return None, False
+
+
+def _stored_default(field_info) -> Any:
+    """The default as it appears in a stored document"""
+    if field_info.default_factory is not None or field_info.default is PydanticUndefined:
+        return _NO_DEFAULT
+    default = field_info.default
+    if isinstance(default, BaseModel):
+        return default.model_dump()
+    try:
+        # e.g. `horas: float = 0` is stored as 0.0
+        return model_io.adapter(field_info.annotation).validate_python(default)
+    except Exception:
+        return default
+
+
+@lru_cache(maxsize=None)
+def _plan(cls: Type[BaseModel]) -> Tuple[FieldPlan, ...]:
+    return tuple(
+        (name, _stored_default(field_info), *_nested_model(field_info.annotation))
+        for name, field_info in cls.model_fields.items()
+    )
+
+
+def _same(value: Any, default: Any) -> bool:
+    # 0 == False == 0.0 in Python; the stored type must match too
+    return type(value) is type(default) and value == default
+
+
+def encode(data: Dict[str, Any], cls: Type[BaseModel] = Anamnese, _path: Tuple[str, ...] = ()) -> Dict[str, Any]:
+    """Copy of a dumped document without its default-valued fields"""
+    sparse = dict(data)
+    for name, default, nested, is_list in _plan(cls):
+        if name not in sparse:
+            continue
+        value = sparse[name]
+        path = _path + (name,)
+        if default is not _NO_DEFAULT and path not in ALWAYS_STORED and _same(value, default):
+            del sparse[name]
+        elif nested is not None and is_list and isinstance(value, list):
+            sparse[name] = [encode(item, nested, path) if isinstance(item, dict) else item for item in value]
+        elif nested is not None and isinstance(value, dict):
+            sparse[name] = encode(value, nested, path)
+    return sparse
+
+
+def decode(data: Dict[str, Any], cls: Type[BaseModel] = Anamnese) -> Dict[str, Any]:
+    """Copy of a stored document with its omitted defaults put back, in model field order"""
+    dense = {}
+    for name, default, nested, is_list in _plan(cls):
+        if name not in data:
+            if default is not _NO_DEFAULT:
+                dense[name] = copy.deepcopy(default)
+            continue
+        value = data[name]
+        if nested is not None and is_list and isinstance(value, list):
+            value = [decode(item, nested) if isinstance(item, dict) else item for item in value]
+        elif nested is not None and isinstance(value, dict):
+            value = decode(value, nested)
+        dense[name] = value
+    for name, value in data.items():
+        dense.setdefault(name, value)
+    return dense
+
+
+def section_update(sections: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """$set/$unset that store whole top-level sections in the sparse encoding"""
+    stored = encode(sections)
+    update: Dict[str, Dict[str, Any]] = {}
+    if stored:
+        update["$set"] = stored
+    unset = {section: "" for section in sections if section not in stored}
+    if unset:
+        update["$unset"] = unset
+    return update
+
+
+def apply_section_update(stored: Dict[str, Any], update: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """A stored document after a section_update, as the server writes it"""
+    result = {name: value for name, value in stored.items() if name not in update.get("$unset", {})}
+    result.update(update.get("$set", {}))
+    return result
+
+
+# =======================
+# MIGRATION
+# =======================
+
+@dataclass
+class MigrationReport:
+    documents: int = 0
+    rewritten: int = 0
+    bytes_before: int = 0
+    bytes_after: int = 0
+    saved_by_section: Dict[str, int] = field(default_factory=lambda: defaultdict(int))
+
+    def __str__(self) -> str:
+        saved = self.bytes_before - self.bytes_after
+        share = saved / self.bytes_before if self.bytes_before else 0
+        lines = [
+            f"{self.documents} documents, {self.rewritten} rewritten",
+            f"{self.bytes_before} B -> {self.bytes_after} B ({saved} B saved, {share:.1%}, "
+            f"{saved / max(self.documents, 1):.0f} B per document)",
+        ]
+        for section, saved_bytes in sorted(self.saved_by_section.items(), key=lambda item: -item[1]):
+            lines.append(f"  {section:28} {saved_bytes:>10} B")
+        return "\n".join(lines)
+
+
+def _size(document: Dict[str, Any]) -> int:
+    return len(bson.encode(document))
+
+
+async def migrate(db, dry_run: bool = False, batch_size: int = 500) -> MigrationReport:
+    """Drop default-valued fields from every stored anamnese (archived stubs are skipped)"""
+    report = MigrationReport()
+    operations: List[UpdateOne] = []
+
+    async def flush():
+        if operations and not dry_run:
+            await db.anamneses.bulk_write(operations, ordered=False)
+        operations.clear()
+
+    async for anamnese in db.anamneses.find({"archived": {"$ne": True}}).batch_size(batch_size):
+        sparse = encode(anamnese)
+        before, after = _size(anamnese), _size(sparse)
+        report.documents += 1
+        report.bytes_before += before
+        report.bytes_after += after
+        for section, value in anamnese.items():
+            if section not in sparse:
+                report.saved_by_section[section] += _size({section: value}) - _size({})
+            elif isinstance(value, dict):
+                report.saved_by_section[section] += _size({section: value}) - _size({section: sparse[section]})
+        changed = {section: value for section, value in anamnese.items() if sparse.get(section, _NO_DEFAULT) != value}
+        if changed:
+            report.rewritten += 1
+            # Skipped if the document changed since it was read
+            operations.append(UpdateOne(
+                {"_id": anamnese["_id"], "updated_at": anamnese.get("updated_at")},
+                section_update(changed)
+            ))
+        if len(operations) >= batch_size:
+            await flush()
+    await flush()
+    return report
+
+
+def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Store anamneses without their default-valued fields")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    migrate_parser = subparsers.add_parser("migrate", help="Rewrite existing documents in the sparse encoding")
+    migrate_parser.add_argument("--dry-run", action="store_true", help="Only report the bytes that would be saved")
+    migrate_parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        report = asyncio.run(migrate(db, args.dry_run, args.batch_size))
+        print(f"{'Would save' if args.dry_run else 'Migrated'}: {report}")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""Pre-aggregated clinical analytics for cohort dashboards.
+
+Every anamnese contributes to exactly one cohort bucket, keyed by
+(user_id, faixa_etaria, sexo). Buckets hold plain counters that are adjusted
+with $inc whenever an anamnese is created, updated or deleted, so reading the
+stats of a user touches a small, bounded number of documents regardless of
+how many anamneses exist.
+
+Full rebuild (e.g. after a backfill or to repair drift):
+
+    python stats.py rebuild [--user-id USER_ID]
+
+A rebuild writes a staging collection and renames it over the live one, so
+readers never see empty or partial buckets. Changes recorded while it scans
+are not in the new buckets: rebuild when writes are quiet.
+"""
+import argparse
+import asyncio
+import os
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo.errors import DuplicateKeyError
+
+import archive
+
+STATS_COLLECTION = "anamnese_stats"
+STAGING_COLLECTION = "anamnese_stats_rebuild"
+
+AGE_BANDS = [
+    (0, 18, "0-17"),
+    (18, 30, "18-29"),
+    (30, 40, "30-39"),
+    (40, 50, "40-49"),
+    (50, 60, "50-59"),
+    (60, 70, "60-69"),
+    (70, 80, "70-79"),
+    (80, None, "80+"),
+]
+PACKYEAR_BINS = [(0, "0"), (10, "0-9"), (20, "10-19"), (30, "20-29"), (None, "30+")]
+DOSES_BINS = [(0, "0"), (7, "1-7"), (14, "8-14"), (None, "15+")]
+SLEEP_BINS = [(5, "<5"), (6, "5-6"), (7, "6-7"), (8, "7-8"), (9, "8-9"), (None, "9+")]
+
+
+def _key(value: str) -> str:
+    """Normalize free text into a safe MongoDB field name"""
+    key = " ".join(str(value).strip().strip(".").lower().split())
+    return key.replace(".", "_").replace("$", "_") or "nao_informado"
+
+
+def _bin(value: float, bins, inclusive_first: bool = False) -> str:
+    for upper, label in bins:
+        if upper is None:
+            return label
+        if upper == 0 and inclusive_first:
+            if value <= 0:
+                return label
+            continue
+        if value < upper:
+            return label
+    return bins[-1][1]
+
+
+def _age_years(identificacao: Dict[str, Any]) -> int:
+    idade = identificacao.get("idade") or {}
+    if idade.get("unidade", "anos") != "anos":
+        return 0
+    return int(idade.get("valor") or 0)
+
+
+def age_band(years: int) -> str:
+    for lower, upper, label in AGE_BANDS:
+        if years >= lower and (upper is None or years < upper):
+            return label
+    return AGE_BANDS[0][2]
+
+
+def bucket_key(anamnese: Dict[str, Any]) -> Dict[str, str]:
+    identificacao = anamnese.get("identificacao") or {}
+    return {
+        "user_id": anamnese["user_id"],
+        "faixa_etaria": age_band(_age_years(identificacao)),
+        "sexo": _key(identificacao.get("sexo_biologico") or ""),
+    }
+
+
+def contribution(anamnese: Dict[str, Any], sign: int = 1) -> Dict[str, float]:
+    """Counters (dotted paths) this anamnese adds to its bucket"""
+    inc: Dict[str, float] = defaultdict(int)
+    inc["total"] += sign
+
+    pessoais = (anamnese.get("antecedentes") or {}).get("pessoais") or {}
+    for cronico in {_key(c) for c in pessoais.get("cronicos", []) if str(c).strip()}:
+        inc[f"cronicos.{cronico}"] += sign
+
+    habitos = anamnese.get("habitos") or {}
+    tabagismo = habitos.get("tabagismo") or {}
+    packyears = float(tabagismo.get("carga_tabagica_packyears") or 0)
+    inc[f"tabagismo.status.{_key(tabagismo.get('status') or 'nunca')}"] += sign
+    inc[f"tabagismo.packyears.{_bin(packyears, PACKYEAR_BINS, inclusive_first=True)}"] += sign
+    inc["tabagismo.packyears_soma"] += sign * packyears
+
+    etilismo = habitos.get("etilismo") or {}
+    doses = int(etilismo.get("doses_semana") or 0)
+    inc[f"etilismo.doses_semana.{_bin(doses, DOSES_BINS, inclusive_first=True)}"] += sign
+    if etilismo.get("uso_pesado_ep"):
+        inc["etilismo.uso_pesado"] += sign
+
+    horas = float((habitos.get("sono") or {}).get("horas") or 0)
+    if horas > 0:
+        inc[f"sono.horas.{_bin(horas, SLEEP_BINS)}"] += sign
+        inc["sono.respondentes"] += sign
+        inc["sono.horas_soma"] += sign * horas
+
+    return dict(inc)
+
+
+def _changes(old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]) -> List[Tuple[Dict[str, str], Dict[str, float]]]:
+    """Net $inc per bucket for replacing `old` with `new`"""
+    per_bucket: Dict[Tuple[str, ...], Tuple[Dict[str, str], Dict[str, float]]] = {}
+    for doc, sign in ((old, -1), (new, 1)):
+        if not doc:
+            continue
+        key = bucket_key(doc)
+        _, inc = per_bucket.setdefault(tuple(key.values()), (key, defaultdict(int)))
+        for path, value in contribution(doc, sign).items():
+            inc[path] += value
+    return [
+        (key, {path: value for path, value in inc.items() if value})
+        for key, inc in per_bucket.values()
+        if any(inc.values())
+    ]
+
+
+async def record_change(collection, old: Optional[Dict[str, Any]], new: Optional[Dict[str, Any]]):
+    """Apply the stats delta of a create (old=None), update or delete (new=None)"""
+    for key, inc in _changes(old, new):
+        try:
+            await collection.update_one(key, {"$inc": inc}, upsert=True)
+        except DuplicateKeyError:
+            # Two first writes to the bucket raced and the other one inserted it; it matches now
+            await collection.update_one(key, {"$inc": inc}, upsert=True)
+
+
+async def ensure_indexes(collection):
+    await collection.create_index([("user_id", 1), ("faixa_etaria", 1), ("sexo", 1)], unique=True)
+
+
+def _nest(flat: Dict[str, float]) -> Dict[str, Any]:
+    nested: Dict[str, Any] = {}
+    for path, value in flat.items():
+        node = nested
+        *parents, leaf = path.split(".")
+        for part in parents:
+            node = node.setdefault(part, {})
+        node[leaf] = node.get(leaf, 0) + value
+    return nested
+
+
+def _merge(target: Dict[str, Any], source: Dict[str, Any]):
+    for key, value in source.items():
+        if isinstance(value, dict):
+            _merge(target.setdefault(key, {}), value)
+        else:
+            target[key] = target.get(key, 0) + value
+
+
+def _prune(node: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop counters that went back to zero after updates/deletes"""
+    pruned = {}
+    for key, value in node.items():
+        if isinstance(value, dict):
+            value = _prune(value)
+            if value:
+                pruned[key] = value
+        elif value:
+            pruned[key] = value
+    return pruned
+
+
+async def read_stats(collection, user_id: str, faixa_etaria: Optional[str] = None, sexo: Optional[str] = None) -> Dict[str, Any]:
+    """Read the pre-aggregated buckets of a user; bounded by bands x sexes"""
+    query: Dict[str, Any] = {"user_id": user_id}
+    if faixa_etaria:
+        query["faixa_etaria"] = faixa_etaria
+    if sexo:
+        query["sexo"] = _key(sexo)
+
+    grupos = []
+    geral: Dict[str, Any] = {}
+    async for bucket in collection.find(query, {"_id": 0, "user_id": 0}):
+        bucket = _prune(bucket)
+        if not bucket.get("total"):
+            continue
+        _merge(geral, {k: v for k, v in bucket.items() if k not in ("faixa_etaria", "sexo")})
+        grupos.append(bucket)
+
+    grupos.sort(key=lambda g: ([b[2] for b in AGE_BANDS].index(g["faixa_etaria"]), g["sexo"]))
+    return {"total": int(geral.get("total", 0)), "geral": geral, "grupos": grupos}
+
+
+async def rebuild(db, user_id: Optional[str] = None, batch_size: int = 500) -> int:
+    """Recompute buckets from scratch by streaming the anamneses collection"""
+    query = {"user_id": user_id} if user_id else {}
+    projection = {
+        "_id": 0,
+        "id": 1,
+        "archived": 1,
+        "user_id": 1,
+        "identificacao.idade": 1,
+        "identificacao.sexo_biologico": 1,
+        "antecedentes.pessoais.cronicos": 1,
+        "habitos": 1,
+    }
+    buckets: Dict[Tuple[str, ...], Tuple[Dict[str, str], Dict[str, float]]] = {}
+    count = 0
+    cursor = archive.HydratingCursor(db.anamneses.find(query, projection), db[archive.COLD_COLLECTION])
+    async for anamnese in cursor.batch_size(batch_size):
+        key = bucket_key(anamnese)
+        _, inc = buckets.setdefault(tuple(key.values()), (key, defaultdict(int)))
+        for path, value in contribution(anamnese).items():
+            inc[path] += value
+        count += 1
+
+    staging = db[STAGING_COLLECTION]
+    await staging.drop()
+    if user_id:
+        # The other users' buckets are carried over as they are
+        await db[STATS_COLLECTION].aggregate([
+            {"$match": {"user_id": {"$ne": user_id}}},
+            {"$out": STAGING_COLLECTION},
+        ]).to_list(None)
+    if buckets:
+        await staging.insert_many([{**key, **_nest(inc)} for key, inc in buckets.values()])
+    await ensure_indexes(staging)
+    await staging.rename(STATS_COLLECTION, dropTarget=True)
+    return count
+
+
+def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Maintain pre-aggregated anamnese stats")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    rebuild_parser = subparsers.add_parser("rebuild", help="Recompute all stats buckets")
+    rebuild_parser.add_argument("--user-id", help="Only rebuild the buckets of this user")
+    args = parser.parse_args()
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    try:
+        count = asyncio.run(rebuild(db, args.user_id))
+        print(f"Rebuilt stats from {count} anamneses")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
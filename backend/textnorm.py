@@ -0,0 +1,58 @@
+"""Accent-insensitive text normalization and phonetic keys for Portuguese names."""
+import re
+import unicodedata
+from typing import List
+
+NAME_PARTICLES = {"de", "da", "do", "das", "dos", "e", "d"}
+
+_NON_ALPHA = re.compile(r"[^a-z ]+")
+
+# Applied in order; tuned for Brazilian Portuguese spelling variations
+_PHONETIC_RULES = [
+    (re.compile(r"ph"), "f"),
+    (re.compile(r"th"), "t"),
+    (re.compile(r"lh"), "l"),
+    (re.compile(r"nh"), "n"),
+    (re.compile(r"[cs]h"), "x"),
+    (re.compile(r"sc(?=[ei])"), "s"),
+    (re.compile(r"c(?=[ei])"), "s"),
+    (re.compile(r"g(?=[ei])"), "j"),
+    (re.compile(r"q(u)?"), "k"),
+    (re.compile(r"c"), "k"),
+    (re.compile(r"z"), "s"),
+    (re.compile(r"y"), "i"),
+    (re.compile(r"w"), "v"),
+    (re.compile(r"h"), ""),
+    (re.compile(r"m$"), "n"),
+    (re.compile(r"l$"), "u"),
+]
+
+
+def strip_accents(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def normalize(text: str) -> str:
+    """Lowercase, accent-free, single-spaced text"""
+    return " ".join(strip_accents(text or "").lower().split())
+
+
+def name_tokens(name: str) -> List[str]:
+    """Normalized name tokens without connecting particles (de, da, dos, ...)"""
+    cleaned = _NON_ALPHA.sub(" ", normalize(name))
+    return [token for token in cleaned.split() if token not in NAME_PARTICLES]
+
+
+def phonetic(token: str) -> str:
+    """Phonetic key of a single normalized token: first letter plus consonant skeleton"""
+    if not token:
+        return ""
+    code = token
+    for pattern, replacement in _PHONETIC_RULES:
+        code = pattern.sub(replacement, code)
+    if not code:
+        return token[0]
+    head, tail = code[0], re.sub(r"[aeiou]", "", code[1:])
+    collapsed = re.sub(r"(.)\1+", r"\1", head + tail)
+    return collapsed
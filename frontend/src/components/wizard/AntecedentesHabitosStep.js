@@ -1,14 +1,46 @@
-import React from 'react';
+import React, { useId, useState } from 'react';
 import { Card, CardContent } from '@/components/ui/card';
+import { Button } from '@/components/ui/button';
 import { Input } from '@/components/ui/input';
 import { Textarea } from '@/components/ui/textarea';
 import { Label } from '@/components/ui/label';
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from '@/components/ui/select';
-import { ClipboardList, Heart } from 'lucide-react';
+import { ClipboardList, Heart, Plus, X } from 'lucide-react';
+import { useAutocomplete } from '@/hooks/use-autocomplete';
+
+// Input suggesting terms already used in previous anamneses
+const SuggestInput = ({ field, value, onChange, ...props }) => {
+  const [focused, setFocused] = useState(false);
+  const suggestions = useAutocomplete(field, focused ? value : '');
+  const listId = useId();
+
+  return (
+    <>
+      <Input
+        {...props}
+        value={value}
+        list={listId}
+        autoComplete="off"
+        onFocus={() => setFocused(true)}
+        onBlur={() => setFocused(false)}
+        onChange={(e) => onChange(e.target.value)}
+      />
+      <datalist id={listId}>
+        {suggestions.map((s) => <option key={s.texto} value={s.texto} />)}
+      </datalist>
+    </>
+  );
+};
 
 const AntecedentesHabitosStep = ({ data, updateData }) => {
   const ant = data.antecedentes?.pessoais || {};
   const hab = data.habitos || {};
+  // Kept as typed, so a trailing comma survives until the next condition is written
+  const [cronicosText, setCronicosText] = useState(ant.cronicos?.join(', ') || '');
+  const cronicoAtual = cronicosText.split(',').pop().trim();
+  const sugestoesCronicos = useAutocomplete('cronicos', cronicoAtual).filter(
+    (s) => !(ant.cronicos || []).some((c) => c.toLowerCase() === s.texto.toLowerCase())
+  );
 
   const updateAntecedentes = (field, value) => {
     updateData({
@@ -31,6 +63,28 @@ const AntecedentesHabitosStep = ({ data, updateData }) => {
     });
   };
 
+  const updateCronicos = (text) => {
+    setCronicosText(text);
+    updateAntecedentes('cronicos', text.split(',').map(s => s.trim()).filter(Boolean));
+  };
+
+  const completeCronico = (texto) => {
+    const anteriores = cronicosText.split(',').slice(0, -1).map(s => s.trim()).filter(Boolean);
+    updateCronicos([...anteriores, texto].join(', ') + ', ');
+  };
+
+  const updateItem = (field, index, key, value) => {
+    updateAntecedentes(field, (ant[field] || []).map((item, i) => (i === index ? { ...item, [key]: value } : item)));
+  };
+
+  const addItem = (field, item) => {
+    updateAntecedentes(field, [...(ant[field] || []), item]);
+  };
+
+  const removeItem = (field, index) => {
+    updateAntecedentes(field, (ant[field] || []).filter((_, i) => i !== index));
+  };
+
   // Calculate pack-years
   const packYears = (hab.tabagismo?.macos_dia || 0) * (hab.tabagismo?.anos || 0);
 
@@ -49,14 +103,103 @@ const AntecedentesHabitosStep = ({ data, updateData }) => {
             <Textarea
               id="cronicos"
               data-testid="chronic-diseases-input"
-              value={ant.cronicos?.join(', ') || ''}
-              onChange={(e) => updateAntecedentes('cronicos', 
-                e.target.value.split(',').map(s => s.trim()).filter(Boolean)
-              )}
+              value={cronicosText}
+              onChange={(e) => updateCronicos(e.target.value)}
               placeholder="Ex: Diabetes, Hipertensão (separe por vírgula)"
               rows={2}
               className="mt-1"
             />
+            {sugestoesCronicos.length > 0 && (
+              <div className="flex flex-wrap gap-2 mt-2" data-testid="chronic-diseases-suggestions">
+                {sugestoesCronicos.map((s) => (
+                  <Button
+                    key={s.texto}
+                    type="button"
+                    variant="outline"
+                    size="sm"
+                    onClick={() => completeCronico(s.texto)}
+                  >
+                    {s.texto}
+                  </Button>
+                ))}
+              </div>
+            )}
+          </div>
+
+          <div>
+            <Label>Alergias</Label>
+            <div className="space-y-2 mt-1">
+              {(ant.alergias || []).map((alergia, index) => (
+                <div key={index} className="flex gap-2">
+                  <SuggestInput
+                    field="alergias"
+                    data-testid={`allergy-agent-input-${index}`}
+                    value={alergia.agente || ''}
+                    onChange={(value) => updateItem('alergias', index, 'agente', value)}
+                    placeholder="Agente (ex: Dipirona)"
+                  />
+                  <Input
+                    data-testid={`allergy-reaction-input-${index}`}
+                    value={alergia.reacao || ''}
+                    onChange={(e) => updateItem('alergias', index, 'reacao', e.target.value)}
+                    placeholder="Reação (ex: urticária)"
+                  />
+                  <Button type="button" variant="ghost" size="icon" onClick={() => removeItem('alergias', index)}>
+                    <X className="w-4 h-4" />
+                  </Button>
+                </div>
+              ))}
+              <Button
+                type="button"
+                variant="outline"
+                size="sm"
+                data-testid="add-allergy-button"
+                onClick={() => addItem('alergias', { agente: '', reacao: '' })}
+              >
+                <Plus className="w-4 h-4" /> Adicionar alergia
+              </Button>
+            </div>
+          </div>
+
+          <div>
+            <Label>Medicações em Uso</Label>
+            <div className="space-y-2 mt-1">
+              {(ant.medicacoes_uso || []).map((medicacao, index) => (
+                <div key={index} className="flex gap-2">
+                  <SuggestInput
+                    field="medicacoes_uso"
+                    data-testid={`medication-name-input-${index}`}
+                    value={medicacao.nome || ''}
+                    onChange={(value) => updateItem('medicacoes_uso', index, 'nome', value)}
+                    placeholder="Nome (ex: Losartana)"
+                  />
+                  <Input
+                    data-testid={`medication-dose-input-${index}`}
+                    value={medicacao.dose || ''}
+                    onChange={(e) => updateItem('medicacoes_uso', index, 'dose', e.target.value)}
+                    placeholder="Dose (ex: 50mg)"
+                  />
+                  <Input
+                    data-testid={`medication-posology-input-${index}`}
+                    value={medicacao.posologia || ''}
+                    onChange={(e) => updateItem('medicacoes_uso', index, 'posologia', e.target.value)}
+                    placeholder="Posologia (ex: 12/12h)"
+                  />
+                  <Button type="button" variant="ghost" size="icon" onClick={() => removeItem('medicacoes_uso', index)}>
+                    <X className="w-4 h-4" />
+                  </Button>
+                </div>
+              ))}
+              <Button
+                type="button"
+                variant="outline"
+                size="sm"
+                data-testid="add-medication-button"
+                onClick={() => addItem('medicacoes_uso', { nome: '', dose: '', posologia: '' })}
+              >
+                <Plus className="w-4 h-4" /> Adicionar medicação
+              </Button>
+            </div>
           </div>
 
           <div>
@@ -0,0 +1,40 @@
+import { useEffect, useState } from 'react';
+import axios from 'axios';
+
+const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
+const DEBOUNCE_MS = 150;
+
+// Suggestions from /api/autocomplete for field (medicacoes_uso, alergias or cronicos),
+// fetched once typing pauses; answers to outdated queries are dropped
+export const useAutocomplete = (field, query) => {
+  const [suggestions, setSuggestions] = useState([]);
+
+  useEffect(() => {
+    const q = (query || '').trim();
+    if (!q) {
+      setSuggestions([]);
+      return undefined;
+    }
+
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        const response = await axios.get(`${API}/autocomplete`, {
+          params: { field, q },
+          withCredentials: true,
+          signal: controller.signal
+        });
+        setSuggestions(response.data);
+      } catch (error) {
+        if (!axios.isCancel(error)) setSuggestions([]);
+      }
+    }, DEBOUNCE_MS);
+
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [field, query]);
+
+  return suggestions;
+};
@@ -1,4 +1,4 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
 import axios from 'axios';
 import { useAuth } from '@/contexts/AuthContext';
@@ -10,23 +10,108 @@ import { toast } from 'sonner';
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
 
+// The unfiltered list and its live-update stream outlive the page, so coming
+// back to the dashboard shows the patched list instead of refetching it
+const liveList = { items: null, source: null, stale: true, onEvent: null };
+
+// Apply an upsert/delete delta from /events/anamneses to a list
+const applyDelta = (list, event, delta, allowInsert = true) => {
+  const index = list.findIndex((a) => a.id === delta.id);
+  if (event === 'delete') {
+    return index === -1 ? list : list.filter((a) => a.id !== delta.id);
+  }
+  if (index === -1) {
+    return allowInsert ? [delta, ...list] : list;
+  }
+  const current = list[index];
+  const next = [...list];
+  next[index] = {
+    ...current,
+    ...delta,
+    identificacao: { ...current.identificacao, ...delta.identificacao },
+    queixa_principal: { ...current.queixa_principal, ...delta.queixa_principal }
+  };
+  return next;
+};
+
+const openLiveList = () => {
+  if (liveList.source || typeof EventSource === 'undefined') return;
+  const source = new EventSource(`${API}/events/anamneses`, { withCredentials: true });
+  let connected = false;
+  const handle = (event) => (e) => {
+    const delta = JSON.parse(e.data);
+    if (liveList.items) liveList.items = applyDelta(liveList.items, event, delta);
+    liveList.onEvent?.(event, delta);
+  };
+  source.addEventListener('upsert', handle('upsert'));
+  source.addEventListener('delete', handle('delete'));
+  // Events may have been missed: after a reconnect or when the server says so
+  const resync = () => {
+    liveList.stale = true;
+    liveList.onEvent?.('resync');
+  };
+  source.addEventListener('ready', () => {
+    if (connected) resync();
+    connected = true;
+  });
+  source.addEventListener('resync', resync);
+  source.onerror = () => {
+    // Closed for good (e.g. 503 without a replica set): back to plain refetches
+    if (source.readyState === EventSource.CLOSED) {
+      liveList.source = null;
+      liveList.stale = true;
+    }
+  };
+  liveList.source = source;
+};
+
+export const closeLiveList = () => {
+  liveList.source?.close();
+  liveList.source = null;
+  liveList.items = null;
+  liveList.stale = true;
+};
+
 const Dashboard = () => {
   const { user, logout } = useAuth();
   const navigate = useNavigate();
-  const [anamneses, setAnamneses] = useState([]);
+  const [anamneses, setAnamneses] = useState(liveList.items || []);
   const [loading, setLoading] = useState(true);
   const [searchTerm, setSearchTerm] = useState('');
+  const activeSearch = useRef('');
 
   useEffect(() => {
-    fetchAnamneses();
+    if (liveList.items && !liveList.stale && liveList.source) {
+      setAnamneses(liveList.items);
+      setLoading(false);
+    } else {
+      fetchAnamneses();
+    }
+    openLiveList();
+    liveList.onEvent = (event, delta) => {
+      if (event === 'resync') {
+        fetchAnamneses(activeSearch.current);
+        return;
+      }
+      // Search results only get updates and deletes of the records they show
+      setAnamneses((list) => applyDelta(list, event, delta, !activeSearch.current));
+    };
+    return () => {
+      liveList.onEvent = null;
+    };
   }, []);
 
   const fetchAnamneses = async (search = '') => {
     try {
       setLoading(true);
+      activeSearch.current = search;
       const url = search ? `${API}/anamneses?search=${encodeURIComponent(search)}` : `${API}/anamneses`;
       const response = await axios.get(url, { withCredentials: true });
       setAnamneses(response.data);
+      if (!search) {
+        liveList.items = response.data;
+        liveList.stale = false;
+      }
     } catch (error) {
       console.error('Error fetching anamneses:', error);
       toast.error('Erro ao carregar anamneses');
@@ -68,7 +153,10 @@ const Dashboard = () => {
             </div>
             <Button
               data-testid="logout-btn"
-              onClick={logout}
+              onClick={() => {
+                closeLiveList();
+                logout();
+              }}
               variant="outline"
               size="sm"
               className="gap-2"
@@ -0,0 +1,124 @@
+import asyncio
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+
+# server.py reads these at import; Motor connects lazily, the tests swap in mongomock
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "anamnese_tests")
+
+
+@pytest.fixture
+def run():
+    """Run a coroutine to completion on a fresh event loop"""
+    def runner(coroutine):
+        return asyncio.run(coroutine)
+    return runner
+
+
+@pytest.fixture
+def mongo():
+    """In-memory stand-in for the Motor database"""
+    from mongomock_motor import AsyncMongoMockClient
+    return AsyncMongoMockClient()["anamnese_tests"]
+
+
+class SharedCollections:
+    """Database that hands out one collection object per name, so tests can wrap its methods"""
+
+    def __init__(self, database):
+        self._database = database
+        self._collections = {}
+
+    def __getitem__(self, name):
+        if name not in self._collections:
+            self._collections[name] = self._database[name]
+        return self._collections[name]
+
+    def __getattr__(self, name):
+        if name.startswith("_") or hasattr(type(self._database), name):
+            return getattr(self._database, name)
+        return self[name]
+
+
+SAMPLE_ANAMNESE = {
+    "meta": {"consentimento": True, "profissional": {"nome": "Dra. Ana", "registro": "CRM 1", "unidade": "UBS"}},
+    "identificacao": {
+        "nome_completo": "José da Silva",
+        "sexo_biologico": "masculino",
+        "idade": {"valor": 58, "unidade": "anos"},
+        "cor_etnia": "parda",
+        "estado_civil": "casado",
+        "ocupacao": {"atividade": "pedreiro"},
+        "escolaridade": "fundamental",
+        "naturalidade": {"cidade": "Recife", "uf": "PE"},
+        "procedencia": {"cidade": "Recife", "uf": "PE"},
+        "mae": "Maria da Silva",
+    },
+    "queixa_principal": {"texto_entre_aspas": "dor no peito", "inicio": {"há": 3, "unidade": "dias"}},
+    "hda": {"narrativa": "Dor torácica em aperto há 3 dias, pior aos esforços."},
+    "antecedentes": {
+        "pessoais": {
+            "cronicos": ["Hipertensão"],
+            "alergias": [{"agente": "Dipirona", "reacao": "urticária"}],
+            "medicacoes_uso": [{"nome": "Losartana", "dose": "50mg", "posologia": "12/12h"}],
+        },
+    },
+    "habitos": {"tabagismo": {"status": "ex", "macos_dia": 1, "anos": 30, "carga_tabagica_packyears": 30}},
+    "psicossocial": {"dependentes": 2},
+}
+
+
+class Api:
+    def __init__(self, server, db):
+        self.server = server
+        self.db = db
+
+    def client(self, token="tok-u1"):
+        import httpx
+        return httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=self.server.app),
+            base_url="http://test",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+
+
+@pytest.fixture
+def api(mongo, monkeypatch):
+    """The FastAPI app on an in-memory database, with users u1 (tok-u1) and u2 (tok-u2)"""
+    from datetime import datetime, timedelta, timezone
+
+    import server
+
+    db = SharedCollections(mongo)
+    monkeypatch.setattr(server, "db", db)
+    monkeypatch.setattr(server, "heavy_reads_db", db)
+    monkeypatch.setattr(server, "ADMISSION_CONTROL", False)
+    monkeypatch.setattr(server.session_maintenance, "collection", db.user_sessions)
+    monkeypatch.setattr(server.anamnese_inserts, "collection", db.anamneses)
+
+    async def seed():
+        now = datetime.now(timezone.utc)
+        for user_id in ("u1", "u2"):
+            await db.users.insert_one({"id": user_id, "email": f"{user_id}@example.com", "name": user_id, "created_at": now.isoformat()})
+            await db.user_sessions.insert_one({
+                "user_id": user_id,
+                "session_token": f"tok-{user_id}",
+                "expires_at": (now + timedelta(days=1)).isoformat(),
+                "created_at": now.isoformat(),
+            })
+
+    asyncio.run(seed())
+    return Api(server, db)
+
+
+@pytest.fixture
+def sample_anamnese():
+    """A valid AnamneseCreate payload"""
+    import copy
+    return copy.deepcopy(SAMPLE_ANAMNESE)
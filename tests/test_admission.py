@@ -0,0 +1,130 @@
+import asyncio
+import math
+
+import pytest
+
+import admission
+
+
+def controller(**settings):
+    return admission.AdmissionController(admission.AdmissionSettings(**settings))
+
+
+def test_token_bucket_refills_at_rate_up_to_burst():
+    bucket = admission.TokenBucket(rate=2, burst=4, now=0)
+    bucket.take(4)
+
+    assert bucket.wait_time(1, now=0) == 0.5
+    assert bucket.wait_time(1, now=1) == 0
+    assert bucket.tokens == 2
+    assert bucket.wait_time(1, now=100) == 0
+    assert bucket.tokens == 4
+
+
+def test_token_bucket_never_fits_more_than_burst():
+    bucket = admission.TokenBucket(rate=2, burst=4, now=0)
+
+    assert bucket.wait_time(5, now=0) == math.inf
+    assert admission.TokenBucket(rate=0, burst=4, now=0).wait_time(1, now=0) == 0
+
+
+def test_unknown_session_tokens_share_the_client_bucket():
+    control = controller()
+    control.remember("tok-u1", "u1")
+
+    assert control.identity("tok-u1", "10.0.0.1") == "u1"
+    assert control.identity("made-up-1", "10.0.0.2") == "client:10.0.0.2"
+    assert control.identity("made-up-2", "10.0.0.2") == "client:10.0.0.2"
+    assert control.identity(None, "10.0.0.2") == "client:10.0.0.2"
+    control.forget("tok-u1")
+    assert control.identity("tok-u1", "10.0.0.1") == "client:10.0.0.1"
+
+
+def test_rotating_tokens_do_not_escape_the_rate_limit():
+    control = controller(user_rate=0.001, user_burst=3)
+    for n in range(3):
+        control.check_rate(control.identity(f"fresh-{n}", "10.0.0.9"), admission.DEFAULT)
+
+    with pytest.raises(admission.Rejected) as rejected:
+        control.check_rate(control.identity("fresh-3", "10.0.0.9"), admission.DEFAULT)
+    assert rejected.value.status_code == 429
+
+
+def test_global_bucket_rejects_with_503_without_taking_user_tokens():
+    control = controller(global_rate=0.001, global_burst=admission.CLASS_COSTS[admission.LLM])
+    control.check_rate("u1", admission.LLM)
+
+    with pytest.raises(admission.Rejected) as rejected:
+        control.check_rate("u2", admission.LLM)
+    assert rejected.value.status_code == 503
+    assert control.user_buckets["u2"].tokens == admission.DEFAULT_USER_BURST
+
+
+def test_acquire_times_out_when_the_class_is_full(run):
+    control = controller(concurrency={admission.DEFAULT: 1, admission.PDF: 1, admission.LLM: 1}, queue_timeout=0.01)
+
+    async def scenario():
+        await control.acquire(admission.PDF)
+        with pytest.raises(admission.Rejected) as rejected:
+            await control.acquire(admission.PDF)
+        assert rejected.value.status_code == 503
+        control.release(admission.PDF, 0.1)
+        # The slot handed back is free again, and the rejected waiter did not keep one
+        await asyncio.wait_for(control.acquire(admission.PDF), 1)
+
+    run(scenario())
+    assert control.stats[admission.PDF].rejected_concurrency == 1
+    assert control.stats[admission.PDF].admitted == 2
+    assert control.running[admission.PDF] == 1
+
+
+def test_cancelled_waiter_does_not_leak_a_slot(run):
+    control = controller(concurrency={admission.DEFAULT: 1, admission.PDF: 1, admission.LLM: 1}, queue_timeout=5)
+
+    async def scenario():
+        await control.acquire(admission.LLM)
+        waiter = asyncio.create_task(control.acquire(admission.LLM))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        control.release(admission.LLM, 0.1)
+        await asyncio.wait_for(control.acquire(admission.LLM), 1)
+
+    run(scenario())
+    assert control.running[admission.LLM] == 1
+    assert control.semaphores[admission.LLM].locked()
+
+
+def test_zero_queue_timeout_rejects_at_once(run):
+    control = controller(concurrency={admission.DEFAULT: 1, admission.PDF: 1, admission.LLM: 1}, queue_timeout=0)
+
+    async def scenario():
+        await control.acquire(admission.DEFAULT)
+        with pytest.raises(admission.Rejected):
+            await control.acquire(admission.DEFAULT)
+
+    run(scenario())
+
+
+def test_sessions_are_resolved_before_charging_the_bucket(api, run, monkeypatch):
+    # A fresh controller, as after a restart: no session token is known yet
+    monkeypatch.setattr(api.server, "ADMISSION_CONTROL", True)
+    monkeypatch.setattr(api.server, "admission_control", controller(user_rate=0.001, user_burst=2))
+
+    async def scenario():
+        statuses = []
+        async with api.client("tok-u1") as u1, api.client("tok-u2") as u2, api.client("made-up") as anonymous:
+            for client in (u1, u1, u2, u2, anonymous, u1):
+                statuses.append((await client.get("/api/anamneses")).status_code)
+        return statuses
+
+    assert run(scenario()) == [200, 200, 200, 200, 401, 429]
+    assert set(api.server.admission_control.user_buckets) == {"u1", "u2", "client:127.0.0.1"}
+
+
+def test_metrics_require_a_session(api, run):
+    async def scenario():
+        async with api.client("made-up") as client:
+            return (await client.get("/api/health/metrics")).status_code
+
+    assert run(scenario()) == 401
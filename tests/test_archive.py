@@ -0,0 +1,142 @@
+import archive
+import llm
+
+OLD = "2020-01-01T00:00:00+00:00"
+
+
+def summary_llm(api, monkeypatch, during=None):
+    """Answer summaries locally, running `during` while the summary is generated"""
+    async def complete(system, prompt, session_id):
+        if during:
+            await during()
+        return llm.Completion(text="Resumo gerado", provider="test/model", latency=0.0, attempts=1, hedged=False)
+
+    monkeypatch.setattr(api.server.summary_llm, "complete", complete)
+
+
+async def create_old(client, api, payload):
+    anamnese_id = (await client.post("/api/anamneses", json=payload)).json()["id"]
+    await api.db.anamneses.update_one({"id": anamnese_id}, {"$set": {"updated_at": OLD}})
+    return anamnese_id
+
+
+def test_compress_round_trip_and_stub(sample_anamnese):
+    document = {**sample_anamnese, "id": "a1", "user_id": "u1", "updated_at": OLD}
+
+    assert archive.decompress(archive.compress(document)) == document
+    stub = archive.make_stub(document)
+    assert stub["archived"] is True
+    assert stub["identificacao"] == document["identificacao"]
+    assert stub["hda"] == archive.STUB_PLACEHOLDERS["hda"]
+
+
+def test_archive_and_restore(run, api, sample_anamnese):
+    async def scenario():
+        async with api.client() as client:
+            old_id = await create_old(client, api, sample_anamnese)
+            recent_id = (await client.post("/api/anamneses", json=sample_anamnese)).json()["id"]
+            report = await archive.archive_older_than(api.db, after_days=30)
+            stub = await api.db.anamneses.find_one({"id": old_id}, {"_id": 0})
+            recent = await api.db.anamneses.find_one({"id": recent_id}, {"_id": 0})
+            read = (await client.get(f"/api/anamneses/{old_id}")).json()
+            restored = await archive.restore(api.db, old_id)
+            hot = await api.db.anamneses.find_one({"id": old_id}, {"_id": 0})
+            cold = await api.db[archive.COLD_COLLECTION].count_documents({})
+            return report, stub, recent, read, restored, hot, cold
+
+    report, stub, recent, read, restored, hot, cold = run(scenario())
+    assert (report.archived, report.skipped) == (1, 0)
+    assert stub["archived"] and "archived" not in recent
+    assert read["hda"]["narrativa"] == sample_anamnese["hda"]["narrativa"]
+    assert hot == restored and "archived" not in hot
+    assert cold == 0
+
+
+def test_summary_saved_while_archiving_is_kept(run, api, sample_anamnese, monkeypatch):
+    """A summary saved between the cold write and the stub replace must not be lost"""
+    summary_llm(api, monkeypatch)
+    cold = api.db[archive.COLD_COLLECTION]
+    replace_one = cold.replace_one
+
+    async def scenario():
+        async with api.client() as client:
+            anamnese_id = await create_old(client, api, sample_anamnese)
+            snapshot = await api.db.anamneses.find_one({"id": anamnese_id}, {"_id": 0})
+
+            async def summary_saved_after_cold_write(*args, **kwargs):
+                result = await replace_one(*args, **kwargs)
+                response = await client.post(f"/api/anamneses/{anamnese_id}/generate-summary")
+                assert response.status_code == 200
+                return result
+
+            cold.replace_one = summary_saved_after_cold_write
+            archived = await archive.archive_one(api.db, snapshot)
+            hot = await api.db.anamneses.find_one({"id": anamnese_id}, {"_id": 0})
+            return archived, hot, await cold.count_documents({})
+
+    archived, hot, cold_copies = run(scenario())
+    assert archived is False
+    assert "archived" not in hot
+    assert hot["resumo_clinico_ia"] == "Resumo gerado"
+    assert cold_copies == 0
+
+
+def test_summary_of_record_archived_during_generation_is_kept(run, api, sample_anamnese, monkeypatch):
+    state = {}
+
+    async def archive_meanwhile():
+        snapshot = await api.db.anamneses.find_one({"id": state["id"]}, {"_id": 0})
+        state["archived"] = await archive.archive_one(api.db, snapshot)
+
+    summary_llm(api, monkeypatch, during=archive_meanwhile)
+
+    async def scenario():
+        async with api.client() as client:
+            state["id"] = await create_old(client, api, sample_anamnese)
+            response = await client.post(f"/api/anamneses/{state['id']}/generate-summary")
+            assert response.status_code == 200
+            hot = await api.db.anamneses.find_one({"id": state["id"]}, {"_id": 0})
+            return hot, await api.db[archive.COLD_COLLECTION].count_documents({})
+
+    hot, cold_copies = run(scenario())
+    assert state["archived"] is True
+    assert "archived" not in hot
+    assert hot["resumo_clinico_ia"] == "Resumo gerado"
+    assert hot["hda"]["narrativa"] == sample_anamnese["hda"]["narrativa"]
+    assert cold_copies == 0
+
+
+def test_update_of_record_archived_after_its_restore_is_retried(run, api, sample_anamnese):
+    collection = api.db.anamneses
+    find_one_and_update = collection.find_one_and_update
+    state = {"archived": 0}
+
+    async def archive_first(*args, **kwargs):
+        if not state["archived"]:
+            snapshot = await collection.find_one({"id": state["id"]}, {"_id": 0})
+            state["archived"] += await archive.archive_one(api.db, snapshot)
+        return await find_one_and_update(*args, **kwargs)
+
+    async def scenario():
+        async with api.client() as client:
+            state["id"] = await create_old(client, api, sample_anamnese)
+            collection.find_one_and_update = archive_first
+            response = await client.put(f"/api/anamneses/{state['id']}", json={"hda": {"narrativa": "Melhorou."}})
+            hot = await collection.find_one({"id": state["id"]}, {"_id": 0})
+            return response, hot, await api.db[archive.COLD_COLLECTION].count_documents({})
+
+    response, hot, cold_copies = run(scenario())
+    assert state["archived"] == 1
+    assert response.status_code == 200
+    assert response.json()["hda"]["narrativa"] == "Melhorou."
+    assert "archived" not in hot
+    assert hot["queixa_principal"]["texto_entre_aspas"] == sample_anamnese["queixa_principal"]["texto_entre_aspas"]
+    assert cold_copies == 0
+
+
+def test_update_of_missing_record_is_404(run, api):
+    async def scenario():
+        async with api.client() as client:
+            return (await client.put("/api/anamneses/missing", json={"hda": {"narrativa": "x"}})).status_code
+
+    assert run(scenario()) == 404
@@ -0,0 +1,126 @@
+import copy
+
+import archive
+import autocomplete
+
+
+def record(user_id, medicacoes=(), alergias=(), cronicos=(), anamnese_id="a1"):
+    return {
+        "id": anamnese_id,
+        "user_id": user_id,
+        "antecedentes": {"pessoais": {
+            "medicacoes_uso": [{"nome": nome, "dose": "", "posologia": ""} for nome in medicacoes],
+            "alergias": [{"agente": agente, "reacao": ""} for agente in alergias],
+            "cronicos": list(cronicos),
+        }},
+    }
+
+
+def texts(suggestions):
+    return [s.texto for s in suggestions]
+
+
+def test_bulk_index_matches_incremental():
+    counts = {"losartana potassica": 3, "dipirona": 1, "diabetes mellitus": 2}
+    incremental = autocomplete.PrefixIndex()
+    for term, count in counts.items():
+        incremental.add(term, count)
+
+    bulk = autocomplete.PrefixIndex.from_counts(counts)
+    assert bulk.keys == incremental.keys
+    assert bulk.counts == incremental.counts
+    assert [term for term, _ in bulk.matches("mel")] == ["diabetes mellitus"]
+
+
+def test_builder_matches_record_changes():
+    records = [
+        record("u1", medicacoes=["Losartana", "Dipirona"], cronicos=["Hipertensão"]),
+        record("u1", medicacoes=["losartana ", "Losartana"]),
+        record("u2", medicacoes=["Losartana"], alergias=["Dipirona"]),
+    ]
+    incremental = autocomplete.Autocomplete()
+    builder = autocomplete.IndexBuilder()
+    for doc in records:
+        incremental.record_change(None, doc)
+        builder.add(doc)
+
+    bulk = builder.build()
+    for name in autocomplete.FIELDS:
+        built, expected = bulk[name], incremental.fields[name]
+        assert built.global_index.keys == expected.global_index.keys
+        assert built.global_index.counts == expected.global_index.counts
+        assert {u: i.counts for u, i in built.users.items()} == {u: i.counts for u, i in expected.users.items()}
+        assert built.user_counts == expected.user_counts
+        assert built.spellings == expected.spellings
+
+
+def test_own_terms_first_and_shared_terms_need_several_users():
+    index = autocomplete.Autocomplete(global_min_users=2)
+    index.record_change(None, record("u1", medicacoes=["Losartana"]))
+    index.record_change(None, record("u2", medicacoes=["Losartana", "Lorazepam"]))
+    index.record_change(None, record("u3", medicacoes=["Losartana", "Lorazepam", "Loratadina"]))
+    index.record_change(None, record("u4", medicacoes=["Loratadina"]))
+
+    assert texts(index.suggest("u4", autocomplete.MEDICACOES, "lo")) == ["Loratadina", "Losartana", "Lorazepam"]
+    # Typed by u4 alone so far
+    assert "Loratadina" in texts(index.suggest("u3", autocomplete.MEDICACOES, "lo"))
+    index.record_change(record("u4", medicacoes=["Loratadina"]), None)
+    assert "Loratadina" not in texts(index.suggest("u1", autocomplete.MEDICACOES, "lo"))
+
+
+def test_removing_terms_that_were_never_indexed_is_a_no_op():
+    index = autocomplete.Autocomplete()
+    index.record_change(None, record("u1", cronicos=["Asma"]))
+    index.record_change(record("u1", cronicos=["Diabetes"]), None)
+
+    field = index.fields[autocomplete.CRONICOS]
+    assert field.global_index.counts == {"asma": 1}
+    assert field.spellings == {"asma": {"Asma": 1}}
+    assert texts(index.suggest("u1", autocomplete.CRONICOS, "as")) == ["Asma"]
+
+
+def test_matches_any_word_ignoring_accents():
+    index = autocomplete.Autocomplete()
+    index.record_change(None, record("u1", cronicos=["Diabetes mellitus tipo 2", "Hipertensão arterial"]))
+
+    assert texts(index.suggest("u1", autocomplete.CRONICOS, "MEL")) == ["Diabetes mellitus tipo 2"]
+    assert texts(index.suggest("u1", autocomplete.CRONICOS, "hipertensao")) == ["Hipertensão arterial"]
+
+
+def test_load_reads_archived_stubs_without_cold_storage(run, mongo, monkeypatch):
+    hot = record("u1", medicacoes=["Losartana"], anamnese_id="hot")
+    old = record("u1", medicacoes=["Metformina"], alergias=["Penicilina"], cronicos=["Diabetes"], anamnese_id="old")
+
+    async def scenario():
+        await mongo.anamneses.insert_one(dict(hot))
+        await mongo.anamneses.insert_one(archive.make_stub(copy.deepcopy(old)))
+
+        async def no_cold_reads(*args, **kwargs):
+            raise AssertionError("cold storage read")
+
+        monkeypatch.setattr(archive, "hydrate_many", no_cold_reads)
+        index = autocomplete.Autocomplete()
+        count = await index.load(mongo)
+        return index, count
+
+    index, count = run(scenario())
+    assert count == 2
+    assert texts(index.suggest("u1", autocomplete.MEDICACOES, "m")) == ["Metformina"]
+    assert texts(index.suggest("u1", autocomplete.ALERGIAS, "pen")) == ["Penicilina"]
+    assert texts(index.suggest("u1", autocomplete.CRONICOS, "dia")) == ["Diabetes"]
+
+
+def test_load_rehydrates_stubs_archived_without_term_lists(run, mongo):
+    old = record("u1", medicacoes=["Metformina"], anamnese_id="old")
+    legacy_stub = {**archive.make_stub(old), "antecedentes": {"pessoais": {}}}
+
+    async def scenario():
+        await mongo.anamneses.insert_one(legacy_stub)
+        await mongo[archive.COLD_COLLECTION].insert_one({"id": "old", "user_id": "u1", "blob": archive.compress(old)})
+        index = autocomplete.Autocomplete()
+        await index.load(mongo)
+        return index
+
+    index = run(scenario())
+    assert not archive.stub_has_terms(legacy_stub)
+    assert texts(index.suggest("u1", autocomplete.MEDICACOES, "met")) == ["Metformina"]
@@ -0,0 +1,41 @@
+import sys
+
+import coldstart
+
+
+def test_load_times_only_the_first_import(monkeypatch):
+    report = coldstart.StartupReport()
+    monkeypatch.setattr(coldstart, "report", report)
+    monkeypatch.delitem(sys.modules, "colorsys", raising=False)
+
+    module = coldstart.load("colorsys")
+    assert coldstart.load("colorsys") is module
+    assert list(report.imports) == ["colorsys"]
+    assert report.snapshot()["imports_ms"]["colorsys"] >= 0
+
+
+def test_snapshot_reports_milestones_in_ms():
+    report = coldstart.StartupReport()
+    assert report.snapshot() == {"ready_after_ms": None, "first_request_after_ms": None, "imports_ms": {}}
+
+    report.ready_after = 0.25
+    report.record_import("numpy", 0.1234)
+    assert report.snapshot() == {"ready_after_ms": 250.0, "first_request_after_ms": None, "imports_ms": {"numpy": 123.4}}
+
+
+def test_metrics_expose_the_startup_report(api, run, monkeypatch):
+    report = coldstart.StartupReport()
+    report.ready_after = 0.5
+    report.first_request_after = 0.75
+    report.record_import("pdf_render", 0.2)
+    monkeypatch.setattr(coldstart, "report", report)
+
+    async def scenario():
+        async with api.client() as client:
+            return (await client.get("/api/health/metrics")).json()
+
+    assert run(scenario())["startup"] == {
+        "ready_after_ms": 500.0,
+        "first_request_after_ms": 750.0,
+        "imports_ms": {"pdf_render": 200.0},
+    }
@@ -0,0 +1,71 @@
+import pytest
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+import database
+
+ENV = {"MONGO_URL": "mongodb://db.example:27017/?replicaSet=rs0", "DB_NAME": "anamnese"}
+
+
+def test_settings_defaults_from_env():
+    settings = database.MongoSettings.from_env(ENV)
+
+    assert settings == database.MongoSettings(url=ENV["MONGO_URL"], db_name="anamnese")
+    assert settings.heavy_read_preference == "secondaryPreferred"
+    assert settings.max_staleness_seconds == database.MIN_MAX_STALENESS_SECONDS
+
+
+def test_settings_overrides_from_env():
+    settings = database.MongoSettings.from_env({
+        **ENV,
+        "MONGO_MAX_POOL_SIZE": "20",
+        "MONGO_MIN_POOL_SIZE": "5",
+        "MONGO_WAIT_QUEUE_TIMEOUT_MS": "250",
+        "MONGO_HEAVY_READ_PREFERENCE": "nearest",
+        "MONGO_MAX_STALENESS_SECONDS": "0",
+        "MONGO_STARTUP_TIMEOUT_SECONDS": "2.5",
+    })
+
+    assert (settings.max_pool_size, settings.min_pool_size, settings.wait_queue_timeout_ms) == (20, 5, 250)
+    assert settings.heavy_read_preference == "nearest"
+    assert settings.max_staleness_seconds == 0
+    assert settings.startup_timeout_seconds == 2.5
+
+
+def test_settings_require_url_and_database():
+    with pytest.raises(KeyError):
+        database.MongoSettings.from_env({"MONGO_URL": ENV["MONGO_URL"]})
+
+
+@pytest.mark.parametrize("mode", list(database.READ_PREFERENCES))
+def test_every_mode_parses(mode):
+    preference = database.read_preference(mode, 120)
+
+    assert preference.mongos_mode == database.READ_PREFERENCES[mode]().mongos_mode
+    assert preference.max_staleness == (-1 if mode == "primary" else 120)
+
+
+def test_staleness_at_or_below_zero_is_unbounded():
+    assert database.read_preference("secondaryPreferred", 0) == SecondaryPreferred()
+    assert database.read_preference("secondaryPreferred") == SecondaryPreferred()
+
+
+@pytest.mark.parametrize("mode, staleness, message", [
+    ("secondary_preferred", -1, "Unknown read preference"),
+    ("secondary", 30, "at least 90 seconds"),
+])
+def test_invalid_read_preferences_are_rejected(mode, staleness, message):
+    with pytest.raises(ValueError, match=message):
+        database.read_preference(mode, staleness)
+
+
+def test_heavy_reads_database_routes_with_the_heavy_preference():
+    settings = database.MongoSettings.from_env({**ENV, "MONGO_MAX_POOL_SIZE": "7"})
+    client = database.create_client(settings)
+    try:
+        heavy = database.heavy_reads_database(client, settings)
+        assert heavy.name == "anamnese"
+        assert heavy.read_preference == SecondaryPreferred(max_staleness=database.MIN_MAX_STALENESS_SECONDS)
+        assert client.get_database("anamnese").read_preference == Primary()
+        assert client.options.pool_options.max_pool_size == 7
+    finally:
+        client.close()
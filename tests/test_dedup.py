@@ -0,0 +1,90 @@
+import dedup
+
+
+def anamnese(anamnese_id, nome, mae="", idade=40, cidade="", user_id="u1"):
+    return {
+        "id": anamnese_id,
+        "user_id": user_id,
+        "created_at": "2024-03-01T10:00:00+00:00",
+        "identificacao": {
+            "nome_completo": nome,
+            "mae": mae,
+            "idade": {"valor": idade, "unidade": "anos"},
+            "naturalidade": {"cidade": cidade},
+        },
+    }
+
+
+def test_spelling_variants_share_blocking_keys():
+    a = dedup.index_entry(anamnese("a", "José da Silva", mae="Maria", cidade="Recife"))
+    b = dedup.index_entry(anamnese("b", "Jose Sylva", mae="Maria", idade=41, cidade="recife"))
+    assert set(a["keys"]) & set(b["keys"])
+    assert dedup.similarity(a, b) >= dedup.DEFAULT_THRESHOLD
+
+
+def test_different_people_score_low():
+    a = dedup.index_entry(anamnese("a", "José da Silva", mae="Maria"))
+    b = dedup.index_entry(anamnese("b", "Antônia Pereira", mae="Conceição"))
+    assert dedup.similarity(a, b) < dedup.DEFAULT_THRESHOLD
+
+
+def test_similarity_ignores_missing_fields():
+    a = dedup.index_entry(anamnese("a", "Carlos Souza"))
+    b = dedup.index_entry(anamnese("b", "Carlos Souza", mae="Ana", cidade="Natal"))
+    assert dedup.similarity(a, b) == 1.0
+
+
+def test_birth_year_from_age():
+    assert dedup.estimate_birth_year(anamnese("a", "X", idade=40)) == 1984
+    months = anamnese("a", "X")
+    months["identificacao"]["idade"] = {"valor": 8, "unidade": "meses"}
+    assert dedup.estimate_birth_year(months) == 2024
+
+
+def test_clusters_only_within_user(run, mongo):
+    collection = mongo[dedup.DEDUP_COLLECTION]
+    for doc in [
+        anamnese("a", "José da Silva", mae="Maria"),
+        anamnese("b", "Jose Sylva", mae="Maria"),
+        anamnese("c", "Paulo Lima", mae="Ana"),
+        anamnese("d", "José da Silva", mae="Maria", user_id="u2"),
+    ]:
+        run(dedup.index_anamnese(collection, doc))
+
+    clusters = run(dedup.find_clusters(collection, "u1"))
+    assert clusters.total == 1
+    assert clusters.clusters[0].anamnese_ids == ["a", "b"]
+
+    candidates = run(dedup.candidates_for(collection, "u1", "a"))
+    assert [c.anamnese_id for c in candidates] == ["b"]
+
+
+def test_rebuild_swaps_in_a_complete_index(run, mongo, monkeypatch):
+    live = mongo[dedup.DEDUP_COLLECTION]
+    run(mongo.anamneses.insert_many([
+        anamnese("a", "José da Silva", mae="Maria"),
+        anamnese("b", "Jose Sylva", mae="Maria"),
+        anamnese("c", "José da Silva", mae="Maria", user_id="u2"),
+    ]))
+    # A stale entry of u1 and one of u2 that a u1 rebuild must leave alone
+    run(dedup.index_anamnese(live, anamnese("gone", "Paulo Lima")))
+    run(dedup.index_anamnese(live, anamnese("c", "José da Silva", mae="Maria", user_id="u2")))
+
+    seen_before_swap = []
+    ensure_indexes = dedup.ensure_indexes
+
+    async def check_live_then_index(collection):
+        seen_before_swap.append(sorted(anamnese_ids(await live.find({}, {"anamnese_id": 1}).to_list(None))))
+        await ensure_indexes(collection)
+
+    monkeypatch.setattr(dedup, "ensure_indexes", check_live_then_index)
+    assert run(dedup.rebuild(mongo, user_id="u1", batch_size=1)) == 2
+
+    assert seen_before_swap == [["c", "gone"]]
+    assert sorted(anamnese_ids(run(live.find({}, {"anamnese_id": 1}).to_list(None)))) == ["a", "b", "c"]
+    assert dedup.STAGING_COLLECTION not in run(mongo.list_collection_names())
+    assert run(dedup.find_clusters(live, "u1")).clusters[0].anamnese_ids == ["a", "b"]
+
+
+def anamnese_ids(entries):
+    return [entry["anamnese_id"] for entry in entries]
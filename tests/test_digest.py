@@ -0,0 +1,49 @@
+import digest
+
+NARRATIVA = (
+    "Paciente procura atendimento. "
+    "Acompanha a esposa nas consultas. "
+    "Dor torácica em aperto há 3 dias, com piora aos esforços. "
+    "Trabalha como pedreiro. "
+    "Nega febre; refere dispneia associada."
+)
+
+
+def test_key_sentences_keep_the_first_and_narrative_order():
+    sentences = digest.key_sentences(NARRATIVA, ["dispneia"])
+
+    assert sentences == [
+        "Paciente procura atendimento.",
+        "Dor torácica em aperto há 3 dias, com piora aos esforços.",
+        "refere dispneia associada.",
+    ]
+
+
+def test_key_sentences_respect_the_limit():
+    assert digest.key_sentences(NARRATIVA, [], limit=1) == ["Paciente procura atendimento."]
+    assert len(digest.key_sentences(NARRATIVA, [], limit=4)) == 4
+
+
+def test_short_narratives_are_kept_whole():
+    assert digest.key_sentences("Tosse seca.  Sem febre. ", []) == ["Tosse seca.", "Sem febre."]
+    assert digest.key_sentences("", []) == []
+    assert digest.key_sentences(None, []) == []
+
+
+def test_ties_go_to_the_earlier_sentence():
+    narrativa = "Início. Primeira dor. Segunda dor. Terceira dor."
+
+    assert digest.key_sentences(narrativa, [], limit=2) == ["Início.", "Primeira dor."]
+
+
+def test_listed_symptoms_raise_a_sentence(sample_anamnese):
+    sample_anamnese["hda"]["narrativa"] = (
+        "Procura atendimento. Mora sozinho. Trabalha à noite. Gosta de ler. Teve palpitações ontem."
+    )
+    sample_anamnese["hda"]["sintomas_principais"] = [{"nome": "Palpitações"}]
+    lines = digest.clinical_digest(sample_anamnese).splitlines()
+
+    assert lines[0] == "Paciente: José da Silva, 58 anos, masculino."
+    assert "HDA: Procura atendimento. Mora sozinho. Teve palpitações ontem." in lines
+    assert "Alergias: Dipirona (urticária)." in lines
+    assert "Tabagismo: ex, 30 maços-ano." in lines
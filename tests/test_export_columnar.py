@@ -0,0 +1,54 @@
+import io
+
+import pyarrow.parquet as pq
+
+import archive
+import export_columnar
+import sparse
+
+
+def test_columns_match_the_schema():
+    assert export_columnar.SCHEMA.names == [name for name, _, _ in export_columnar.COLUMNS]
+    assert len(set(export_columnar.SCHEMA.names)) == len(export_columnar.COLUMNS)
+
+
+def test_parquet_round_trip_of_sparse_documents(run, api, sample_anamnese):
+    minimal = {**sample_anamnese, "antecedentes": {"pessoais": {}}, "habitos": {}, "psicossocial": {}}
+
+    async def scenario():
+        async with api.client() as client:
+            for payload in (sample_anamnese, minimal, sample_anamnese):
+                assert (await client.post("/api/anamneses", json=payload)).status_code == 200
+        stored = await api.db.anamneses.find({}, {"_id": 0}).sort("created_at", 1).to_list(None)
+        cursor = archive.HydratingCursor(
+            api.db.anamneses.find({}, {"_id": 0}).sort("created_at", 1), api.db[archive.COLD_COLLECTION]
+        )
+        sink = io.BytesIO()
+        count = await export_columnar.write_parquet(cursor, sink, row_group_size=2)
+        return stored, count, sink.getvalue()
+
+    stored, count, content = run(scenario())
+    parquet = pq.ParquetFile(io.BytesIO(content))
+    table = parquet.read()
+
+    assert count == 3
+    assert parquet.metadata.num_row_groups == 2
+    assert table.schema.equals(export_columnar.SCHEMA)
+    # Stored documents leave out their defaults; the export fills them in
+    assert stored[1]["habitos"] == {}
+    rows = table.to_pylist()
+    assert rows == [export_columnar.flatten(sparse.decode(doc)) for doc in stored]
+    assert rows[0]["nome_completo"] == "José da Silva"
+    assert rows[0]["cronicos"] == ["Hipertensão"]
+    assert rows[0]["tabagismo_packyears"] == 30
+    assert rows[1]["tabagismo_status"] == "nunca"
+    assert rows[1]["n_medicacoes"] == 0
+
+
+def test_empty_export_is_a_valid_file(run, mongo):
+    sink = io.BytesIO()
+    count = run(export_columnar.write_parquet(mongo.anamneses.find({}), sink))
+
+    assert count == 0
+    table = pq.read_table(io.BytesIO(sink.getvalue()))
+    assert table.num_rows == 0 and table.schema.equals(export_columnar.SCHEMA)
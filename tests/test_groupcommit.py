@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteConcernError, WriteError
+
+import groupcommit
+
+
+class RecordingCollection:
+    """insert_many that records its batches and fails as told"""
+
+    def __init__(self, failure=None, delay=0.0):
+        self.batches = []
+        self.failure = failure
+        self.delay = delay
+
+    async def insert_many(self, documents, ordered=True):
+        assert ordered is False
+        self.batches.append([document["name"] for document in documents])
+        for document in documents:
+            document.setdefault("_id", document["name"])
+        await asyncio.sleep(self.delay)
+        if self.failure:
+            raise self.failure(documents)
+
+    async def insert_one(self, document):
+        self.batches.append([document["name"]])
+        document.setdefault("_id", document["name"])
+        return type("InsertOneResult", (), {"inserted_id": document["_id"]})()
+
+
+async def insert_all(batcher, names):
+    return await asyncio.gather(*(batcher.insert({"name": name}) for name in names), return_exceptions=True)
+
+
+def test_concurrent_inserts_share_one_batch(run):
+    collection = RecordingCollection()
+    batcher = groupcommit.InsertBatcher(collection, max_batch_size=10, linger=0.01)
+
+    results = run(insert_all(batcher, ["a", "b", "c"]))
+    assert results == ["a", "b", "c"]
+    assert collection.batches == [["a", "b", "c"]]
+    assert batcher.snapshot()["mean_batch_size"] == 3.0
+
+
+def test_full_batch_is_written_without_waiting(run):
+    collection = RecordingCollection()
+    batcher = groupcommit.InsertBatcher(collection, max_batch_size=2, linger=10)
+
+    async def scenario():
+        return await asyncio.wait_for(insert_all(batcher, ["a", "b", "c", "d"]), 1)
+
+    assert run(scenario()) == ["a", "b", "c", "d"]
+    assert collection.batches == [["a", "b"], ["c", "d"]]
+
+
+def test_rejected_document_fails_only_its_caller(run):
+    def duplicate_of_b(documents):
+        return BulkWriteError({"writeErrors": [{"index": 1, "code": 11000, "errmsg": "E11000 duplicate key"}], "nInserted": 2})
+
+    batcher = groupcommit.InsertBatcher(RecordingCollection(failure=duplicate_of_b), linger=0.001)
+
+    a, b, c = run(insert_all(batcher, ["a", "b", "c"]))
+    assert (a, c) == ("a", "c")
+    assert isinstance(b, DuplicateKeyError)
+    assert b.code == 11000
+    assert batcher.stats.failed_documents == 1
+
+
+def test_other_write_errors_keep_their_type(run):
+    def validation_error(documents):
+        return BulkWriteError({"writeErrors": [{"index": 0, "code": 121, "errmsg": "Document failed validation"}]})
+
+    batcher = groupcommit.InsertBatcher(RecordingCollection(failure=validation_error), linger=0.001)
+
+    a, b = run(insert_all(batcher, ["a", "b"]))
+    assert type(a) is WriteError and a.code == 121
+    assert b == "b"
+
+
+def test_write_concern_error_reaches_every_caller(run):
+    def concern_error(documents):
+        return BulkWriteError({"writeErrors": [], "writeConcernErrors": [{"code": 64, "errmsg": "waiting for replication timed out"}]})
+
+    batcher = groupcommit.InsertBatcher(RecordingCollection(failure=concern_error), linger=0.001)
+
+    results = run(insert_all(batcher, ["a", "b"]))
+    assert all(isinstance(result, WriteConcernError) for result in results)
+
+
+def test_failed_batch_fails_every_caller(run):
+    batcher = groupcommit.InsertBatcher(RecordingCollection(failure=lambda documents: ConnectionError("down")), linger=0.001)
+
+    results = run(insert_all(batcher, ["a", "b"]))
+    assert all(isinstance(result, ConnectionError) for result in results)
+    assert batcher.stats.failed_documents == 2
+
+
+def test_cancelled_caller_keeps_its_document_in_the_batch(run):
+    collection = RecordingCollection(delay=0.01)
+    batcher = groupcommit.InsertBatcher(collection, linger=0.001)
+
+    async def scenario():
+        cancelled = asyncio.create_task(batcher.insert({"name": "a"}))
+        other = asyncio.create_task(batcher.insert({"name": "b"}))
+        await asyncio.sleep(0.005)
+        cancelled.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        result = await other
+        await batcher.close()
+        return result
+
+    assert run(scenario()) == "b"
+    assert collection.batches == [["a", "b"]]
+
+
+def test_cancelled_write_cancels_its_callers(run):
+    collection = RecordingCollection(delay=60)
+    batcher = groupcommit.InsertBatcher(collection, max_batch_size=2, linger=10)
+
+    async def scenario():
+        inserts = [asyncio.create_task(batcher.insert({"name": name})) for name in ("a", "b")]
+        await asyncio.sleep(0.01)
+        for write in batcher._writes:
+            write.cancel()
+        return await asyncio.wait_for(asyncio.gather(*inserts, return_exceptions=True), timeout=1)
+
+    results = run(scenario())
+    assert all(isinstance(result, asyncio.CancelledError) for result in results)
+    assert collection.batches == [["a", "b"]]
+
+
+def test_close_writes_what_is_pending(run):
+    collection = RecordingCollection()
+    batcher = groupcommit.InsertBatcher(collection, linger=10)
+
+    async def scenario():
+        pending = asyncio.create_task(batcher.insert({"name": "a"}))
+        await asyncio.sleep(0)
+        await batcher.close()
+        return await pending
+
+    assert run(scenario()) == "a"
+
+
+def test_disabled_inserts_one_by_one(run):
+    collection = RecordingCollection()
+    batcher = groupcommit.InsertBatcher(collection, enabled=False)
+
+    assert run(insert_all(batcher, ["a", "b"])) == ["a", "b"]
+    assert collection.batches == [["a"], ["b"]]
+    assert batcher.stats.batches == 0
+
+
+def test_duplicate_key_against_mongo(run, mongo):
+    async def scenario():
+        await mongo.anamneses.create_index("id", unique=True)
+        batcher = groupcommit.InsertBatcher(mongo.anamneses, linger=0.001)
+        return await asyncio.gather(*(batcher.insert({"id": anamnese_id}) for anamnese_id in ("a1", "a1", "a2")), return_exceptions=True)
+
+    first, second, third = run(scenario())
+    assert not isinstance(first, Exception) and not isinstance(third, Exception)
+    assert isinstance(second, DuplicateKeyError)
@@ -0,0 +1,103 @@
+import asyncio
+import json
+
+import live
+
+
+def change(operation, user_id="u1", anamnese_id="a1", updated=None, **document):
+    event = {"operationType": operation}
+    if operation == "delete":
+        event["fullDocumentBeforeChange"] = {"id": anamnese_id, "user_id": user_id, "hda": {"narrativa": "x"}}
+    else:
+        event["fullDocument"] = {"id": anamnese_id, "user_id": user_id, **document}
+    if updated is not None:
+        event["updateDescription"] = {"updatedFields": updated}
+    return event
+
+
+def frame(text):
+    event, data = text.strip().split("\n")
+    return event.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+
+def test_pipeline_drops_unlisted_updates_and_fields(run, mongo):
+    events = [
+        change("update", updated={"hda.narrativa": "y", "updated_at": "t"}),
+        change("update", updated={"resumo_clinico_ia": "Resumo"}),
+        change("update", updated={"identificacao.nome_completo": "Ana", "updated_at": "t"},
+               identificacao={"nome_completo": "Ana", "mae": "Maria"}, hda={"narrativa": "y"}),
+        change("insert", anamnese_id="a2", queixa_principal={"texto_entre_aspas": "tosse", "inicio": {}}),
+        change("delete", anamnese_id="a3"),
+        {"operationType": "invalidate"},
+    ]
+    run(mongo.changes.insert_many(events))
+    projected = run(mongo.changes.aggregate(live.PIPELINE).to_list(None))
+
+    assert [event["operationType"] for event in projected] == ["update", "insert", "delete"]
+    assert projected[0]["fullDocument"] == {"id": "a1", "user_id": "u1", "identificacao": {"nome_completo": "Ana"}}
+    assert projected[1]["fullDocument"]["queixa_principal"] == {"texto_entre_aspas": "tosse"}
+    assert projected[2]["fullDocumentBeforeChange"] == {"id": "a3", "user_id": "u1"}
+
+
+def test_delta_routes_to_the_owner():
+    assert live.delta(change("insert", identificacao={"nome_completo": "Ana"})) == (
+        "u1", "upsert", {"id": "a1", "identificacao": {"grau_confiabilidade": "bom", "nome_completo": "Ana"}}
+    )
+    assert live.delta(change("delete")) == ("u1", "delete", {"id": "a1"})
+    # No pre-image, or the document was deleted before the update lookup
+    assert live.delta({"operationType": "delete"}) is None
+    assert live.delta({"operationType": "update", "fullDocument": None}) is None
+
+
+def test_dispatch_only_reaches_the_owners_connections():
+    hub = live.ChangeHub(collection=None)
+    first, second, other = hub.subscribe("u1"), hub.subscribe("u1"), hub.subscribe("u2")
+
+    hub.dispatch(change("delete"))
+
+    assert first.queue.qsize() == second.queue.qsize() == 1
+    assert other.queue.empty()
+    assert frame(first.queue.get_nowait()) == ("delete", {"id": "a1"})
+    hub.unsubscribe(first)
+    hub.unsubscribe(second)
+    assert set(hub.subscribers) == {"u2"}
+
+
+def test_overflow_drops_the_backlog_and_asks_for_a_resync(run):
+    hub = live.ChangeHub(collection=None)
+
+    async def scenario():
+        stream = hub.stream("u1")
+        frames = [await stream.__anext__()]
+        for n in range(live.SUBSCRIBER_QUEUE_SIZE + 5):
+            hub.dispatch(change("delete", anamnese_id=f"a{n}"))
+        frames.append(await stream.__anext__())
+        hub.dispatch(change("delete", anamnese_id="after"))
+        frames.append(await stream.__anext__())
+        await stream.aclose()
+        return frames
+
+    frames = run(scenario())
+    assert [frame(f) for f in frames] == [("ready", {}), ("resync", {}), ("delete", {"id": "after"})]
+    assert hub.subscribers == {}
+
+
+class BrokenCollection:
+    def watch(self, *args, **kwargs):
+        raise ConnectionError("not a replica set")
+
+
+def test_stream_failure_asks_every_connection_to_resync(run, monkeypatch):
+    monkeypatch.setattr(live, "RESTART_BACKOFF_SECONDS", (60,))
+    hub = live.ChangeHub(BrokenCollection())
+    subscriber = hub.subscribe("u1")
+
+    async def scenario():
+        watcher = asyncio.create_task(hub._watch())
+        await asyncio.sleep(0.01)
+        watcher.cancel()
+        await asyncio.gather(watcher, return_exceptions=True)
+
+    run(scenario())
+    assert hub.available is False
+    assert frame(subscriber.queue.get_nowait()) == ("resync", {})
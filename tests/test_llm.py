@@ -0,0 +1,127 @@
+import asyncio
+import random
+
+import pytest
+
+import llm
+
+
+class ScriptedProvider:
+    """Answers (or fails) after a fixed delay and remembers how each call ended"""
+
+    def __init__(self, name, delay=0.0, failures=0):
+        self.name = name
+        self.delay = delay
+        self.failures = failures
+        self.calls = []
+        self.cancelled = 0
+
+    async def complete(self, system, prompt, session_id):
+        self.calls.append(session_id)
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.failures:
+            self.failures -= 1
+            raise llm.LlmError(f"{self.name} failed")
+        return f"answer from {self.name}"
+
+
+def client(primary, alternate=None, **kwargs):
+    kwargs.setdefault("rng", random.Random(1))
+    return llm.LlmClient(primary, alternate, **kwargs)
+
+
+def warm(client, provider, seconds, samples=llm.MIN_LATENCY_SAMPLES):
+    for _ in range(samples):
+        client._tracker(provider).record(seconds)
+
+
+def test_percentile_of_answered_calls():
+    tracker = llm.LatencyTracker()
+    for n in range(1, 101):
+        tracker.record(n / 100)
+
+    assert tracker.percentile(0.5) == 0.51
+    assert tracker.percentile(0.95) == 0.96
+
+
+def test_percentile_needs_enough_samples():
+    tracker = llm.LatencyTracker()
+    for _ in range(llm.MIN_LATENCY_SAMPLES - 1):
+        tracker.record(0.1)
+
+    assert tracker.percentile(0.95) is None
+
+
+def test_censored_samples_keep_the_tail():
+    tracker = llm.LatencyTracker()
+    for _ in range(20):
+        tracker.record(0.1)
+    for _ in range(5):
+        tracker.record_censored(1.0)
+
+    # Dropping the five cut calls would give 0.1
+    assert tracker.percentile(0.95) == 1.0
+    assert tracker.percentile(0.5) == 0.1
+
+
+def test_hedge_loser_is_cancelled_awaited_and_censored(run):
+    primary = ScriptedProvider("primary", delay=0.5)
+    alternate = ScriptedProvider("alternate", delay=0.01)
+    hedging = client(primary, alternate, min_hedge_delay=0.01)
+    warm(hedging, primary, 0.02)
+
+    completion = run(hedging.complete("system", "prompt", "s1"))
+
+    assert completion.provider == "alternate"
+    assert completion.hedged
+    # The loser ran to its cancellation before complete() returned
+    assert primary.cancelled == 1
+    censored = [seconds for seconds, cut in hedging._tracker(primary).samples if cut]
+    assert len(censored) == 1 and censored[0] >= completion.latency - 0.005
+    assert hedging._tracker(alternate).samples[-1][1] is False
+
+
+def test_primary_failure_falls_back_to_alternate(run):
+    primary = ScriptedProvider("primary", failures=1)
+    alternate = ScriptedProvider("alternate")
+    fallback = client(primary, alternate, hedging=False)
+
+    completion = run(fallback.complete("system", "prompt", "s1"))
+
+    assert completion.provider == "alternate"
+    assert completion.attempts == 1
+    assert not completion.hedged
+    assert alternate.calls == ["s1_fallback"]
+
+
+def test_retries_with_backoff_without_alternate(run):
+    primary = ScriptedProvider("primary", failures=2)
+    retrying = client(primary, max_retries=2)
+
+    completion = run(retrying.complete("system", "prompt", "s1"))
+
+    assert completion.attempts == 3
+    assert len(primary.calls) == 3
+
+
+def test_gives_up_after_max_retries(run):
+    primary = ScriptedProvider("primary", failures=5)
+
+    with pytest.raises(llm.LlmError, match="primary failed"):
+        run(client(primary, max_retries=1).complete("system", "prompt", "s1"))
+    assert len(primary.calls) == 2
+
+
+def test_deadline_cancels_and_censors_the_call(run):
+    primary = ScriptedProvider("primary", delay=1.0)
+    slow = client(primary, deadline=0.05)
+
+    with pytest.raises(llm.LlmTimeoutError):
+        run(slow.complete("system", "prompt", "s1"))
+    assert primary.cancelled == 1
+    (seconds, censored), = slow._tracker(primary).samples
+    assert censored and seconds >= 0.04
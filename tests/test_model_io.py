@@ -0,0 +1,85 @@
+import json
+from datetime import datetime
+
+import pytest
+from fastapi.exceptions import RequestValidationError
+
+import model_io
+from models import Anamnese, AnamneseCreate, AnamneseUpdate
+
+
+def stored(sample):
+    return {
+        **sample,
+        "meta": {**sample["meta"], "timestamp_iso": "2024-01-02T10:00:00+00:00"},
+        "_id": "mongo-internal",
+        "id": "a1",
+        "user_id": "u1",
+        "auditoria": {"versao_registro": 3, "data_hora_anamnese": "2024-01-02T10:00:00+00:00"},
+        "created_at": "2024-01-02T10:00:00+00:00",
+        "updated_at": "2024-01-03T10:00:00+00:00",
+    }
+
+
+def test_from_stored_matches_validation(sample_anamnese):
+    doc = stored(sample_anamnese)
+    constructed = model_io.from_stored(Anamnese, doc)
+    validated = Anamnese.model_validate(doc)
+
+    assert constructed.model_dump() == validated.model_dump()
+    assert isinstance(constructed.created_at, datetime)
+    assert constructed.antecedentes.pessoais.medicacoes_uso[0].nome == "Losartana"
+    assert not hasattr(constructed, "_id")
+
+
+def test_from_stored_fills_fresh_defaults(sample_anamnese):
+    doc = stored(sample_anamnese)
+    doc.pop("interrogatorio_sistematico", None)
+    first = model_io.from_stored(Anamnese, doc)
+    second = model_io.from_stored(Anamnese, doc)
+
+    assert first.interrogatorio_sistematico == Anamnese.model_fields["interrogatorio_sistematico"].default
+    assert "interrogatorio_sistematico" not in first.model_fields_set
+    assert first.interrogatorio_sistematico is not second.interrogatorio_sistematico
+
+
+def test_json_response_matches_model_dump(sample_anamnese):
+    model = model_io.from_stored(Anamnese, stored(sample_anamnese))
+    response = model_io.json_response(Anamnese, model, status_code=201)
+
+    assert response.status_code == 201
+    assert response.media_type == "application/json"
+    assert json.loads(response.body) == json.loads(model.model_dump_json())
+
+
+def test_validate_json_reports_body_locations():
+    with pytest.raises(RequestValidationError) as error:
+        model_io.validate_json(AnamneseUpdate, b'{"hda": {"narrativa": 3}}')
+    assert error.value.errors()[0]["loc"][:2] == ("body", "hda")
+
+
+@pytest.mark.parametrize("method, path, model", [
+    ("post", "/api/anamneses", AnamneseCreate),
+    ("put", "/api/anamneses/{anamnese_id}", AnamneseUpdate),
+])
+def test_openapi_documents_raw_request_bodies(api, method, path, model):
+    spec = api.server.app.openapi()
+    body = spec["paths"][path][method]["requestBody"]
+    schema = body["content"]["application/json"]["schema"]
+
+    assert schema["title"] == model.__name__
+    assert set(schema["properties"]) == set(model.model_fields)
+    refs = {ref.rsplit("/", 1)[-1] for ref in _refs(schema)}
+    assert refs and refs <= set(spec["components"]["schemas"])
+
+
+def _refs(schema):
+    if isinstance(schema, dict):
+        for key, value in schema.items():
+            if key == "$ref":
+                yield value
+            else:
+                yield from _refs(value)
+    elif isinstance(schema, list):
+        for value in schema:
+            yield from _refs(value)
@@ -0,0 +1,71 @@
+import copy
+
+import patients
+
+
+def identificacao(nome="José da Silva", mae="Maria da Silva", cidade="Recife", uf="PE"):
+    return {"nome_completo": nome, "mae": mae, "naturalidade": {"cidade": cidade, "uf": uf}}
+
+
+def test_patient_id_ignores_case_accents_and_spacing():
+    same = patients.patient_id_for("u1", identificacao("  JOSE   da silva ", "maria DA Silva", "recife", "pe"))
+
+    assert same == patients.patient_id_for("u1", identificacao())
+    assert patients.patient_id_for("u2", identificacao()) != same
+    assert patients.patient_id_for("u1", identificacao(mae="Ana da Silva")) != same
+    assert patients.patient_id_for("u1", identificacao(cidade="Olinda")) != same
+
+
+def encounter(anamnese_id, data, queixa, eventos=()):
+    return {
+        "id": anamnese_id,
+        "auditoria": {"data_hora_anamnese": data},
+        "queixa_principal": {"texto_entre_aspas": queixa},
+        "antecedentes": {"linha_do_tempo": [{"ano": ano, "evento": evento} for ano, evento in eventos]},
+    }
+
+
+def test_timeline_merges_repeated_events_in_chronological_order():
+    timeline = patients.merge_timeline([
+        encounter("a1", "2023-05-10T09:00:00+00:00", "tosse", [("2010", "Apendicectomia"), ("infância", "Asma")]),
+        encounter("a2", "2024-02-01T09:00:00+00:00", "dor no peito", [("2010", "apendicectomia "), ("2023", "Infarto")]),
+    ])
+
+    assert [(e.tipo, e.data, e.anamnese_ids) for e in timeline] == [
+        ("evento", "infância", ["a1"]),
+        ("evento", "2010", ["a1", "a2"]),
+        ("evento", "2023", ["a2"]),
+        ("atendimento", "2023-05-10T09:00:00+00:00", ["a1"]),
+        ("atendimento", "2024-02-01T09:00:00+00:00", ["a2"]),
+    ]
+    assert timeline[1].descricao == "Apendicectomia"
+    assert timeline[3].descricao == "tosse" and timeline[3].ano == 2023
+
+
+def test_editing_the_identity_moves_the_anamnese_to_another_patient(run, api, sample_anamnese):
+    renamed = copy.deepcopy(sample_anamnese["identificacao"])
+    renamed["nome_completo"] = "José da Silva Filho"
+
+    async def scenario():
+        async with api.client() as client:
+            first = (await client.post("/api/anamneses", json=sample_anamnese)).json()
+            second = (await client.post("/api/anamneses", json=sample_anamnese)).json()
+            old_patient = patients.patient_id_for("u1", sample_anamnese["identificacao"])
+            both = (await client.get(f"/api/patients/{old_patient}/timeline")).json()
+
+            await client.put(f"/api/anamneses/{first['id']}", json={"identificacao": renamed})
+            after_one = (await client.get(f"/api/patients/{old_patient}/timeline")).json()
+            await client.put(f"/api/anamneses/{second['id']}", json={"identificacao": renamed})
+            after_both = await client.get(f"/api/patients/{old_patient}/timeline")
+
+            new_patient = patients.patient_id_for("u1", renamed)
+            moved = (await client.get(f"/api/patients/{new_patient}/timeline")).json()
+            return both, after_one, after_both.status_code, moved
+
+    both, after_one, old_status, moved = run(scenario())
+    assert both["encontros"] == 2
+    assert after_one["encontros"] == 1
+    # Left without encounters, the old patient is removed
+    assert old_status == 404
+    assert moved["encontros"] == 2
+    assert moved["patient"]["nome_completo"] == "José da Silva Filho"
@@ -0,0 +1,68 @@
+import re
+
+import pdf_render
+
+_SHOWN_TEXT = re.compile(rb"\((.*?)(?<!\\)\) Tj")
+_ESCAPE = re.compile(rb"\\([0-7]{3}|.)")
+
+
+def shown_text(content):
+    """Text drawn on the pages of an uncompressed PDF, fragments joined"""
+    raw = b"".join(_SHOWN_TEXT.findall(content))
+    unescaped = _ESCAPE.sub(lambda m: bytes([int(m[1], 8)]) if len(m[1]) == 3 else m[1], raw)
+    return unescaped.decode("cp1252", errors="replace")
+
+
+def render(anamnese, **options):
+    return pdf_render.render_anamnese(anamnese, pdf_render.PdfOptions(page_compression=False, **options))
+
+
+def test_renders_every_section(sample_anamnese):
+    pdf = render(sample_anamnese)
+    text = shown_text(pdf.content)
+
+    assert pdf.content.startswith(b"%PDF-") and pdf.pages >= 1
+    for title, _ in pdf_render.SECTIONS:
+        if title not in ("INTERROGATÓRIO SISTEMÁTICO", "ANTECEDENTES FAMILIARES"):
+            assert title in text
+    assert "José da Silva" in text and "Losartana - 50mg - 12/12h" in text
+    assert "RESUMO CLÍNICO (automático)" in text
+
+
+def test_ai_summary_replaces_the_digest(sample_anamnese):
+    text = shown_text(render({**sample_anamnese, "resumo_clinico_ia": "Resumo gerado pela IA."}).content)
+
+    assert "RESUMO CLÍNICO (IA)" in text and "Resumo gerado pela IA." in text
+    assert "automático" not in text
+
+
+def test_markup_in_values_is_shown_literally(sample_anamnese):
+    sample_anamnese["identificacao"]["nome_completo"] = "Ana </para> Lima"
+    sample_anamnese["hda"]["narrativa"] = "Dor <b>forte</b> & persistente <unclosed"
+    sample_anamnese["antecedentes"]["pessoais"]["cronicos"] = ['<font size="40">DM</font>']
+
+    text = shown_text(render(sample_anamnese).content)
+
+    assert "Ana </para> Lima" in text
+    assert "Dor <b>forte</b> & persistente <unclosed" in text
+    assert '<font size="40">DM</font>' in text
+
+
+def test_pages_are_compressed_by_default(sample_anamnese):
+    compressed = pdf_render.render_anamnese(sample_anamnese)
+
+    assert compressed.content.startswith(b"%PDF-")
+    assert b"/FlateDecode" in compressed.content
+    assert len(compressed.content) < len(render(sample_anamnese).content)
+
+
+def test_pdf_export_endpoint(run, api, sample_anamnese):
+    async def scenario():
+        async with api.client() as client:
+            created = (await client.post("/api/anamneses", json=sample_anamnese)).json()
+            return await client.get(f"/api/anamneses/{created['id']}/pdf")
+
+    response = run(scenario())
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/pdf"
+    assert response.content.startswith(b"%PDF-")
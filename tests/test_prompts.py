@@ -0,0 +1,129 @@
+import sys
+import threading
+import types
+
+import pytest
+
+import prompts
+
+load_encoding = prompts._encoding
+
+
+@pytest.fixture(autouse=True)
+def estimated_tokens(monkeypatch):
+    """Count with the characters-per-token estimate, whatever tiktoken has cached locally"""
+    monkeypatch.setattr(prompts, "_encoding", lambda model: None)
+
+
+@pytest.fixture
+def anamnese(sample_anamnese):
+    sample_anamnese["hda"]["narrativa"] = " ".join(
+        f"Frase {n} da história clínica com detalhes do quadro e da evolução." for n in range(40)
+    )
+    sample_anamnese["antecedentes"]["familiares"] = [{"parentesco": "pai", "condicao": "infarto"}]
+    sample_anamnese["psicossocial"]["suporte_social"] = "mora com a esposa"
+    return sample_anamnese
+
+
+def section_order(text):
+    return [s.key for s in prompts.SECTIONS if f"**{s.title}:**" in text]
+
+
+def test_large_budget_keeps_every_section_full(anamnese):
+    prompt = prompts.build_summary_prompt(anamnese, budget=100000)
+
+    assert prompt.counter == "estimate"
+    assert set(prompt.sections.values()) == {"full"}
+    assert "Frase 39" in prompt.text
+    assert prompt.text.startswith(prompts.HEADER) and prompt.text.endswith(prompts.FOOTER)
+
+
+def test_budget_truncates_long_sections_at_sentence_boundary(anamnese):
+    prompt = prompts.build_summary_prompt(anamnese, budget=400)
+
+    assert prompt.tokens <= prompt.budget
+    assert prompt.sections["hda"] == "truncated"
+    assert "Frase 0" in prompt.text and "Frase 39" not in prompt.text
+    assert "evolução. […]" in prompt.text
+
+
+def test_tight_budget_drops_lowest_priority_sections_first(anamnese):
+    prompt = prompts.build_summary_prompt(anamnese, budget=200)
+
+    assert prompt.tokens <= prompt.budget
+    kept = {key for key, mode in prompt.sections.items() if mode != "omitted"}
+    assert {"identificacao", "queixa_principal"} <= kept
+    assert prompt.sections["psicossocial"] == "omitted"
+    priority = {s.key: s.priority for s in prompts.SECTIONS}
+    assert max(priority[key] for key in kept) <= min(priority[key] for key in prompt.sections if key not in kept)
+
+
+def test_sections_stay_in_clinical_order(anamnese):
+    prompt = prompts.build_summary_prompt(anamnese, budget=100000)
+    clinical = [s.key for s in prompts.SECTIONS if s.key in prompt.sections]
+
+    assert section_order(prompt.text) == clinical
+
+
+def test_truncate_hard_cuts_a_single_long_sentence():
+    counter = prompts.counter_for()
+    text = "palavra " * 200
+
+    cut = counter.truncate(text, 20)
+    assert cut.endswith("…")
+    assert counter.count(cut) <= 20
+
+
+@pytest.mark.parametrize("budget", range(4, 60))
+def test_truncation_marker_fits_the_budget(budget):
+    counter = prompts.counter_for()
+    # Each sentence and its space are exactly 5 estimated tokens
+    text = " ".join(["Frase curta aqui."] * 30)
+
+    cut = counter.truncate(text, budget)
+    assert cut.endswith(prompts.SENTENCES_CUT) or cut.endswith(prompts.TEXT_CUT)
+    assert counter.count(cut) <= budget
+
+
+def test_failed_encoding_loads_are_retried(monkeypatch):
+    encoding = types.SimpleNamespace(name="o200k_base")
+    attempts = []
+
+    def encoding_for_model(model):
+        attempts.append(model)
+        if len(attempts) == 1:
+            raise ConnectionError("offline")
+        return encoding
+
+    monkeypatch.setitem(sys.modules, "tiktoken", types.SimpleNamespace(encoding_for_model=encoding_for_model))
+    monkeypatch.setattr(prompts, "_encoding", load_encoding)
+    monkeypatch.setattr(prompts, "_encodings", {})
+    monkeypatch.setattr(prompts, "_encoding_failures", {})
+
+    assert prompts.counter_for("gpt-4o-mini").name == "estimate"
+    # Within the retry interval the estimate is used without trying again
+    assert prompts.counter_for("gpt-4o-mini").name == "estimate"
+    assert len(attempts) == 1
+
+    monkeypatch.setattr(prompts, "ENCODING_RETRY_SECONDS", 0)
+    assert prompts.counter_for("gpt-4o-mini").name == "tiktoken:o200k_base"
+    assert prompts.counter_for("gpt-4o-mini").encoding is encoding
+    assert len(attempts) == 2
+
+
+def test_load_counter_runs_off_the_event_loop(run, monkeypatch):
+    threads = []
+
+    def counter_for(model):
+        threads.append(threading.get_ident())
+        return prompts.TokenCounter(model)
+
+    monkeypatch.setattr(prompts, "counter_for", counter_for)
+
+    async def load():
+        counter = await prompts.load_counter("gpt-4o-mini")
+        return counter, threading.get_ident()
+
+    counter, loop_thread = run(load())
+    assert counter.name == "estimate"
+    assert threads and threads[0] != loop_thread
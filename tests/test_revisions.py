@@ -0,0 +1,77 @@
+import revisions
+
+
+def test_diff_and_apply_round_trip():
+    old = {"a": {"b": 1, "c": [1, 2]}, "d": "x", "gone": True}
+    new = {"a": {"b": 2, "c": [1, 2, 3], "e": {"f": None}}, "d": "x"}
+    operations = revisions.diff(old, new)
+    assert {tuple(op["path"]) for op in operations} == {("gone",), ("a", "b"), ("a", "c"), ("a", "e")}
+    assert revisions.apply(old, operations) == new
+    assert old["a"]["b"] == 1
+
+
+def record(versao, narrativa):
+    return {"id": "a1", "user_id": "u1", "auditoria": {"versao_registro": versao}, "hda": {"narrativa": narrativa}, "resumo_clinico_ia": "ignored"}
+
+
+def test_reconstruct_across_checkpoints(run, mongo):
+    collection = mongo[revisions.REVISIONS_COLLECTION]
+    versions = [record(1, "v1")]
+    run(revisions.record_checkpoint(collection, versions[0]))
+    for versao in range(2, revisions.CHECKPOINT_EVERY + 4):
+        versions.append(record(versao, f"v{versao}"))
+        run(revisions.record_update(collection, versions[-2], versions[-1]))
+
+    kinds = {r["versao"]: r["tipo"] for r in run(collection.find({}).to_list(100))}
+    assert kinds[revisions.CHECKPOINT_EVERY] == "checkpoint"
+    for version in versions:
+        rebuilt = run(revisions.reconstruct(collection, "u1", "a1", version["auditoria"]["versao_registro"]))
+        assert rebuilt == {k: v for k, v in version.items() if k != "resumo_clinico_ia"}
+    assert run(revisions.reconstruct(collection, "u2", "a1", 2)) is None
+
+
+def test_record_without_history_gets_base_checkpoint(run, mongo):
+    collection = mongo[revisions.REVISIONS_COLLECTION]
+    run(revisions.record_update(collection, record(4, "old"), record(5, "new")))
+    assert run(revisions.reconstruct(collection, "u1", "a1", 4))["hda"] == {"narrativa": "old"}
+    assert run(revisions.reconstruct(collection, "u1", "a1", 5))["hda"] == {"narrativa": "new"}
+
+
+def test_concurrent_updates_store_true_history(run, api, sample_anamnese):
+    """A PUT that commits between another PUT's read and write must not corrupt history or stats"""
+    collection = api.db.anamneses
+    find_one_and_update = collection.find_one_and_update
+    identificacao = sample_anamnese["identificacao"]
+
+    async def scenario():
+        async with api.client() as client:
+            created = (await client.post("/api/anamneses", json=sample_anamnese)).json()
+            anamnese_id = created["id"]
+            interleaved = []
+
+            async def other_put_commits_first(*args, **kwargs):
+                if not interleaved:
+                    interleaved.append(True)
+                    younger = {**identificacao, "idade": {"valor": 25, "unidade": "anos"}}
+                    response = await client.put(f"/api/anamneses/{anamnese_id}", json={"identificacao": younger})
+                    assert response.status_code == 200
+                return await find_one_and_update(*args, **kwargs)
+
+            collection.find_one_and_update = other_put_commits_first
+            # Puts the age back to what it was before the other PUT
+            response = await client.put(f"/api/anamneses/{anamnese_id}", json={"identificacao": identificacao})
+            assert response.status_code == 200
+            final = response.json()
+
+            versions = {}
+            for versao in (1, 2, 3):
+                versions[versao] = (await client.get(f"/api/anamneses/{anamnese_id}/versions/{versao}")).json()
+            current = (await client.get(f"/api/anamneses/{anamnese_id}")).json()
+            stats = (await client.get("/api/stats")).json()
+            return final, versions, current, stats
+
+    final, versions, current, stats = run(scenario())
+    assert final["auditoria"]["versao_registro"] == 3
+    assert final == current
+    assert [versions[v]["identificacao"]["idade"]["valor"] for v in (1, 2, 3)] == [58, 25, 58]
+    assert [(g["faixa_etaria"], g["total"]) for g in stats["grupos"]] == [("50-59", 1)]
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+import risk
+
+
+def anamnese(anamnese_id, packyears=0, doses=0, pesado=False, frequencia=5, duracao=60, sono=8, cronicos=0, user_id="u1"):
+    return {
+        "id": anamnese_id,
+        "user_id": user_id,
+        "identificacao": {"nome_completo": f"Paciente {anamnese_id}", "idade": {"valor": 50, "unidade": "anos"}},
+        "habitos": {
+            "tabagismo": {"carga_tabagica_packyears": packyears},
+            "etilismo": {"uso_pesado_ep": pesado, "doses_semana": doses},
+            "atividade_fisica": {"frequencia_semana": frequencia, "duracao_min": duracao},
+            "sono": {"horas": sono},
+        },
+        "antecedentes": {"pessoais": {"cronicos": [f"condição {i}" for i in range(cronicos)]}},
+    }
+
+
+def test_factor_matrix_normalizes_each_factor():
+    docs = [
+        anamnese("a", packyears=20, doses=14, frequencia=1, duracao=30, sono=5, cronicos=1),
+        anamnese("b", packyears=80, pesado=True, cronicos=5),
+        anamnese("c"),
+    ]
+    matrix = risk.factor_matrix(docs, risk.RiskThresholds())
+
+    assert matrix.shape == (3, len(risk.FACTORS))
+    np.testing.assert_allclose(matrix[0], [0.5, 1, 1, 1, 1 / 3])
+    np.testing.assert_allclose(matrix[1], [1, 1, 0, 0, 1])
+    np.testing.assert_allclose(matrix[2], [0, 0, 0, 0, 0])
+
+
+def test_unreported_sleep_is_not_short_sleep():
+    doc = anamnese("a")
+    del doc["habitos"]["sono"]
+    assert risk.factor_matrix([doc], risk.RiskThresholds())[0, risk.FACTORS.index("sono_curto")] == 0
+
+
+@pytest.mark.parametrize("field", ["packyears_max", "cronicos_max"])
+def test_saturation_points_must_be_positive(field):
+    with pytest.raises(ValidationError):
+        risk.RiskThresholds(**{field: 0})
+
+
+def score(run, mongo, docs, **query):
+    collection = mongo.anamneses
+    run(collection.insert_many(docs))
+    return run(risk.score_cohort(collection, "u1", risk.RiskQuery(**query), batch_size=2))
+
+
+def test_scores_are_weighted_sums(run, mongo):
+    weights = {"tabagismo": 2.0, "etilismo_pesado": 0.0, "sedentarismo": 1.0, "sono_curto": 1.0, "cronicos": 3.0}
+    response = score(run, mongo, [anamnese("a", packyears=20, doses=20, cronicos=3)], weights=weights)
+
+    (item,) = response.itens
+    assert item.score == 4.0
+    assert item.fatores == {"tabagismo": 1.0, "cronicos": 3.0}
+
+
+def test_min_score_filters_before_paging(run, mongo):
+    docs = [anamnese("low", sono=5), anamnese("high", packyears=40), anamnese("none")]
+    response = score(run, mongo, docs, min_score=2)
+
+    assert response.total == 1
+    assert [item.id for item in response.itens] == ["high"]
+
+
+def test_pages_are_ranked_and_do_not_overlap(run, mongo):
+    docs = [anamnese(f"p{i}", packyears=(i % 3) * 20) for i in range(7)]
+    docs.append(anamnese("other", packyears=40, user_id="u2"))
+    collection = mongo.anamneses
+    run(collection.insert_many(docs))
+
+    pages = [
+        run(risk.score_cohort(collection, "u1", risk.RiskQuery(page=page, page_size=3), batch_size=2))
+        for page in (1, 2, 3, 4)
+    ]
+    ids = [item.id for page in pages for item in page.itens]
+
+    assert all(page.total == 7 for page in pages)
+    assert [len(page.itens) for page in pages] == [3, 3, 1, 0]
+    assert sorted(ids) == sorted(f"p{i}" for i in range(7))
+    assert ids[:2] == ["p2", "p5"]
+    scores = [item.score for page in pages for item in page.itens]
+    assert scores == sorted(scores, reverse=True)
@@ -0,0 +1,75 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import server
+
+
+class FailingWrites:
+    """Collection whose bulk writes fail, delegating everything else"""
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def bulk_write(self, operations, ordered=True):
+        raise ConnectionError("primary stepped down")
+
+    def __getattr__(self, name):
+        return getattr(self.collection, name)
+
+
+def maintenance(collection, ttl=timedelta(days=7)):
+    return server.SessionMaintenance(collection, ttl=ttl, sweep_interval=0, flush_interval=0)
+
+
+def test_flush_writes_pending_touches(run, mongo):
+    sessions = maintenance(mongo.user_sessions)
+    old_expiry = datetime.now(timezone.utc) + timedelta(hours=1)
+    run(mongo.user_sessions.insert_one({"session_token": "t1", "expires_at": old_expiry.isoformat()}))
+    sessions.touch("t1")
+
+    assert run(sessions.flush_touches()) == 1
+    stored = run(mongo.user_sessions.find_one({"session_token": "t1"}))
+    assert datetime.fromisoformat(stored["expires_at"]) > old_expiry + timedelta(days=6)
+    assert sessions._touches == {}
+
+
+def test_failed_flush_keeps_touches(run, mongo):
+    sessions = maintenance(FailingWrites(mongo.user_sessions))
+    sessions.touch("t1")
+    touched = sessions._touches["t1"]
+
+    with pytest.raises(ConnectionError):
+        run(sessions.flush_touches())
+    assert sessions._touches == {"t1": touched}
+
+
+def test_failed_flush_keeps_newer_touch(run, mongo):
+    sessions = maintenance(FailingWrites(mongo.user_sessions))
+    sessions._touches["t1"] = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    original_bulk_write = sessions.collection.bulk_write
+
+    async def touched_during_write(operations, ordered=True):
+        sessions._touches["t1"] = datetime(2024, 1, 2, tzinfo=timezone.utc)
+        await original_bulk_write(operations, ordered)
+
+    sessions.collection.bulk_write = touched_during_write
+    with pytest.raises(ConnectionError):
+        run(sessions.flush_touches())
+    assert sessions._touches["t1"] == datetime(2024, 1, 2, tzinfo=timezone.utc)
+
+
+def test_purge_skips_sessions_with_pending_touch(run, mongo):
+    sessions = maintenance(FailingWrites(mongo.user_sessions))
+    expired = (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat()
+    run(mongo.user_sessions.insert_many([
+        {"session_token": "active", "expires_at": expired},
+        {"session_token": "idle", "expires_at": expired},
+    ]))
+    sessions.touch("active")
+    with pytest.raises(ConnectionError):
+        run(sessions.flush_touches())
+
+    assert run(sessions.purge_expired()) == 1
+    remaining = run(mongo.user_sessions.find({}, {"_id": 0, "session_token": 1}).to_list(10))
+    assert remaining == [{"session_token": "active"}]
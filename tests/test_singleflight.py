@@ -0,0 +1,150 @@
+import asyncio
+
+import pytest
+
+import singleflight
+
+
+class Work:
+    """Counts executions and finishes when released"""
+
+    def __init__(self, result="done", error=None):
+        self.result = result
+        self.error = error
+        self.executions = 0
+        self.release = None
+
+    async def __call__(self):
+        self.executions += 1
+        await self.release.wait()
+        if self.error:
+            raise self.error
+        return self.result
+
+
+def test_concurrent_calls_share_one_execution(run):
+    flights = singleflight.SingleFlight()
+    work = Work()
+
+    async def scenario():
+        work.release = asyncio.Event()
+        calls = [asyncio.create_task(flights.do(("get", "a1"), work)) for _ in range(5)]
+        await asyncio.sleep(0)
+        work.release.set()
+        return await asyncio.gather(*calls)
+
+    assert run(scenario()) == ["done"] * 5
+    assert work.executions == 1
+    assert flights.snapshot()["get"] == {"calls": 5, "executions": 1, "coalesced": 4, "ratio": 0.8}
+
+
+def test_different_keys_do_not_coalesce(run):
+    flights = singleflight.SingleFlight()
+    work = Work()
+
+    async def scenario():
+        work.release = asyncio.Event()
+        work.release.set()
+        await asyncio.gather(flights.do(("get", "a1"), work), flights.do(("get", "a2"), work))
+
+    run(scenario())
+    assert work.executions == 2
+
+
+def test_every_caller_gets_the_exception(run):
+    flights = singleflight.SingleFlight()
+    work = Work(error=ValueError("boom"))
+
+    async def scenario():
+        work.release = asyncio.Event()
+        calls = [asyncio.create_task(flights.do(("pdf", "a1"), work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        work.release.set()
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    results = run(scenario())
+    assert all(isinstance(result, ValueError) for result in results)
+    assert work.executions == 1
+
+
+def test_nothing_is_cached_after_the_flight(run):
+    flights = singleflight.SingleFlight()
+    work = Work()
+
+    async def scenario():
+        work.release = asyncio.Event()
+        work.release.set()
+        await flights.do(("get", "a1"), work)
+        await flights.do(("get", "a1"), work)
+        return flights._inflight
+
+    assert run(scenario()) == {}
+    assert work.executions == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_others(run):
+    flights = singleflight.SingleFlight()
+    work = Work()
+
+    async def scenario():
+        work.release = asyncio.Event()
+        first = asyncio.create_task(flights.do(("json", "a1"), work))
+        second = asyncio.create_task(flights.do(("json", "a1"), work))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        work.release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert run(scenario()) == "done"
+    assert work.executions == 1
+
+
+def test_disabled_runs_every_call(run):
+    flights = singleflight.SingleFlight(enabled=False)
+    work = Work()
+
+    async def scenario():
+        work.release = asyncio.Event()
+        work.release.set()
+        await asyncio.gather(*(flights.do(("get", "a1"), work) for _ in range(3)))
+
+    run(scenario())
+    assert work.executions == 3
+    assert flights.snapshot()["get"]["coalesced"] == 0
+
+
+def test_record_read_sees_a_write_made_while_an_earlier_read_is_in_flight(api, run, sample_anamnese):
+    collection = api.db.anamneses
+    find_one = collection.find_one
+    stalled = {}
+
+    async def slow_find_one(*args, **kwargs):
+        result = await find_one(*args, **kwargs)
+        if "release" in stalled:
+            stalled["started"].set()
+            await stalled.pop("release").wait()
+        return result
+
+    async def scenario():
+        async with api.client() as client:
+            created = (await client.post("/api/anamneses", json=sample_anamnese)).json()
+            path = f"/api/anamneses/{created['id']}"
+            stalled.update(started=asyncio.Event(), release=asyncio.Event())
+            release = stalled["release"]
+            collection.find_one = slow_find_one
+            first = asyncio.create_task(client.get(path))
+            await stalled["started"].wait()
+
+            await client.put(path, json={"hda": {"narrativa": "Dor resolvida."}})
+            second = asyncio.create_task(client.get(path))
+            await asyncio.sleep(0.05)
+            release.set()
+            return (await first).json(), (await second).json()
+
+    stale, fresh = run(scenario())
+    assert stale["hda"]["narrativa"].startswith("Dor torácica")
+    assert fresh["hda"]["narrativa"] == "Dor resolvida."
+    assert fresh["auditoria"]["versao_registro"] == 2
@@ -0,0 +1,88 @@
+import pytest
+
+import sparse
+from models import Anamnese, HabitosModel
+
+
+@pytest.fixture
+def dense(sample_anamnese):
+    """A full stored document, as model_dump() writes it"""
+    return Anamnese.model_validate({**sample_anamnese, "id": "a1", "user_id": "u1"}).model_dump(mode="json")
+
+
+def test_round_trip(dense):
+    stored = sparse.encode(dense)
+
+    assert sparse.decode(stored) == dense
+    assert len(str(stored)) < len(str(dense)) / 2
+
+
+def test_default_sections_and_fields_are_dropped(dense):
+    stored = sparse.encode(dense)
+
+    assert "interrogatorio_sistematico" not in stored
+    assert "resumo_clinico_ia" not in stored
+    assert stored["habitos"] == {"tabagismo": {"status": "ex", "macos_dia": 1, "anos": 30, "carga_tabagica_packyears": 30.0}}
+    assert stored["antecedentes"]["pessoais"]["medicacoes_uso"] == [{"nome": "Losartana", "dose": "50mg", "posologia": "12/12h"}]
+
+
+def test_generated_and_operator_updated_fields_are_kept(dense):
+    stored = sparse.encode(dense)
+
+    assert stored["id"] == "a1"
+    assert "created_at" in stored and "timestamp_iso" in stored["meta"]
+    # Default, but $inc'ed in place by updates
+    assert stored["auditoria"]["versao_registro"] == 1
+
+
+def test_default_must_match_in_type():
+    assert sparse.encode({"habitos": {"sono": {"horas": 0.0}}})["habitos"] == {"sono": {}}
+    assert sparse.encode({"habitos": {"sono": {"horas": False}}})["habitos"] == {"sono": {"horas": False}}
+
+
+def test_section_update_sets_and_unsets(dense):
+    update = sparse.section_update({"habitos": dense["habitos"], "interrogatorio_sistematico": dense["interrogatorio_sistematico"]})
+
+    assert update["$set"] == {"habitos": sparse.encode(dense)["habitos"]}
+    assert update["$unset"] == {"interrogatorio_sistematico": ""}
+
+
+def test_apply_section_update_matches_the_written_document(run, mongo, dense):
+    stored = {**sparse.encode(dense), "interrogatorio_sistematico": {"cardiovascular": {"itens": []}}}
+    psicossocial = {**dense["psicossocial"], "suporte_social": "mora sozinho"}
+    update = sparse.section_update({
+        "psicossocial": psicossocial,
+        "habitos": HabitosModel().model_dump(),
+        "interrogatorio_sistematico": dense["interrogatorio_sistematico"],
+    })
+
+    async def write():
+        await mongo.anamneses.insert_one(dict(stored))
+        await mongo.anamneses.update_one({"id": "a1"}, update)
+        return await mongo.anamneses.find_one({"id": "a1"}, {"_id": 0})
+
+    written = run(write())
+    assert sparse.apply_section_update(stored, update) == written
+    # A required section is kept, emptied; a section with a default is dropped
+    assert written["habitos"] == {}
+    assert "interrogatorio_sistematico" not in written
+    assert sparse.decode(written)["psicossocial"]["suporte_social"] == "mora sozinho"
+
+
+def test_migrate_rewrites_dense_documents(run, mongo, dense):
+    async def scenario():
+        await mongo.anamneses.insert_one(dict(dense))
+        await mongo.anamneses.insert_one({**sparse.encode(dense), "id": "a2"})
+        await mongo.anamneses.insert_one({"id": "a3", "archived": True, "hda": {"narrativa": ""}})
+        dry = await sparse.migrate(mongo, dry_run=True)
+        untouched = await mongo.anamneses.find_one({"id": "a1"}, {"_id": 0})
+        report = await sparse.migrate(mongo)
+        migrated = await mongo.anamneses.find_one({"id": "a1"}, {"_id": 0})
+        return dry, untouched, report, migrated
+
+    dry, untouched, report, migrated = run(scenario())
+    assert untouched == dense
+    assert (dry.documents, dry.rewritten) == (report.documents, report.rewritten) == (2, 1)
+    assert report.bytes_after < report.bytes_before
+    assert migrated == sparse.encode(dense)
+    assert sparse.decode(migrated) == dense
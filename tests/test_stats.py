@@ -0,0 +1,89 @@
+from pymongo.errors import DuplicateKeyError
+
+import stats
+
+
+def anamnese(user_id, idade=45, sexo="feminino", cronicos=(), **extra):
+    return {
+        "id": extra.pop("id", f"{user_id}-{idade}"),
+        "user_id": user_id,
+        "identificacao": {"idade": {"valor": idade, "unidade": "anos"}, "sexo_biologico": sexo},
+        "antecedentes": {"pessoais": {"cronicos": list(cronicos)}},
+        "habitos": {"tabagismo": {"status": "nunca"}, "sono": {"horas": 7}},
+        **extra,
+    }
+
+
+def test_update_moves_contribution_between_buckets():
+    changes = dict(
+        (key["faixa_etaria"], inc)
+        for key, inc in stats._changes(anamnese("u1", idade=29), anamnese("u1", idade=31))
+    )
+    assert changes["18-29"]["total"] == -1
+    assert changes["30-39"]["total"] == 1
+
+
+def test_unchanged_record_has_no_delta():
+    doc = anamnese("u1", cronicos=["Asma"])
+    assert stats._changes(doc, doc) == []
+
+
+class RacingUpsert:
+    """Bucket collection whose first upsert loses the race to a concurrent insert"""
+
+    def __init__(self):
+        self.calls = []
+
+    async def update_one(self, key, update, upsert=False):
+        self.calls.append((key, update))
+        if len(self.calls) == 1:
+            raise DuplicateKeyError("E11000 duplicate key error")
+
+
+def test_record_change_retries_lost_upsert_race(run):
+    collection = RacingUpsert()
+    run(stats.record_change(collection, None, anamnese("u1")))
+    assert len(collection.calls) == 2
+    assert collection.calls[0] == collection.calls[1]
+
+
+def test_record_change_against_unique_index(run, mongo):
+    run(stats.ensure_indexes(mongo[stats.STATS_COLLECTION]))
+    run(stats.record_change(mongo[stats.STATS_COLLECTION], None, anamnese("u1", id="a")))
+    run(stats.record_change(mongo[stats.STATS_COLLECTION], None, anamnese("u1", id="b")))
+    result = run(stats.read_stats(mongo[stats.STATS_COLLECTION], "u1"))
+    assert result["total"] == 2
+
+
+def test_rebuild_replaces_buckets_without_exposing_partial_state(run, mongo, monkeypatch):
+    live = mongo[stats.STATS_COLLECTION]
+    run(mongo.anamneses.insert_many([anamnese("u1", id="a"), anamnese("u1", idade=70, id="b"), anamnese("u2", id="c")]))
+    # Drifted buckets: a stale one for u1 and one for u2 that a u1 rebuild must leave alone
+    run(live.insert_many([
+        {"user_id": "u1", "faixa_etaria": "0-17", "sexo": "masculino", "total": 5},
+        {"user_id": "u2", "faixa_etaria": "40-49", "sexo": "feminino", "total": 9},
+    ]))
+
+    seen_before_swap = []
+    ensure_indexes = stats.ensure_indexes
+
+    async def check_live_then_index(collection):
+        seen_before_swap.append(await live.count_documents({}))
+        await ensure_indexes(collection)
+
+    monkeypatch.setattr(stats, "ensure_indexes", check_live_then_index)
+    assert run(stats.rebuild(mongo, user_id="u1")) == 2
+
+    assert seen_before_swap == [2]
+    buckets = run(live.find({}, {"_id": 0}).sort([("user_id", 1), ("faixa_etaria", 1)]).to_list(10))
+    assert [(b["user_id"], b["faixa_etaria"], b["total"]) for b in buckets] == [
+        ("u1", "40-49", 1), ("u1", "70-79", 1), ("u2", "40-49", 9),
+    ]
+    assert stats.STAGING_COLLECTION not in run(mongo.list_collection_names())
+
+
+def test_full_rebuild(run, mongo):
+    run(mongo.anamneses.insert_many([anamnese("u1", id="a"), anamnese("u2", id="c")]))
+    run(mongo[stats.STATS_COLLECTION].insert_one({"user_id": "u3", "faixa_etaria": "0-17", "sexo": "x", "total": 1}))
+    assert run(stats.rebuild(mongo)) == 2
+    assert sorted(run(mongo[stats.STATS_COLLECTION].distinct("user_id"))) == ["u1", "u2"]